@@ -0,0 +1,40 @@
+"""Benchmark: fused affine predictor vs the sklearn x_scaler -> model -> y_scaler pipeline, per live prediction.
+
+Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_fused_predictor
+"""
+import numpy as np
+from sklearn.linear_model import ElasticNet, LinearRegression
+from sklearn.preprocessing import RobustScaler
+
+from ..machine_learning import fused_predictor
+from ..machine_learning import lag_features
+from .bench_lag_features import best_of
+
+FUTURE_WINDOW = 39
+
+
+def main():
+    prices = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.5, 858))
+    x_values = lag_features.lag_matrix(prices[:-1], FUTURE_WINDOW)
+    y_values = prices[FUTURE_WINDOW:].reshape(-1, 1)
+    live_x_values = np.ascontiguousarray(x_values[-FUTURE_WINDOW:])
+
+    print(f"{'model':<20}{'sklearn':>12}{'fused':>12}{'speedup':>10}")
+    for model in [LinearRegression(), ElasticNet(alpha=0.2, l1_ratio=0.2)]:
+        x_scaler = RobustScaler().fit(x_values)
+        y_scaler = RobustScaler().fit(y_values)
+        model.fit(x_scaler.transform(x_values), y_scaler.transform(y_values).ravel())
+        fused = fused_predictor.compile_verified_pipeline(model, x_scaler, y_scaler)
+
+        def sklearn_pipeline(x):
+            return y_scaler.inverse_transform(model.predict(x_scaler.transform(x)).reshape(-1, 1)).flatten()
+
+        sklearn_seconds = best_of(sklearn_pipeline, live_x_values)
+        fused_seconds = best_of(fused.predict, live_x_values)
+        print(f'{type(model).__name__:<20}{sklearn_seconds * 1e6:>10.1f}us{fused_seconds * 1e6:>10.1f}us'
+              f'{sklearn_seconds / fused_seconds:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
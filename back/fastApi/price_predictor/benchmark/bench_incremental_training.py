@@ -0,0 +1,64 @@
+"""Benchmark: one ticker's training per cycle, refitted on the whole window (TRAINING_MODE=full) vs updated from
+sufficient statistics (TRAINING_MODE=incremental, machine_learning/incremental_training.py), for windows of a month and
+of 84 days of 10-minute bars.
+
+Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_incremental_training
+"""
+import itertools
+import os
+import tempfile
+
+import numpy as np
+from sklearn.base import clone
+
+from ..machine_learning import Price_Predictor_Notebook_Local as ml
+from ..machine_learning import incremental_training
+from ..machine_learning import lag_features
+from ..machine_learning import ticker_tensor
+from .bench_lag_features import best_of
+
+FUTURE_WINDOW = ml.FUTURE_DATAPOINTS_QUANTITY
+WINDOWS = [819, 9828]  # TRAINING_WINDOW_DATAPOINTS
+CYCLES = 2000  # Bars the window slides over while timing the incremental updates
+
+
+# Per ticker work of the full pipeline: lags, train-test split, robust scaling, every model fitted and evaluated
+def full_fit(window):
+    vwap, close = window
+    x = lag_features.lag_matrix(vwap, FUTURE_WINDOW)
+    y = close[FUTURE_WINDOW - 1:, np.newaxis]
+    splits = [x[:-2 * FUTURE_WINDOW], x[-2 * FUTURE_WINDOW:], y[:-2 * FUTURE_WINDOW], y[-2 * FUTURE_WINDOW:]]
+    x_train, x_test, y_train, _ = [
+        ticker_tensor.robust_scale(split[np.newaxis], *ticker_tensor.robust_center_and_scale(split[np.newaxis]))[0]
+        for split in splits]
+    return [clone(model).fit(x_train, y_train.ravel()).predict(x_test) for model in ml.models]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'window':<10}{'full':>12}{'incremental':>14}{'rebuild':>12}{'speedup':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for window in WINDOWS:
+            bars = window + FUTURE_WINDOW
+            vwap = 100 + np.cumsum(rng.normal(0, 0.5, bars + CYCLES))
+            close = vwap + rng.normal(0, 0.1, bars + CYCLES)
+            state_path = os.path.join(directory, f'{window}.pkl')
+
+            def incremental_fit(start):
+                return incremental_training.train_ticker(state_path, vwap[start:start + bars],
+                                                         close[start:start + bars], ml.models, FUTURE_WINDOW,
+                                                         ml.FEATURES, ml.LABEL)
+
+            # Each call sees the window one bar later than the previous call
+            starts = itertools.cycle(range(1, CYCLES))
+            incremental_fit(0)
+            full_seconds = best_of(full_fit, (vwap[:bars], close[:bars]), repeat=5)
+            incremental_seconds = best_of(lambda _: incremental_fit(next(starts)), None, repeat=5)
+            rebuild_seconds = best_of(lambda _: (os.remove(state_path), incremental_fit(0)), None, repeat=5)
+            print(f'{window:<10}{full_seconds * 1e3:>10.2f}ms{incremental_seconds * 1e3:>12.2f}ms'
+                  f'{rebuild_seconds * 1e3:>10.2f}ms{full_seconds / incremental_seconds:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark: NumPy sliding-window lag matrix vs the previous DataFrame.shift lag features.
+
+Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_lag_features
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from ..machine_learning import lag_features
+
+FEATURE = 'vwap'
+FUTURE_WINDOW = 39
+LIVE_ROWS = 78  # 2 * FUTURE_WINDOW datapoints read for a live prediction
+TRAINING_ROWS = 858  # WINDOW_DATAPOINTS_QUANTITY + FUTURE_DATAPOINTS_QUANTITY per ticker
+
+
+# Previous serving path: main.add_lagged_features + iloc[-FEATURE_COUNT:].values
+def pandas_live(prices):
+    df = pd.DataFrame(prices, columns=[FEATURE])
+    for lag_count in range(1, FUTURE_WINDOW):
+        df[f'lag_{FEATURE}_{lag_count}'] = df[FEATURE].shift(lag_count)
+    df.dropna(inplace=True)
+    return df.iloc[-FUTURE_WINDOW:].values
+
+
+def numpy_live(prices):
+    return lag_features.lag_matrix(prices, FUTURE_WINDOW)[-FUTURE_WINDOW:]
+
+
+# Previous training path: per ticker copy + DataFrame.shift loop + dropna of Price_Predictor_Notebook_Local
+def pandas_training(df_ticker):
+    df = df_ticker.copy()
+    for lag in range(1, FUTURE_WINDOW):
+        df[f'lag_vwap_{lag}'] = df['vwap'].shift(lag)
+    df.dropna(inplace=True)
+    return df
+
+
+def numpy_training(df_ticker):
+    return lag_features.lagged_frame(df_ticker, 'vwap', FUTURE_WINDOW)
+
+
+def best_of(function, argument, repeat=7):
+    number, _ = timeit.Timer(lambda: function(argument)).autorange()
+    return min(timeit.repeat(lambda: function(argument), number=number, repeat=repeat)) / number
+
+
+def main():
+    rng = np.random.default_rng(0)
+    live_prices = 100 + np.cumsum(rng.normal(0, 0.5, LIVE_ROWS))
+    training_df = pd.DataFrame({'close': 100 + np.cumsum(rng.normal(0, 0.5, TRAINING_ROWS)),
+                                'vwap': 100 + np.cumsum(rng.normal(0, 0.5, TRAINING_ROWS))})
+
+    np.testing.assert_array_equal(pandas_live(live_prices), numpy_live(live_prices))
+    pd.testing.assert_frame_equal(pandas_training(training_df), numpy_training(training_df))
+
+    cases = [
+        (f'live ({LIVE_ROWS} rows) lag matrix', pandas_live, numpy_live, live_prices),
+        (f'training ({TRAINING_ROWS} rows) lagged frame', pandas_training, numpy_training, training_df),
+        (f'training ({TRAINING_ROWS} rows) lag matrix only', pandas_training,
+         lambda df: lag_features.lag_matrix(df['vwap'].to_numpy(), FUTURE_WINDOW), training_df),
+    ]
+    print(f"{'case':<42}{'pandas':>12}{'numpy':>12}{'speedup':>10}")
+    for name, pandas_function, numpy_function, argument in cases:
+        pandas_seconds = best_of(pandas_function, argument)
+        numpy_seconds = best_of(numpy_function, argument)
+        print(f'{name:<42}{pandas_seconds * 1e6:>10.1f}us{numpy_seconds * 1e6:>10.1f}us'
+              f'{pandas_seconds / numpy_seconds:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
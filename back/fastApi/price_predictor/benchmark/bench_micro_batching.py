@@ -0,0 +1,90 @@
+"""Benchmark: live predictions one by one vs micro-batched (service/micro_batcher.py), by batching window and number of
+concurrent clients. Fused linear models are never batched by the API, so they are only run one by one, as the baseline.
+
+Each client is a thread predicting FEATURE_COUNT rows of lag features in a loop, like a `def` endpoint in Starlette's
+threadpool, for DURATION_SECONDS. Reported: throughput and p50 / p99 latency per request.
+
+Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_micro_batching
+"""
+import threading
+import time
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import RobustScaler
+from sklearn.tree import DecisionTreeRegressor
+
+from .. import main
+from ..machine_learning import lag_features
+from ..service import micro_batcher
+from ..service import model_registry
+
+DURATION_SECONDS = 1.0
+CLIENTS = [1, 8, 32, 64]
+WINDOWS_MS = [0, 1, 2, 5]  # 0 = one by one, without the batcher
+
+
+def fit_pipeline(model, seed):
+    x_values = lag_features.lag_matrix(100 + np.cumsum(np.random.default_rng(seed).normal(0, 0.5, 858)),
+                                       main.FEATURE_COUNT)
+    y_values = x_values[:, 0].reshape(-1, 1)
+    x_scaler = RobustScaler().fit(x_values)
+    y_scaler = RobustScaler().fit(y_values)
+    return model.fit(x_scaler.transform(x_values), y_scaler.transform(y_values).ravel()), x_scaler, y_scaler
+
+
+# Each client predicts its own ticker's live lag rows in a loop. Returns (requests per second, latencies in seconds).
+def run_clients(model_set, tickers, clients, batcher):
+    x_values = lag_features.lag_matrix(100 + np.cumsum(np.random.default_rng(0).normal(0, 0.5, 77)),
+                                       main.FEATURE_COUNT)
+    latencies = [[] for _ in range(clients)]
+    stop_at = time.perf_counter() + DURATION_SECONDS
+
+    def client(index):
+        ticker_dto = main.TickerDTO(tickerType='STOCKS', tickerName=tickers[index % len(tickers)],
+                                    portfolioType='AGGRESSIVE')
+        while time.perf_counter() < stop_at:
+            started_at = time.perf_counter()
+            if batcher is None:
+                main.predictions_from_x_values(ticker_dto, x_values, model_set)
+            else:
+                batcher.submit((model_set, ticker_dto, x_values)).result()
+            latencies[index].append(time.perf_counter() - started_at)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = np.concatenate([np.array(client_latencies) for client_latencies in latencies])
+    return len(latencies) / (time.perf_counter() - started_at), latencies
+
+
+def main_benchmark():
+    scenarios = [
+        ('linear, 64 tickers', model_registry.build_model_set(
+            'bench', {f'L{i}': fit_pipeline(LinearRegression(), i) for i in range(64)}), [0]),
+        ('sklearn tree, 4 tickers', model_registry.build_model_set(
+            'bench', {f'T{i}': fit_pipeline(DecisionTreeRegressor(max_depth=8), i) for i in range(4)}), WINDOWS_MS),
+    ]
+    print(f"{'scenario':<26}{'clients':>8}{'window':>8}{'req/s':>10}{'p50':>10}{'p99':>10}{'batch':>7}")
+    for name, model_set, windows_ms in scenarios:
+        tickers = list(model_set.tickers)
+        for clients in CLIENTS:
+            for window_ms in windows_ms:
+                batcher = None if window_ms == 0 else micro_batcher.MicroBatcher(
+                    main.predictions_from_requests, window_ms / 1000, max_batch_size=64)
+                throughput, latencies = run_clients(model_set, tickers, clients, batcher)
+                mean_batch_size = 1.0
+                if batcher is not None:
+                    batcher.close()
+                    mean_batch_size = batcher.stats()['mean_batch_size']
+                print(f'{name:<26}{clients:>8}{window_ms:>6}ms{throughput:>10.0f}'
+                      f'{np.percentile(latencies, 50) * 1e3:>8.2f}ms{np.percentile(latencies, 99) * 1e3:>8.2f}ms'
+                      f'{mean_batch_size:>7.1f}')
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,97 @@
+"""Benchmark: per ticker model selection of the ML pipeline, MODEL_SELECTION=models (LinearRegression and
+ElasticNet(alpha=0.2, l1_ratio=0.2) fitted by sklearn) vs MODEL_SELECTION=path (machine_learning/model_search.py), on
+synthetic tickers (synthetic_universe.py). Seconds per ticker and mean validation MAE of the selected models.
+
+Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_model_search
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.linear_model import ElasticNet, LinearRegression
+
+from ..machine_learning import Price_Predictor_Notebook_Local as ml
+from ..machine_learning import lag_features
+from ..machine_learning import model_search
+from ..machine_learning import ticker_tensor
+from . import synthetic_universe
+
+TICKERS = 50
+FUTURE_WINDOW = ml.FUTURE_DATAPOINTS_QUANTITY
+BARS = ml.WINDOW_DATAPOINTS_QUANTITY + FUTURE_WINDOW
+
+
+# Scaled train rows, scaled validation rows, validation prices and the test split's y center and scale of a window,
+# like the pipeline's train_test_split_scale
+def ticker_rows(df):
+    x = lag_features.lag_matrix(df['vwap'].to_numpy(), FUTURE_WINDOW)
+    y = df['close'].to_numpy()[FUTURE_WINDOW - 1:, np.newaxis]
+    scaled = []
+    for split in [x[:-2 * FUTURE_WINDOW], x[-2 * FUTURE_WINDOW:], y[:-2 * FUTURE_WINDOW], y[-2 * FUTURE_WINDOW:]]:
+        center, scale = ticker_tensor.robust_center_and_scale(split[np.newaxis])
+        scaled.append((ticker_tensor.robust_scale(split[np.newaxis], center, scale)[0], center[0], scale[0]))
+    (x_train, _, _), (x_test, _, _), (y_train, _, _), (_, y_center, y_scale) = scaled
+    return (x_train, y_train.ravel(), x_test[:FUTURE_WINDOW], y[-2 * FUTURE_WINDOW:-FUTURE_WINDOW].ravel(),
+            y_center[0], y_scale[0])
+
+
+def sklearn_selection(candidates):
+    def select(rows):
+        x_train, y_train, x_validation, y_validation, y_center, y_scale = rows
+        return min(model_search.validation_mae(clone(candidate).fit(x_train, y_train), x_validation, y_validation,
+                                               y_center, y_scale) for candidate in candidates)
+    return select
+
+
+def path_selection(patience, warm_starts_directory=None):
+    def select(rows, ticker=None):
+        x_train, y_train, x_validation, y_validation, y_center, y_scale = rows
+        warm_starts_path = None if warm_starts_directory is None else os.path.join(warm_starts_directory,
+                                                                                   f'{ticker}.pkl')
+        return model_search.search(*model_search.centered_gram(x_train, y_train), x_validation, y_validation,
+                                   y_center, y_scale, warm_starts_path, patience=patience)[1]
+    return select
+
+
+# (seconds per ticker, mean MAE) of the fastest of repeat runs over every ticker
+def timed(select, windows, repeat=3):
+    seconds = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        maes = [select(rows) for rows in windows]
+        seconds.append(time.perf_counter() - started_at)
+    return min(seconds) / len(windows), float(np.mean(maes))
+
+
+def main():
+    frames = [synthetic_universe.bar_frame(index, BARS + 1) for index in range(TICKERS)]
+    # The window of this cycle and of the next cycle, one bar later
+    cycles = [[ticker_rows(df.iloc[start:start + BARS]) for df in frames] for start in (0, 1)]
+    grid = [LinearRegression()] + [ElasticNet(alpha=alpha, l1_ratio=l1_ratio)
+                                   for l1_ratio in model_search.L1_RATIOS for alpha in model_search.ALPHAS]
+    cases = [
+        ('models (2 sklearn fits)', sklearn_selection(ml.models)),
+        (f'grid ({len(grid)} sklearn fits)', sklearn_selection(grid)),
+        ('path, without early stopping', path_selection(patience=len(model_search.ALPHAS))),
+        ('path, cold', path_selection(patience=model_search.PATIENCE)),
+    ]
+    print(f"{'case':<40}{'per ticker':>12}{'mean MAE':>10}")
+    for name, select in cases:
+        seconds, mae = timed(select, cycles[1])
+        print(f'{name:<40}{seconds * 1e3:>10.2f}ms{mae:>10.4f}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        select = path_selection(model_search.PATIENCE, directory)
+        for ticker, rows in enumerate(cycles[0]):
+            select(rows, ticker)
+        # Every run sees the next cycle's windows, warm started from the previous cycle's coefficients
+        seconds, mae = timed(lambda rows_and_ticker: select(*rows_and_ticker),
+                             [(rows, ticker) for ticker, rows in enumerate(cycles[1])], repeat=1)
+        print(f"{'path, warm started':<40}{seconds * 1e3:>10.2f}ms{mae:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
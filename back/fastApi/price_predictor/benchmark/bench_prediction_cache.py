@@ -0,0 +1,44 @@
+"""Benchmark: one live prediction of a sample ticker, without the prediction cache (PREDICTION_CACHE_SIZE=0), on a
+cache miss and on a cache hit (service/prediction_cache.py).
+
+Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_prediction_cache
+"""
+from sklearn.linear_model import LinearRegression
+
+from .. import main
+from .bench_lag_features import best_of
+from .bench_micro_batching import fit_pipeline
+
+TICKER = 'AAPL'  # Prices in sample_local_data
+
+
+def main_benchmark():
+    main.MODEL_REGISTRY.activate(main.MODEL_REGISTRY.active.with_pipelines(
+        {TICKER: fit_pipeline(LinearRegression(), 0)}))
+    ticker_dto = main.TickerDTO(tickerType='STOCKS', tickerName=TICKER, portfolioType='AGGRESSIVE')
+    cache = main.PREDICTION_CACHE
+
+    def uncached(_):
+        main.PREDICTION_CACHE = None
+        try:
+            return main.predictions_from_ticker_dto(ticker_dto)
+        finally:
+            main.PREDICTION_CACHE = cache
+
+    def miss(_):
+        cache.clear()
+        return main.predictions_from_ticker_dto(ticker_dto)
+
+    def hit(_):
+        return main.predictions_from_ticker_dto(ticker_dto)
+
+    uncached_seconds = best_of(uncached, None)
+    print(f"{'case':<12}{'per request':>14}{'speedup':>10}")
+    for name, function in [('uncached', uncached), ('miss', miss), ('hit', hit)]:
+        seconds = uncached_seconds if function is uncached else best_of(function, None)
+        print(f'{name:<12}{seconds * 1e6:>12.1f}us{uncached_seconds / seconds:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,224 @@
+"""Benchmark suite: the serving API's prediction path and every stage of the ML pipeline, against synthetic universes
+of 10 to 5,000 tickers (synthetic_universe.py), entirely offline.
+
+Per universe size, seconds per call (best of --repeat) of:
+- get_latest_ticker_api_data, from the columnar price store and from the JSON bar files
+- add_lagged_features of the ML pipeline, over the whole universe
+- predictions_from_x_values of a live prediction, fused linear and sklearn (DecisionTreeRegressor) pipelines
+- the live and backtest endpoints, through FastAPI's TestClient
+and seconds per run of the model registry refresh and, measured once, of the price store conversion and each stage of
+one ml.execute.
+
+Results can be saved as JSON and compared with the results of another commit. Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_suite --tickers 10 100 --output results.json
+    python -m back.fastApi.price_predictor.benchmark.bench_suite --tickers 10 100 --compare results.json
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from .. import main as api
+from ..machine_learning import Price_Predictor_Notebook_Local as ml
+from ..machine_learning import parallel_training
+from ..machine_learning import price_store
+from ..service import artifact_store
+from ..service import model_registry
+from . import synthetic_universe
+from .bench_lag_features import best_of
+
+TICKER_COUNTS = [10, 100]
+RESULTS_VERSION = 1
+
+
+# Sets module attributes for the duration of the block
+@contextlib.contextmanager
+def redirected(module, **attributes):
+    previous = {name: getattr(module, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(module, name, value)
+
+
+def ticker_dto_json(ticker_name):
+    return {'tickerType': 'STOCKS', 'tickerName': ticker_name, 'portfolioType': 'AGGRESSIVE'}
+
+
+# Calls function with the next of arguments on each call, so every ticker of the universe is visited
+def cycling(function, arguments):
+    arguments = itertools.cycle(arguments)
+    return lambda _: function(next(arguments))
+
+
+def timed_once(function):
+    started_at = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started_at, result
+
+
+def serving_cases(tickers, tree_tickers, data_directory):
+    linear_tickers = tickers[tree_tickers:] or tickers
+    x_values = api.get_latest_ticker_api_data(linear_tickers[0])
+    backtest_window = [str(price) for price in api.get_latest_ticker_prices(linear_tickers[0])]
+    client = TestClient(api.app)
+    cases = [
+        ('get_latest_ticker_api_data[price_store]', cycling(api.get_latest_ticker_api_data, tickers)),
+        ('predictions_from_x_values[fused]',
+         cycling(lambda ticker: api.predictions_from_x_values(api.TickerDTO(**ticker_dto_json(ticker)), x_values),
+                 linear_tickers)),
+        ('endpoint live', cycling(lambda ticker: client.post('/api/v1/predict/ticker/live',
+                                                             json=ticker_dto_json(ticker)), linear_tickers)),
+        ('endpoint backtest', cycling(
+            lambda ticker: client.post('/api/v1/predict/ticker/backtest',
+                                       json={'tickerDTO': ticker_dto_json(ticker), 'predictions': backtest_window}),
+            linear_tickers)),
+    ]
+    if tree_tickers:
+        cases.append(('predictions_from_x_values[sklearn]', cycling(
+            lambda ticker: api.predictions_from_x_values(api.TickerDTO(**ticker_dto_json(ticker)), x_values),
+            tickers[:tree_tickers])))
+
+    # Same reads without the price store: the split-orient JSON files are parsed
+    def json_read(ticker):
+        with redirected(api, PRICE_STORE_DIRECTORY=os.path.join(os.path.dirname(data_directory), 'no_store')):
+            return api.get_latest_ticker_api_data(ticker)
+
+    cases.append(('get_latest_ticker_api_data[json]', cycling(json_read, tickers)))
+    return cases
+
+
+def run_universe(ticker_count, arguments):
+    results = []
+
+    def record(case, seconds, unit):
+        results.append({'case': case, 'tickers': ticker_count, 'unit': unit, 'seconds': seconds})
+        print(f'{case:<52}{ticker_count:>8}{seconds * 1e6:>14.1f}us/{unit}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        seconds, (data_directory, trained_files_directory) = timed_once(lambda: synthetic_universe.write_universe(
+            directory, ticker_count, arguments.bars, arguments.seed, arguments.tree_tickers))
+        print(f'Generated {ticker_count} tickers in {seconds:.1f}s')
+        tickers = synthetic_universe.ticker_names(ticker_count)
+        store_directory = os.path.join(directory, 'sample_local_store')
+        segments_directory = os.path.join(directory, 'sample_local_segments')
+        registry = model_registry.ModelRegistry(store=artifact_store.LocalArtifactStore(trained_files_directory),
+                                                load_concurrency=api.ARTIFACT_LOAD_CONCURRENCY)
+
+        with redirected(api, DATA_DIRECTORY=data_directory, PRICE_STORE_DIRECTORY=store_directory,
+                        BAR_SEGMENTS_DIRECTORY=segments_directory, MODEL_REGISTRY=registry), \
+                redirected(ml, DOWNLOAD_DIRECTORY=data_directory, PRICE_STORE_DIRECTORY=store_directory,
+                           BAR_SEGMENTS_DIRECTORY=segments_directory, TRAINED_FILES_DIRECTORY=trained_files_directory):
+            record('price_store.convert_directory', timed_once(
+                lambda: price_store.convert_directory(data_directory, store_directory))[0], 'run')
+            record('ModelRegistry.refresh', best_of(lambda _: registry.refresh(force=True), None,
+                                                    repeat=arguments.repeat), 'run')
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                df_raw = ml.json_to_dataframes(store_directory)
+            record('add_lagged_features', best_of(
+                lambda df: ml.add_lagged_features(df, ml.LABEL, ml.FEATURES, ml.FUTURE_DATAPOINTS_QUANTITY), df_raw,
+                repeat=arguments.repeat), 'run')
+
+            for case, function in serving_cases(tickers, min(arguments.tree_tickers, ticker_count), data_directory):
+                record(case, best_of(function, None, repeat=arguments.repeat), 'call')
+
+            if not arguments.skip_training:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    seconds, timings = timed_once(ml.execute)
+                for stage, stage_seconds in timings['stage_seconds'].items():
+                    record(f'ml.execute/{stage}', stage_seconds, 'run')
+                record('ml.execute', seconds, 'run')
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Prints the ratio of every case also in baseline. Returns the cases slower than threshold times the baseline.
+def compare(results, baseline, threshold):
+    baseline_seconds = {(result['case'], result['tickers']): result['seconds'] for result in baseline['results']}
+    print(f"\nBaseline: commit {baseline.get('commit')} of {baseline.get('created')}")
+    print(f"{'case':<52}{'tickers':>8}{'baseline':>14}{'current':>14}{'ratio':>8}")
+    regressions = []
+    for result in results:
+        key = (result['case'], result['tickers'])
+        if key not in baseline_seconds:
+            continue
+        ratio = result['seconds'] / baseline_seconds[key]
+        flag = ''
+        if ratio > threshold:
+            regressions.append(result)
+            flag = '  REGRESSION'
+        print(f"{result['case']:<52}{result['tickers']:>8}{baseline_seconds[key] * 1e6:>12.1f}us"
+              f"{result['seconds'] * 1e6:>12.1f}us{ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tickers', type=int, nargs='+', default=TICKER_COUNTS,
+                        help='universe sizes, e.g. 10 100 1000 5000')
+    parser.add_argument('--bars', type=int, default=synthetic_universe.BARS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tree-tickers', type=int, default=1,
+                        help='tickers with a DecisionTreeRegressor, predicted through sklearn')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-training', action='store_true', help='do not run ml.execute')
+    parser.add_argument('--output', help='JSON file to save the results to')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='ratio to the compared results above which a case is a regression')
+    arguments = parser.parse_args()
+
+    print(f"{'case':<52}{'tickers':>8}{'seconds':>16}")
+    results = []
+    try:
+        for ticker_count in arguments.tickers:
+            results.extend(run_universe(ticker_count, arguments))
+    finally:
+        parallel_training.shutdown()
+
+    report = {
+        'version': RESULTS_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'arguments': {'bars': arguments.bars, 'seed': arguments.seed, 'tree_tickers': arguments.tree_tickers,
+                      'repeat': arguments.repeat},
+        'results': results,
+    }
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'Saved results to {arguments.output}')
+    if arguments.compare:
+        with open(arguments.compare, 'r') as file:
+            baseline = json.load(file)
+        if compare(results, baseline, arguments.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,97 @@
+"""Benchmark: tensor train-test split and robust scaling vs the previous MultiIndex .loc loop.
+
+Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_train_test_split
+"""
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import RobustScaler
+
+from ..machine_learning import Price_Predictor_Notebook_Local as ml
+from .bench_lag_features import best_of
+
+ROWS = 820  # lagged rows per ticker of the sample data
+TICKER_COUNTS = [3, 50]
+
+
+# Previous train_test_split_scale of Price_Predictor_Notebook_Local: slice, concat, re-index, .loc scaling per ticker
+def pandas_split_scale(df, features=ml.FEATURES, label=ml.LABEL, future_datapoints=ml.FUTURE_DATAPOINTS_QUANTITY):
+    train_data = []
+    test_data = []
+    tickers = df.index.get_level_values('ticker').unique()
+    for ticker in tickers:
+        ticker_df = df.loc[ticker]
+        train_df = ticker_df[:-2 * future_datapoints].copy()
+        test_df = ticker_df[-2 * future_datapoints:].copy()
+        train_df['ticker'] = ticker
+        test_df['ticker'] = ticker
+        train_data.append(train_df)
+        test_data.append(test_df)
+
+    train_data = pd.concat(train_data)
+    test_data = pd.concat(test_data)
+    train_data.reset_index(inplace=True, drop=False)
+    train_data.set_index(['ticker', 'index'], inplace=True)
+    test_data.reset_index(inplace=True, drop=False)
+    test_data.set_index(['ticker', 'index'], inplace=True)
+
+    X_train = train_data[features].astype(float)
+    y_train = train_data[label].astype(float)
+    X_test = test_data[features].astype(float)
+    y_test = test_data[label].astype(float)
+    scalers = {}
+    for ticker in tickers:
+        row_labels = pd.IndexSlice[ticker, :]
+        scalers[ticker] = [RobustScaler().fit(X_train.loc[row_labels]), RobustScaler().fit(X_test.loc[row_labels]),
+                           RobustScaler().fit(y_train.loc[row_labels]), RobustScaler().fit(y_test.loc[row_labels])]
+        X_train.loc[row_labels] = scalers[ticker][0].transform(X_train.loc[row_labels])
+        X_test.loc[row_labels] = scalers[ticker][1].transform(X_test.loc[row_labels])
+        y_train.loc[row_labels] = scalers[ticker][2].transform(y_train.loc[row_labels])
+        y_test.loc[row_labels] = scalers[ticker][3].transform(y_test.loc[row_labels])
+    return scalers, X_train, X_test, y_train, y_test
+
+
+def tensor_split_scale(df):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ml.train_test_split_scale(df, ml.FEATURES, ml.LABEL, ml.FUTURE_DATAPOINTS_QUANTITY)
+
+
+def lagged_universe(ticker_count, rng):
+    frames = []
+    for i in range(ticker_count):
+        vwap = 100 + np.cumsum(rng.normal(0, 0.5, ROWS + ml.FUTURE_DATAPOINTS_QUANTITY - 1))
+        index = pd.MultiIndex.from_product([[f'T{i:03d}'], pd.RangeIndex(len(vwap))], names=['ticker', None])
+        frames.append(pd.DataFrame({'close': vwap + rng.normal(0, 0.1, len(vwap)), 'vwap': vwap}, index=index))
+    return ml.add_lagged_features(pd.concat(frames), ml.LABEL, ml.FEATURES, ml.FUTURE_DATAPOINTS_QUANTITY)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print('| tickers | .loc loop | tensor | speedup |')
+    print('|---------|-----------|--------|---------|')
+    for ticker_count in TICKER_COUNTS:
+        df = lagged_universe(ticker_count, rng)
+
+        scalers, *frames = pandas_split_scale(df)
+        tickers, *tensors = tensor_split_scale(df)
+        for i, ticker in enumerate(tickers):
+            for scaler, dictionary_scaler in zip(scalers[ticker], [ml.dictionary_X_train_scaler,
+                                                                   ml.dictionary_X_test_scaler,
+                                                                   ml.dictionary_y_train_scaler,
+                                                                   ml.dictionary_y_test_scaler]):
+                np.testing.assert_array_equal(scaler.center_, dictionary_scaler[ticker].center_)
+                np.testing.assert_array_equal(scaler.scale_, dictionary_scaler[ticker].scale_)
+            for frame, tensor in zip(frames, tensors):
+                np.testing.assert_array_equal(frame.loc[ticker].to_numpy(), tensor[i])
+
+        pandas_seconds = best_of(pandas_split_scale, df, repeat=3)
+        tensor_seconds = best_of(tensor_split_scale, df, repeat=3)
+        print(f'| {ticker_count} | {pandas_seconds * 1e3:.1f}ms | {tensor_seconds * 1e3:.1f}ms '
+              f'| {pandas_seconds / tensor_seconds:.1f}x |')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark: serialization cost and size of float arrays by payload size, in the default JSON contract (List[Decimal])
+vs the float JSON and float64 wire formats of service/wire_format.py, with and without gzip.
+
+decode: request body -> BacktestHistoryDTO with a float64 price array. encode: prediction array -> PredictionDTO ->
+response body. gzip: compressing the body at main.GZIP_COMPRESS_LEVEL. The default JSON cases follow FastAPI's path:
+json.loads + Pydantic validation for requests, DTO construction + response validation + json.dumps for responses.
+
+Run from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.bench_wire_format
+"""
+import gzip
+import json
+
+import numpy as np
+
+from .. import main
+from ..service import wire_format
+from .bench_lag_features import best_of
+
+FLOATS = [39, 1000, 10000, 100000]
+TICKER_DTO = {'tickerType': 'STOCKS', 'tickerName': 'AAPL', 'portfolioType': 'AGGRESSIVE'}
+
+
+def default_decode(body):
+    history = main.BacktestHistoryDTO.model_validate(json.loads(body))
+    return np.asarray(history.prices, dtype=np.float64)
+
+
+def default_encode(predictions):
+    prediction_dto = main.PredictionDTO(tickerDTO=TICKER_DTO, predictions=predictions.tolist())
+    validated = main.PredictionDTO.model_validate(prediction_dto.model_dump())
+    return json.dumps(validated.model_dump(mode='json'), separators=(',', ':')).encode()
+
+
+def wire_decode(body, media_type):
+    return wire_format.parse(main.BacktestHistoryDTO, wire_format.decode(body, media_type)).prices
+
+
+def wire_encode(predictions, media_type):
+    return wire_format.encode(main.PredictionDTO.model_construct(tickerDTO=main.TickerDTO(**TICKER_DTO),
+                                                                 predictions=predictions), media_type)
+
+
+def compress(body):
+    return gzip.compress(body, compresslevel=main.GZIP_COMPRESS_LEVEL)
+
+
+def main_benchmark():
+    print(f"{'format':<12}{'floats':>8}{'bytes':>10}{'gzip':>10}{'decode':>12}{'encode':>12}{'gzip':>12}")
+    for count in FLOATS:
+        values = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.5, count))
+        default_body = json.dumps({'tickerDTO': TICKER_DTO, 'prices': [str(value) for value in values]}).encode()
+        cases = [('json', default_body, default_decode, default_encode)]
+        for name, media_type in [('float json', wire_format.FLOAT_JSON), ('float64', wire_format.FLOAT64)]:
+            body = wire_format.encode({'tickerDTO': TICKER_DTO, 'prices': values}, media_type)
+            cases.append((name, body, lambda body, media_type=media_type: wire_decode(body, media_type),
+                          lambda predictions, media_type=media_type: wire_encode(predictions, media_type)))
+
+        for name, body, decode, encode in cases:
+            np.testing.assert_allclose(decode(body), values)
+            decode_seconds = best_of(decode, body, repeat=3)
+            encode_seconds = best_of(encode, values, repeat=3)
+            gzip_seconds = best_of(compress, body, repeat=3)
+            print(f'{name:<12}{count:>8}{len(body):>10}{len(compress(body)):>10}{decode_seconds * 1e6:>10.1f}us'
+                  f'{encode_seconds * 1e6:>10.1f}us{gzip_seconds * 1e6:>10.1f}us')
+
+
+if __name__ == '__main__':
+    main_benchmark()
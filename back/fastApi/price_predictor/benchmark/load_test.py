@@ -0,0 +1,315 @@
+"""Load test: replays the Spring backend's prediction call patterns against the serving API, in-process or over a local
+socket, entirely offline.
+
+Patterns (--pattern):
+- backtest: BackTestingStrategy. Each session is one ticker's simulation: one /api/v1/predict/ticker/backtest call
+  per bar, with the 77 prices from that bar on. The next call waits for the previous response.
+- backtest-session: the backtest pattern through a backtest session, opened with the first 77 prices, then one
+  /api/v1/predict/ticker/backtest/sessions/step call per bar with its price. Closed-loop only.
+- live: LiveTradingStrategy. Each market data tick of a ticker sends that ticker's latest 76 prices to
+  /api/v1/predict/ticker/backtest, rotating across --live-tickers tickers.
+- live-endpoint: /api/v1/predict/ticker/live calls rotating across the tickers, prices read by the server.
+
+Loop modes: closed-loop, with --clients sessions each sending its next request when the previous one completes.
+Open-loop, with --rate requests per second sent on a fixed schedule whatever the response times. Open-loop latency is
+measured from each request's scheduled time, so a server falling behind shows in the latency.
+A request is an error when the response is not 200 or holds no predictions (the endpoints answer failed predictions
+with an empty list).
+
+In-process (default), the API serves a synthetic universe (synthetic_universe.py) through httpx's ASGI transport.
+With --url, requests go to a running server, e.g. `fastapi run` from /back/fastApi/price_predictor/, for --tickers
+(default AAPL,META,NVDA), with synthetic prices. --with-training runs ml.execute on the synthetic universe
+continuously during the test, in a TrainingWorker process configured like the API's, to measure how training
+interferes with serving.
+
+Run from the repository root, e.g.:
+    python -m back.fastApi.price_predictor.benchmark.load_test --pattern backtest --clients 8
+    python -m back.fastApi.price_predictor.benchmark.load_test --pattern live --rate 500 --with-training
+    python -m back.fastApi.price_predictor.benchmark.load_test --url http://127.0.0.1:8000 --rate 200
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+
+from .. import main as api
+from ..machine_learning import Price_Predictor_Notebook_Local as ml
+from ..machine_learning import price_store
+from ..machine_learning import training_worker
+from ..service import artifact_store
+from ..service import model_registry
+from . import synthetic_universe
+from .bench_suite import redirected, ticker_dto_json
+
+BACKTEST_WINDOW = 77  # BackTestingStrategy: MIN_INPUT_SIZE + 1 prices per call
+LIVE_WINDOW = 76  # LiveTradingStrategy: the latest MIN_INPUT_SIZE prices
+DEFAULT_SOCKET_TICKERS = ['AAPL', 'META', 'NVDA']
+
+
+# Runs in the training worker process: the ML pipeline over the synthetic universe in directory, its output silenced
+def execute_pipeline_in(directory, progress):
+    ml.DOWNLOAD_DIRECTORY = f'{directory}/{synthetic_universe.DATA_DIRECTORY_NAME}'
+    ml.PRICE_STORE_DIRECTORY = f'{directory}/sample_local_store'
+    ml.BAR_SEGMENTS_DIRECTORY = f'{directory}/sample_local_segments'
+    ml.TRAINED_FILES_DIRECTORY = f'{directory}/{synthetic_universe.TRAINED_FILES_DIRECTORY_NAME}'
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return ml.execute(progress=progress)
+
+
+# One backtest simulation per session: the window slides by one bar per call, as the Spring backend drops the oldest
+# bar of its history after each prediction. Restarts from the first bar when the history is exhausted.
+def backtest_session(ticker, prices):
+    for start in itertools.cycle(range(len(prices) - BACKTEST_WINDOW + 1)):
+        yield '/api/v1/predict/ticker/backtest', {
+            'tickerDTO': ticker_dto_json(ticker),
+            'predictions': [str(price) for price in prices[start:start + BACKTEST_WINDOW]]}
+
+
+# The backtest pattern as a backtest session: each step sends the new bar's price only. A session reaching the end of
+# the history is left to expire, and a new one is opened from the first bar.
+def backtest_session_steps(ticker, prices):
+    while True:
+        response = yield '/api/v1/predict/ticker/backtest/sessions', {
+            'tickerDTO': ticker_dto_json(ticker),
+            'prices': [str(price) for price in prices[:BACKTEST_WINDOW]]}
+        session_id = (response or {}).get('sessionId')
+        for price in prices[BACKTEST_WINDOW:] if session_id else []:
+            response = yield '/api/v1/predict/ticker/backtest/sessions/step', {'sessionId': session_id,
+                                                                               'price': str(price)}
+
+
+# Market data ticks across tickers. Each tick of a ticker moves its latest bar forward by one.
+def live_session(tickers, prices_by_ticker, offset=0):
+    cursors = {ticker: LIVE_WINDOW for ticker in tickers}
+    for ticker in itertools.islice(itertools.cycle(tickers), offset, None):
+        prices = prices_by_ticker[ticker]
+        end = cursors[ticker]
+        cursors[ticker] = end + 1 if end < len(prices) else LIVE_WINDOW
+        yield '/api/v1/predict/ticker/backtest', {
+            'tickerDTO': ticker_dto_json(ticker),
+            'predictions': [str(price) for price in prices[end - LIVE_WINDOW:end]]}
+
+
+def live_endpoint_session(tickers, offset=0):
+    for ticker in itertools.islice(itertools.cycle(tickers), offset, None):
+        yield '/api/v1/predict/ticker/live', ticker_dto_json(ticker)
+
+
+def make_session(pattern, index, tickers, prices_by_ticker):
+    if pattern == 'backtest':
+        ticker = tickers[index % len(tickers)]
+        return backtest_session(ticker, prices_by_ticker[ticker])
+    if pattern == 'backtest-session':
+        ticker = tickers[index % len(tickers)]
+        return backtest_session_steps(ticker, prices_by_ticker[ticker])
+    if pattern == 'live':
+        return live_session(tickers, prices_by_ticker, offset=index)
+    return live_endpoint_session(tickers, offset=index)
+
+
+class Recorder:
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.latencies = []
+        self.errors = 0
+        self.dropped = 0
+
+    def record(self, started_at, finished_at, ok):
+        if started_at < self.measure_from:
+            return
+        self.latencies.append(finished_at - started_at)
+        if not ok:
+            self.errors += 1
+
+
+# Returns the response body, None when the request failed
+async def send(client, request, recorder, started_at):
+    path, body = request
+    response_body = None
+    try:
+        response = await client.post(path, json=body)
+        response_body = response.json() if response.status_code == 200 else None
+        ok = response_body is not None and len(response_body.get('predictions') or []) > 0
+    except httpx.HTTPError:
+        ok = False
+    recorder.record(started_at, time.perf_counter(), ok)
+    return response_body
+
+
+# Each session is sent the response to its previous request, which backtest-session sessions continue from
+async def closed_loop(client, sessions, recorder, stop_at):
+    async def run_session(session):
+        response_body = None
+        while time.perf_counter() < stop_at:
+            response_body = await send(client, session.send(response_body), recorder, time.perf_counter())
+
+    await asyncio.gather(*(run_session(session) for session in sessions))
+
+
+# Requests are sent round robin across the sessions at a fixed rate. Arrivals beyond max_in_flight outstanding
+# requests are dropped, and counted as errors.
+async def open_loop(client, sessions, recorder, stop_at, rate, max_in_flight):
+    requests = (next(session) for session in itertools.cycle(sessions))
+    in_flight = set()
+    started_at = time.perf_counter()
+    for arrival in itertools.count():
+        scheduled_at = started_at + arrival / rate
+        if scheduled_at >= stop_at:
+            break
+        await asyncio.sleep(max(scheduled_at - time.perf_counter(), 0))
+        if len(in_flight) >= max_in_flight:
+            if scheduled_at >= recorder.measure_from:
+                recorder.dropped += 1
+            continue
+        task = asyncio.create_task(send(client, next(requests), recorder, scheduled_at))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+def report(recorder, seconds):
+    latencies = np.array(recorder.latencies) * 1000
+    requests = len(latencies) + recorder.dropped
+    errors = recorder.errors + recorder.dropped
+    percentiles = np.percentile(latencies, [50, 95, 99]) if len(latencies) else [float('nan')] * 3
+    return {
+        'requests': requests,
+        'throughput': (len(latencies) - recorder.errors) / seconds,
+        'error_rate': errors / requests if requests else 0.0,
+        'p50_ms': percentiles[0],
+        'p95_ms': percentiles[1],
+        'p99_ms': percentiles[2],
+        'max_ms': float(latencies.max()) if len(latencies) else float('nan'),
+        'dropped': recorder.dropped,
+    }
+
+
+# Re-triggers the pipeline whenever the worker is idle, until stop is set
+def train_continuously(worker, stop):
+    while not stop.is_set():
+        worker.trigger()
+        while not worker.wait_until_idle(timeout=0.1) and not stop.is_set():
+            pass
+
+
+@contextlib.contextmanager
+def serving_universe(directory, tickers, arguments):
+    data_directory, trained_files_directory = synthetic_universe.write_universe(
+        directory, tickers, arguments.bars, arguments.seed, tree_tickers=0)
+    store_directory = f'{directory}/sample_local_store'
+    price_store.convert_directory(data_directory, store_directory)
+    registry = model_registry.ModelRegistry(store=artifact_store.LocalArtifactStore(trained_files_directory),
+                                            load_concurrency=api.ARTIFACT_LOAD_CONCURRENCY)
+    registry.refresh()
+    with redirected(api, DATA_DIRECTORY=data_directory, PRICE_STORE_DIRECTORY=store_directory,
+                    BAR_SEGMENTS_DIRECTORY=f'{directory}/sample_local_segments', MODEL_REGISTRY=registry):
+        yield
+
+
+async def run_load(arguments, tickers, prices_by_ticker):
+    if arguments.url:
+        client = httpx.AsyncClient(base_url=arguments.url, timeout=arguments.timeout,
+                                   limits=httpx.Limits(max_connections=arguments.max_in_flight))
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url='http://testserver',
+                                   timeout=arguments.timeout)
+    session_count = arguments.clients if arguments.rate is None else arguments.sessions
+    sessions = [make_session(arguments.pattern, index, tickers, prices_by_ticker) for index in range(session_count)]
+    async with client:
+        started_at = time.perf_counter()
+        recorder = Recorder(measure_from=started_at + arguments.warmup)
+        stop_at = started_at + arguments.warmup + arguments.duration
+        if arguments.rate is None:
+            await closed_loop(client, sessions, recorder, stop_at)
+        else:
+            await open_loop(client, sessions, recorder, stop_at, arguments.rate, arguments.max_in_flight)
+    return report(recorder, arguments.duration)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pattern', choices=['backtest', 'backtest-session', 'live', 'live-endpoint'],
+                        default='backtest')
+    parser.add_argument('--clients', type=int, default=8, help='closed-loop: concurrent sessions')
+    parser.add_argument('--rate', type=float, help='open-loop: requests per second (default: closed-loop)')
+    parser.add_argument('--sessions', type=int, default=16, help='open-loop: sessions the requests rotate across')
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds before measuring')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--tickers',
+                        help='comma separated tickers (default: the universe, or AAPL,META,NVDA with --url)')
+    parser.add_argument('--universe', type=int, default=100, help='synthetic tickers served in-process and trained')
+    parser.add_argument('--live-tickers', type=int, help='tickers the live patterns rotate across (default: all)')
+    parser.add_argument('--bars', type=int, default=synthetic_universe.BARS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help='base URL of a running server, instead of serving in-process')
+    parser.add_argument('--with-training', action='store_true', help='run ml.execute continuously during the test')
+    parser.add_argument('--output', help='JSON file to save the report to')
+    arguments = parser.parse_args()
+    if arguments.pattern == 'backtest-session' and arguments.rate is not None:
+        parser.error('--pattern backtest-session waits for each response, it runs closed-loop only')
+
+    with tempfile.TemporaryDirectory() as directory, contextlib.ExitStack() as stack:
+        if arguments.url is None:
+            stack.enter_context(serving_universe(directory, arguments.universe, arguments))
+        elif arguments.with_training:
+            synthetic_universe.write_universe(directory, arguments.universe, arguments.bars, arguments.seed,
+                                              tree_tickers=0)
+        if arguments.tickers:
+            tickers = arguments.tickers.split(',')
+        else:
+            tickers = DEFAULT_SOCKET_TICKERS if arguments.url else synthetic_universe.ticker_names(arguments.universe)
+        tickers = tickers[:arguments.live_tickers] if arguments.live_tickers else tickers
+        prices_by_ticker = {ticker: synthetic_universe.bar_frame(index, arguments.bars, arguments.seed)['vwap'].values
+                            for index, ticker in enumerate(tickers)}
+
+        worker = None
+        stop_training = threading.Event()
+        if arguments.with_training:
+            worker = training_worker.TrainingWorker(target=functools.partial(execute_pipeline_in, directory),
+                                                    cpus=api.TRAINING_WORKER.cpus,
+                                                    blas_threads=api.TRAINING_WORKER.blas_threads,
+                                                    nice=api.TRAINING_WORKER.nice)
+            trainer = threading.Thread(target=train_continuously, args=(worker, stop_training), daemon=True)
+            trainer.start()
+            # Measure once the first run has started in the worker process
+            while worker.status()['runs_started'] == 0:
+                time.sleep(0.01)
+        try:
+            result = asyncio.run(run_load(arguments, tickers, prices_by_ticker))
+        finally:
+            if worker is not None:
+                stop_training.set()
+                result_training = worker.status()
+                # The run in progress writes into the universe's directory, which is removed next
+                worker.wait_until_idle()
+                worker.shutdown()
+
+    mode = f'open-loop {arguments.rate:g} req/s' if arguments.rate else f'closed-loop {arguments.clients} clients'
+    result.update(pattern=arguments.pattern, mode=mode, target=arguments.url or 'in-process', tickers=len(tickers),
+                  training=arguments.with_training)
+    if worker is not None:
+        result['training_runs_completed'] = result_training['runs_completed']
+    print(f"{arguments.pattern}, {mode}, {result['target']}, {len(tickers)} tickers"
+          f"{', training' if arguments.with_training else ''}")
+    print(f"requests {result['requests']}  throughput {result['throughput']:.1f} req/s  "
+          f"error rate {result['error_rate']:.2%}  p50 {result['p50_ms']:.2f}ms  p95 {result['p95_ms']:.2f}ms  "
+          f"p99 {result['p99_ms']:.2f}ms  max {result['max_ms']:.2f}ms")
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == '__main__':
+    main_benchmark()
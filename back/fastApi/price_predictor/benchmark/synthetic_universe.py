@@ -0,0 +1,110 @@
+"""Deterministic synthetic universe of tickers for the benchmarks, written in the layout the serving API and the ML
+pipeline read:
+
+    <directory>/sample_local_data/<ticker>.json              split-orient 10-minute bars, as downloaded from Polygon.io
+    <directory>/sample_local_trained_files/generations/...  one published generation (model_generations.py)
+
+Each ticker's bars are a random walk seeded by (seed, ticker index), so a universe of N tickers is the first N tickers
+of any larger universe with the same seed. Trained files are fitted on the ticker's own bars like the ML pipeline's:
+LinearRegression and ElasticNet, alternately, and DecisionTreeRegressor for the first tree_tickers tickers, whose
+predictions take the sklearn path instead of the fused linear one.
+
+Generate a universe on its own, from the repository root:
+    python -m back.fastApi.price_predictor.benchmark.synthetic_universe /tmp/universe --tickers 1000
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import ElasticNet, LinearRegression
+from sklearn.preprocessing import RobustScaler
+from sklearn.tree import DecisionTreeRegressor
+
+from ..machine_learning import Price_Predictor_Notebook_Local as ml
+from ..machine_learning import coefficient_bundle
+from ..machine_learning import lag_features
+from ..machine_learning import model_generations
+
+DATA_DIRECTORY_NAME = 'sample_local_data'
+TRAINED_FILES_DIRECTORY_NAME = 'sample_local_trained_files'
+# The ML pipeline's window plus one live prediction's worth of bars
+BARS = ml.WINDOW_DATAPOINTS_QUANTITY + ml.FUTURE_DATAPOINTS_QUANTITY + 2 * ml.FUTURE_DATAPOINTS_QUANTITY
+COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'vwap', 'timestamp', 'transactions', 'otc']
+FIRST_TIMESTAMP_MS = 1704205800000  # 2024-01-02 14:30 UTC
+BAR_MS = 10 * 60 * 1000
+
+
+def ticker_names(ticker_count):
+    return [f'SYN{index:04d}' for index in range(ticker_count)]
+
+
+def bar_frame(index, bars=BARS, seed=0):
+    rng = np.random.default_rng([seed, index])
+    start_price = rng.uniform(10, 500)
+    vwap = start_price * np.exp(np.cumsum(rng.normal(0, 0.002, bars)))
+    spread = vwap * rng.uniform(0.0005, 0.003, bars)
+    close = vwap + rng.normal(0, 0.5, bars) * spread
+    open_ = np.concatenate([[vwap[0]], close[:-1]])
+    return pd.DataFrame({
+        'open': open_.round(4),
+        'high': (np.maximum(open_, close) + spread).round(4),
+        'low': (np.minimum(open_, close) - spread).round(4),
+        'close': close.round(4),
+        'volume': rng.integers(100, 100000, bars).astype(float),
+        'vwap': vwap.round(4),
+        'timestamp': FIRST_TIMESTAMP_MS + BAR_MS * np.arange(bars),
+        'transactions': rng.integers(1, 1000, bars),
+        'otc': None,
+    }, columns=COLUMNS)
+
+
+# Fitted like the ML pipeline: robust scaling of the lagged vwap features and of the close label
+def fit_pipeline(df, model):
+    window = df.iloc[-(ml.WINDOW_DATAPOINTS_QUANTITY + ml.FUTURE_DATAPOINTS_QUANTITY):]
+    x_values = lag_features.lag_matrix(window['vwap'].to_numpy(), ml.FUTURE_DATAPOINTS_QUANTITY)
+    y_values = window['close'].to_numpy()[-len(x_values):].reshape(-1, 1)
+    x_scaler = RobustScaler().fit(x_values)
+    y_scaler = RobustScaler().fit(y_values)
+    return model.fit(x_scaler.transform(x_values), y_scaler.transform(y_values).ravel()), x_scaler, y_scaler
+
+
+def model_for(index, tree_tickers):
+    if index < tree_tickers:
+        return DecisionTreeRegressor(max_depth=8, random_state=index)
+    return LinearRegression() if index % 2 == 0 else ElasticNet(alpha=0.2, l1_ratio=0.2)
+
+
+# Writes the bar files and one published generation of trained files of ticker_count tickers into directory.
+# Returns (data directory, trained files directory).
+def write_universe(directory, ticker_count, bars=BARS, seed=0, tree_tickers=1):
+    data_directory = os.path.join(directory, DATA_DIRECTORY_NAME)
+    trained_files_directory = os.path.join(directory, TRAINED_FILES_DIRECTORY_NAME)
+    os.makedirs(data_directory, exist_ok=True)
+    os.makedirs(model_generations.generations_directory(trained_files_directory), exist_ok=True)
+
+    generation, staging_directory = model_generations.start_generation(trained_files_directory)
+    for index, ticker in enumerate(ticker_names(ticker_count)):
+        df = bar_frame(index, bars, seed)
+        df.to_json(os.path.join(data_directory, f'{ticker}.json'), orient='split')
+        model_generations.write_bundle(staging_directory, ticker, *fit_pipeline(df, model_for(index, tree_tickers)))
+    coefficient_bundle.write_generation_bundle(staging_directory)
+    model_generations.publish_generation(trained_files_directory, generation, staging_directory)
+    return data_directory, trained_files_directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('directory')
+    parser.add_argument('--tickers', type=int, default=100)
+    parser.add_argument('--bars', type=int, default=BARS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tree-tickers', type=int, default=1)
+    arguments = parser.parse_args()
+    data_directory, trained_files_directory = write_universe(arguments.directory, arguments.tickers, arguments.bars,
+                                                             arguments.seed, arguments.tree_tickers)
+    print(f'Wrote {arguments.tickers} tickers to {data_directory} and {trained_files_directory}')
+
+
+if __name__ == '__main__':
+    main()
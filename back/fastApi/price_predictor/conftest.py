@@ -0,0 +1,164 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+import pytest
+
+'''
+Local stand-ins of the data provider (Polygon aggregates) and the object store (S3 PutObject / GetObject /
+ListObjectsV2)
+'''
+
+AGGS_PATH = re.compile(r'^/v2/aggs/ticker/(?P<ticker>[^/]+)/range/(?P<multiplier>\d+)/(?P<timespan>\w+)/')
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.lock = threading.Lock()
+        self.requests = []  # (method, path)
+        self.connections = set()  # client (host, port) of every connection that sent a request
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is observable
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body=b'', content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def track(self, handle):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path))
+            server.connections.add(self.client_address)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            handle()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+class PolygonHandler(StandInHandler):
+    def do_GET(self):
+        self.track(self.handle_aggs)
+
+    def handle_aggs(self):
+        server = self.server
+        match = AGGS_PATH.match(self.path)
+        if match is None:
+            return self.send_body(404, b'{"status": "NOT_FOUND"}')
+        ticker = match.group('ticker')
+        with server.lock:
+            server.attempts[ticker] = server.attempts.get(ticker, 0) + 1
+            failures_left = server.failures.get(ticker, 0)
+            if failures_left:
+                server.failures[ticker] = failures_left - 1
+        if failures_left:
+            return self.send_body(500, b'{"status": "ERROR"}')
+        if server.latency_seconds:
+            threading.Event().wait(server.latency_seconds)
+        results = [{'o': 100.0 + i, 'h': 101.0 + i, 'l': 99.0 + i, 'c': 100.5 + i, 'v': 1000.0, 'vw': 100.2 + i,
+                    't': 1722000000000 + i * 600000, 'n': 10}
+                   for i in range(server.first_bar, server.first_bar + server.bars)]
+        body = json.dumps({'ticker': ticker, 'status': 'OK', 'resultsCount': len(results), 'results': results})
+        self.send_body(200, body.encode())
+
+
+class S3Handler(StandInHandler):
+    def do_PUT(self):
+        self.track(self.handle_put)
+
+    def do_GET(self):
+        self.track(self.handle_get)
+
+    def read_body(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if 'aws-chunked' in self.headers.get('Content-Encoding', ''):
+            # <hex size>[;chunk-signature=...]\r\n<data>\r\n ... 0\r\n<trailers>
+            data, rest = b'', body
+            while rest:
+                size_line, rest = rest.split(b'\r\n', 1)
+                size = int(size_line.split(b';')[0], 16)
+                if size == 0:
+                    break
+                data, rest = data + rest[:size], rest[size + 2:]
+            body = data
+        return body
+
+    def handle_put(self):
+        self.server.objects[self.path.split('?')[0]] = self.read_body()
+        self.send_body(200, headers={'ETag': '"stand-in"'})
+
+    def handle_get(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if 'list-type' in query:
+            return self.handle_list(url.path.strip('/'), query.get('prefix', [''])[0])
+        if self.server.latency_seconds:
+            threading.Event().wait(self.server.latency_seconds)
+        body = self.server.objects.get(url.path)
+        if body is None:
+            return self.send_body(404, b'<Error><Code>NoSuchKey</Code></Error>', 'application/xml')
+        self.send_body(200, body, 'application/octet-stream')
+
+    def handle_list(self, bucket, prefix):
+        keys = sorted(path[len(bucket) + 2:] for path in self.server.objects
+                      if path.startswith(f'/{bucket}/{prefix}'))
+        contents = ''.join(f'<Contents><Key>{escape(key)}</Key><Size>{len(self.server.objects[f"/{bucket}/{key}"])}'
+                           f'</Size></Contents>' for key in keys)
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult><Name>{bucket}</Name>'
+                f'<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(keys)}</KeyCount><IsTruncated>false</IsTruncated>'
+                f'{contents}</ListBucketResult>')
+        self.send_body(200, body.encode(), 'application/xml')
+
+
+def start(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def polygon_stand_in():
+    server = StandInServer(PolygonHandler)
+    server.attempts = {}  # key: ticker, value: requests received
+    server.failures = {}  # key: ticker, value: number of next requests answered with HTTP 500
+    server.latency_seconds = 0.0
+    server.bars = 5
+    server.first_bar = 0  # bar i is 10 minutes after bar i - 1
+    yield start(server)
+    server.shutdown()
+    server.server_close()
+
+
+# Objects are kept in server.objects, key: '/<bucket>/<key>' (path-style addressing)
+@pytest.fixture
+def s3_stand_in():
+    server = StandInServer(S3Handler)
+    server.objects = {}
+    server.latency_seconds = 0.0  # of every GetObject
+    yield start(server)
+    server.shutdown()
+    server.server_close()
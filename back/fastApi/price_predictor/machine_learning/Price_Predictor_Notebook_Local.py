@@ -11,7 +11,7 @@ import logging
 from pathlib import Path
 
 # Download files
-import os, re, sys, time
+import os, re, shutil, sys, time
 import requests
 
 # Data Preprocessing
@@ -33,6 +33,24 @@ import pickle
 # # AWS SDK
 # import boto3
 
+# Lag features and columnar price store shared with the serving API
+from . import lag_features
+from . import price_store
+from . import bar_segments
+# Versioned trained files read by the serving API
+from . import model_generations
+from . import coefficient_bundle
+# Per-ticker tasks on a process pool
+from . import parallel_training
+# Dense (ticker, time, feature) tensors and vectorized robust scaling
+from . import ticker_tensor
+# Reparses only ticker files that changed since the last cycle
+from . import loader_cache
+# Linear models updated from the sums of the previous cycle's window
+from . import incremental_training
+# Regularization path search of each ticker's model
+from . import model_search
+
 
 def get_project_root() -> Path:
     return Path(__file__).parent.parent
@@ -49,12 +67,24 @@ def get_repo_root() -> Path:
 PARENT_DIRECTORY_PATH = str(get_project_root())
 REPO_ROOT_PATH = str(get_repo_root())
 DOWNLOAD_DIRECTORY = PARENT_DIRECTORY_PATH + '/sample_local_data'
+PRICE_STORE_DIRECTORY = PARENT_DIRECTORY_PATH + '/sample_local_store'
+# Compressed daily segments appended by ingestion (service/get_data.py). Used instead of the price store when present.
+BAR_SEGMENTS_DIRECTORY = os.getenv('BAR_SEGMENTS_DIRECTORY', PARENT_DIRECTORY_PATH + '/sample_local_segments')
 TRAINED_FILES_DIRECTORY = PARENT_DIRECTORY_PATH + '/sample_local_trained_files'
+# 'full' refits every model on the window. 'incremental' updates the linear models from sufficient statistics kept per
+# ticker under TRAINED_FILES_DIRECTORY (incremental_training.py).
+TRAINING_MODE = os.getenv('TRAINING_MODE', 'full')
+SUFFICIENT_STATISTICS_DIRECTORY_NAME = 'sufficient_statistics'
+# 'models' picks each ticker's model among models. 'path' searches LinearRegression and ElasticNet over a grid of alpha
+# and l1_ratio, warm started from the previous cycle's coefficients kept under TRAINED_FILES_DIRECTORY
+# (model_search.py).
+MODEL_SELECTION = os.getenv('MODEL_SELECTION', 'models')
+MODEL_SEARCH_DIRECTORY_NAME = 'model_search'
 
 """# 2. Data Preprocessing"""
 
 # Number of 10-min intervals: 6/hour, 39/day, 195/week(5days), 819/month(21days), 2457/quarter(63days), 9828(84days).
-WINDOW_DATAPOINTS_QUANTITY = 819  # Datapoints in total.
+WINDOW_DATAPOINTS_QUANTITY = int(os.getenv('TRAINING_WINDOW_DATAPOINTS', '819'))  # Datapoints in total.
 FUTURE_DATAPOINTS_QUANTITY = 39  # Datapoints for test.
 
 """## 2.1 Read JSON from Google Drive, use as Dataframe"""
@@ -63,49 +93,77 @@ FUTURE_DATAPOINTS_QUANTITY = 39  # Datapoints for test.
 UNWANTED_FEATURES = ['open', 'high', 'low', 'volume', 'otc', 'timestamp', 'transactions']
 
 
+# Parse one ticker's source into its training window, or None when the ticker has too few samples
+def read_ticker_window(source_directory, filename):
+    filepath = os.path.join(source_directory, filename)
+    ticker = filename.split(".")[0]
+    if price_store.has_ticker(source_directory, filename):
+        current_df = price_store.read_frame(source_directory, ticker)
+    elif bar_segments.has_ticker(source_directory, filename):
+        # Only the newest segments covering the window are decompressed
+        current_df = bar_segments.read_bars(bar_segments.LocalSegmentStore(source_directory), ticker,
+                                            WINDOW_DATAPOINTS_QUANTITY + FUTURE_DATAPOINTS_QUANTITY)
+    else:
+        # Open and read the json file
+        with open(filepath, 'r') as file:
+            data_dict = json.load(file)
+
+        # Create a DataFrame from the JSON data
+        current_df = pd.DataFrame(data=data_dict['data'],
+                                  columns=data_dict['columns'],
+                                  index=data_dict['index'])
+
+    current_df.columns = current_df.columns.str.replace(' ', '')
+    if current_df.shape[0] <= WINDOW_DATAPOINTS_QUANTITY:
+        print(f'Excluded {ticker}. Has {current_df.shape[0]} samples when {WINDOW_DATAPOINTS_QUANTITY} is required.')
+        return None
+    current_df['ticker'] = ticker  # Add ticker column for MultiIndex
+    current_df.drop(labels=UNWANTED_FEATURES, axis=1, inplace=True)
+    return current_df[-(WINDOW_DATAPOINTS_QUANTITY + FUTURE_DATAPOINTS_QUANTITY):]
+
+
+# Parsed ticker windows, kept across pipeline cycles. Only sources whose content changed are parsed again.
+LOADER_CACHE = loader_cache.LoaderCache()
+
+
 def json_to_dataframes(source_directory):
     all_data = []
-    combined_df = pd.DataFrame()
-
-    # Iterate over all files in the source directory
-    for filename in os.listdir(source_directory):
+    source_paths = []
+    LOADER_CACHE.start_cycle()
+
+    # Iterate over all files in the source directory.
+    # Also reads a columnar price store (machine_learning/price_store.py) or bar segments
+    # (machine_learning/bar_segments.py), where each ticker is a directory.
+    for filename in sorted(os.listdir(source_directory)):
+        # Skip hidden files and price store tickers that are still being written
+        if filename.startswith('.'):
+            continue
 
         filepath = os.path.join(source_directory, filename)
         # Check if the file is not empty
-        if os.path.getsize(filepath) <= 0:
+        if os.path.isfile(filepath) and os.path.getsize(filepath) <= 0:
             print(f"Skipping empty file {filename}")
             continue
 
-        ticker = filename.split(".")[0]
         try:
-            # Open and read the json file
-            with open(filepath, 'r') as file:
-                data_dict = json.load(file)
-
-            # Create a DataFrame from the JSON data
-            current_df = pd.DataFrame(data=data_dict['data'],
-                                      columns=data_dict['columns'],
-                                      index=data_dict['index'])
-
-            current_df.columns = current_df.columns.str.replace(' ', '')
-            if current_df.shape[0] <= WINDOW_DATAPOINTS_QUANTITY:
-                print(
-                    f'Excluded {ticker}. Has {current_df.shape[0]} samples when {WINDOW_DATAPOINTS_QUANTITY} is required.')
-                continue
-            current_df['ticker'] = ticker  # Add ticker column for MultiIndex
-            current_df.drop(labels=UNWANTED_FEATURES, axis=1, inplace=True)
-            all_data.append(current_df[-(WINDOW_DATAPOINTS_QUANTITY + FUTURE_DATAPOINTS_QUANTITY):])
-
-        except (json.JSONDecodeError, KeyError) as e:
+            source_paths.append(filepath)
+            current_df = LOADER_CACHE.get(filepath, lambda path: read_ticker_window(source_directory, filename))
+            if current_df is not None:
+                all_data.append(current_df)
+
+        except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
             print(f"Error processing file {filename}: {e}")
 
-        # Concatenate all DataFrames into a single MultiIndex DataFrame
-        if all_data:
-            combined_df = pd.concat(all_data)
-            combined_df.reset_index(inplace=True)
-            combined_df.set_index(['ticker', 'index'], inplace=True)
-        else:
-            combined_df = pd.DataFrame()  # Return an empty DataFrame if no data is collected
+    LOADER_CACHE.retain(source_paths)
+    print(f'Loaded {len(all_data)} tickers: {LOADER_CACHE.reused} reused, {LOADER_CACHE.reloaded} reloaded')
+
+    # Concatenate all DataFrames into a single MultiIndex DataFrame, once
+    if all_data:
+        combined_df = pd.concat(all_data)
+        combined_df.reset_index(inplace=True)
+        combined_df.set_index(['ticker', 'index'], inplace=True)
+    else:
+        combined_df = pd.DataFrame()  # Return an empty DataFrame if no data is collected
 
     return combined_df
 
@@ -120,7 +178,8 @@ def json_to_dataframes(source_directory):
 """### 2.2.2 Lag Data as Features"""
 
 # Volume Weighted Average Price (VWAP) is the average price of a ticker weighted by the total trading volume.
-FEATURES = ['vwap']
+# Use only lagging vwap prices as Feature columns: ['vwap', 'lag_vwap_1', ..., 'lag_vwap_38']
+FEATURES = lag_features.lag_feature_names('vwap', FUTURE_DATAPOINTS_QUANTITY)
 LABEL = ['close']
 
 
@@ -130,27 +189,14 @@ def add_lagged_features(df_main, label, features, future_window):
     # gets pandas dataframe's Index object e.g., Index(['AAPL', 'NVDA', ...])
     tickers = df_main.index.get_level_values('ticker').unique()
 
-    # list of columns used to create lags
     for ticker in tickers:
-        # Select the data for the current ticker
-        df = df_main.loc[ticker].copy()
-
-        # Create lagged features for the past N periods
-        for lag in range(1, future_window):
-            df[f'lag_vwap_{lag}'] = df['vwap'].shift(lag)
-
-        # Drop rows with NaN values created by the lagged features
-        df.dropna(inplace=True)
+        # Create lagged features for the past N periods, dropping rows without a complete set of lags
+        df = lag_features.lagged_frame(df_main.loc[ticker], 'vwap', future_window)
 
         # Reintroduce the ticker column for concatenation later
         df['ticker'] = ticker
         all_lagged_data.append(df)
 
-    # Use only lagging close prices as Feature columns
-    if len(FEATURES) == 1:
-        for i in range(1, future_window):
-            FEATURES.append(f'lag_vwap_{i}')
-
     # Concatenate all lagged DataFrames into a single MultiIndex DataFrame
     if all_lagged_data:
         combined_lagged_df = pd.concat(all_lagged_data)
@@ -171,58 +217,31 @@ def add_lagged_features(df_main, label, features, future_window):
 """## 2.3 Train-Test Split and Scale"""
 
 
-# Split dataset
+# Split dataset into (ticker, time, feature) tensors (ticker_tensor.py). Per ticker, the last 2 * future_datapoints rows
+# are the test split. Shorter tickers' train rows are padded with NaN at the start.
+# Returns tickers, X_train, X_test, y_train, y_test, where tensors are indexed in the order of tickers.
 def train_test_split_scale(df, features, label, future_datapoints):
-    train_data = []
-    test_data = []
-
-    tickers = df.index.get_level_values('ticker').unique()
-
-    for ticker in tickers:
-        ticker_df = df.loc[ticker]
-        train_df = ticker_df[:-2 * future_datapoints].copy()
-        test_df = ticker_df[-2 * future_datapoints:].copy()
-
-        # Reintroduce the ticker column for concatenation later
-        train_df['ticker'] = ticker
-        test_df['ticker'] = ticker
+    tickers, X, _ = ticker_tensor.from_frame(df, features)
+    _, y, _ = ticker_tensor.from_frame(df, label)
 
-        train_data.append(train_df)
-        test_data.append(test_df)
+    X_train, X_test = X[:, :-2 * future_datapoints], X[:, -2 * future_datapoints:]
+    y_train, y_test = y[:, :-2 * future_datapoints], y[:, -2 * future_datapoints:]
 
-    # Concatenate train and test data into separate MultiIndex DataFrames
-    train_data = pd.concat(train_data)
-    test_data = pd.concat(test_data)
+    # Apply RobustScaler to the features, for all tickers at once. Fitted scalers are stored for later sections.
+    scaled = []
+    for tensor, column_names, dictionary_scaler in [(X_train, features, dictionary_X_train_scaler),
+                                                    (X_test, features, dictionary_X_test_scaler),
+                                                    (y_train, label, dictionary_y_train_scaler),
+                                                    (y_test, label, dictionary_y_test_scaler)]:
+        center, scale = ticker_tensor.robust_center_and_scale(tensor)
+        for i, ticker in enumerate(tickers):
+            dictionary_scaler[ticker] = ticker_tensor.robust_scaler(center[i], scale[i], column_names)
+        scaled.append(ticker_tensor.robust_scale(tensor, center, scale))
+    X_train, X_test, y_train, y_test = scaled
 
-    # Reset and set index to handle concatenation properly
-    train_data.reset_index(inplace=True, drop=False)
-    train_data.set_index(['ticker', 'index'], inplace=True)
-    test_data.reset_index(inplace=True, drop=False)
-    test_data.set_index(['ticker', 'index'], inplace=True)
-
-    # Split into features and labels
-    X_train = train_data[features].astype(float)
-    y_train = train_data[label].astype(float)
-    X_test = test_data[features].astype(float)
-    y_test = test_data[label].astype(float)
-
-    for ticker in tickers:
-        row_labels = pd.IndexSlice[ticker, :]
-
-        # Apply RobustScaler to the features. Fitted scalers are stored for later sections.
-        dictionary_X_train_scaler[ticker] = RobustScaler().fit(X_train.loc[row_labels])
-        dictionary_X_test_scaler[ticker] = RobustScaler().fit(X_test.loc[row_labels])
-        dictionary_y_train_scaler[ticker] = RobustScaler().fit(y_train.loc[row_labels])
-        dictionary_y_test_scaler[ticker] = RobustScaler().fit(y_test.loc[row_labels])
-
-        X_train.loc[row_labels] = dictionary_X_train_scaler[ticker].transform(X_train.loc[row_labels])
-        X_test.loc[row_labels] = dictionary_X_test_scaler[ticker].transform(X_test.loc[row_labels])
-        y_train.loc[row_labels] = dictionary_y_train_scaler[ticker].transform(y_train.loc[row_labels])
-        y_test.loc[row_labels] = dictionary_y_test_scaler[ticker].transform(y_test.loc[row_labels])
-
-        print(
-            f'{ticker} - X_train {X_train.shape} - X_test {X_test.shape} - y_train {y_train.shape} - y_test {y_test.shape}')
-    return X_train, X_test, y_train, y_test
+    print(f'{len(tickers)} tickers - X_train {X_train.shape} - X_test {X_test.shape} - y_train {y_train.shape} '
+          f'- y_test {y_test.shape}')
+    return tickers, X_train, X_test, y_train, y_test
 
 
 # Hold fitted scalers to inverse scaling after predictions later
@@ -314,84 +333,148 @@ def calculate_mae(y_true, y_pred):
 
 def data_to_supervised_learning(X_test, X_train, n_in, n_out=1, dropnan=True):
     X_train = X_train[n_in:]
-    X_future = pd.concat([X_train, X_test], axis=0)
-    return X_future.values[-FUTURE_DATAPOINTS_QUANTITY:]
+    X_future = np.concatenate([X_train, X_test], axis=0)
+    return X_future[-FUTURE_DATAPOINTS_QUANTITY:]
 
 
 """## 4.2 Iterate through Functions"""
 
 
-# Iterate through models[], train and evaluate them.
-def all_models_train_and_evaluate(models, df_X_train, df_X_test,
-                                  df_y_train, df_y_test):
-    # Check dictionary lengths before continuing
-    if ((df_X_train.shape[0] != df_y_train.shape[0])
-            or (df_X_test.shape[0] != df_y_test.shape[0])
-    ):
-        raise Exception(f"Please make sure all dataframe lengths are equal.")
-
-    tickers = df_X_train.index.get_level_values('ticker').unique()
-
-    # Initialise variables
-    for ticker in tickers:
-        row_labels = pd.IndexSlice[ticker, :]
-        local_X_train = df_X_train.loc[row_labels].values
-        local_X_test = df_X_test.loc[row_labels].values[:-FUTURE_DATAPOINTS_QUANTITY]
-        local_y_train = df_y_train.loc[row_labels].values.ravel()
-        local_y_test = df_y_test.loc[row_labels].values.ravel()[:-FUTURE_DATAPOINTS_QUANTITY]
-
-        lowest_mae = 9999999
-        best_model_fitted = None
-
+# Independent per-ticker task, run on a process pool: fit every model, pick the lowest MAE, forecast and persist.
+# arrays: the scaled X_train / X_test / y_train / y_test tensors of all tickers. This ticker is index i, and its train
+# rows start after train_padding rows of NaN. Directories are passed in, as worker processes do not see changes to this
+# module's globals. model_search_path: file of the ticker's warm starts when MODEL_SELECTION=path, where the
+# regularization path is searched instead of models.
+# Returns the fitted model, its MAE, inverse scaled future predictions and the task's seconds.
+def train_ticker(arrays, ticker, models, i, train_padding, x_scaler, y_scaler, generation_directory,
+                 trained_files_directory, model_search_path=None):
+    started_at = time.perf_counter()
+    local_X_train = arrays['X_train'][i, train_padding:]
+    X_test = arrays['X_test'][i]
+    local_X_test = X_test[:-FUTURE_DATAPOINTS_QUANTITY]
+    local_y_train = arrays['y_train'][i, train_padding:].ravel()
+    local_y_test = arrays['y_test'][i].ravel()[:-FUTURE_DATAPOINTS_QUANTITY]
+
+    lowest_mae = 9999999
+    best_model_fitted = None
+
+    if model_search_path is not None:
+        # One Gram matrix of the train rows, shared by every candidate of the path
+        best_model_fitted, lowest_mae, _ = model_search.search(
+            *model_search.centered_gram(local_X_train, local_y_train), local_X_test,
+            y_scaler.inverse_transform(local_y_test.reshape(-1, 1)).ravel(), y_scaler.center_[0], y_scaler.scale_[0],
+            model_search_path)
+    else:
         # Iterate through models and perform train, test, validate.
         for model in models:
             local_model = clone(model)
             local_model_name = str(local_model).split("(")[0]
             model_fitted, y_pred = individual_model_train_predict(ticker, local_model_name, local_model,
                                                                   local_X_train, local_X_test, local_y_train)
-            mae = calculate_mae(y_true=dictionary_y_test_scaler[ticker].inverse_transform(local_y_test.reshape(-1, 1)),
-                                y_pred=dictionary_y_test_scaler[ticker].inverse_transform(y_pred.reshape(-1, 1)))
+            mae = calculate_mae(y_true=y_scaler.inverse_transform(local_y_test.reshape(-1, 1)),
+                                y_pred=y_scaler.inverse_transform(y_pred.reshape(-1, 1)))
             # Validation: Use model that gives lowest MAE
             if mae < lowest_mae:
                 lowest_mae = mae
                 best_model_fitted = model_fitted
 
-        # prepare future_x and predict future_y_pred
-        future_X = data_to_supervised_learning(df_X_test.loc[row_labels], df_X_train.loc[row_labels],
-                                               FUTURE_DATAPOINTS_QUANTITY, 1)
-        print(future_X.shape)
-        future_y_pred = best_model_fitted.predict(future_X)
-
-        # inverse scaling
-        df_dictionary_X_train_scale_inversed[ticker] = dictionary_X_train_scaler[ticker].inverse_transform(
-            local_X_train)
-        df_dictionary_X_test_scale_inversed[ticker] = dictionary_X_test_scaler[ticker].inverse_transform(local_X_test)
-        df_dictionary_y_train_scale_inversed[ticker] = dictionary_y_train_scaler[ticker].inverse_transform(
-            local_y_train.reshape(-1, 1))
-        df_dictionary_y_test_scale_inversed[ticker] = dictionary_y_test_scaler[ticker].inverse_transform(
-            local_y_test.reshape(-1, 1))
-        y_pred = dictionary_y_test_scaler[ticker].inverse_transform(y_pred.reshape(-1, 1))
-        future_X = dictionary_X_test_scaler[ticker].inverse_transform(future_X)
-        future_y_pred = dictionary_y_test_scaler[ticker].inverse_transform(future_y_pred.reshape(-1, 1))
-
-        best_model_fitted_name = str(best_model_fitted).split("(")[0]
-        # if i < 2: # for sample visualisation
+    # prepare future_x and predict future_y_pred
+    future_X = data_to_supervised_learning(X_test, local_X_train, FUTURE_DATAPOINTS_QUANTITY, 1)
+    future_y_pred = best_model_fitted.predict(future_X)
+
+    # inverse scaling
+    future_y_pred = y_scaler.inverse_transform(future_y_pred.reshape(-1, 1))
+
+    # Persist from the worker, into the generation being written
+    save_as_local_file(ticker, best_model_fitted, x_scaler, y_scaler, generation_directory, trained_files_directory)
+
+    return {'model': best_model_fitted, 'mae': lowest_mae, 'predictions': np.round(future_y_pred.flatten(), 2),
+            'seconds': time.perf_counter() - started_at}
+
+
+# Iterate through models[], train and evaluate them. Every ticker is an independent train_ticker task, run on
+# TRAINING_PROCESSES worker processes (parallel_training.py). Tickers that fail are recorded in training_errors, the
+# duration of each ticker's task in training_seconds.
+def all_models_train_and_evaluate(models, tickers, X_train, X_test,
+                                  y_train, y_test, generation_directory=None, workers=None):
+    # Check tensor lengths before continuing
+    if ((X_train.shape[:2] != y_train.shape[:2])
+            or (X_test.shape[:2] != y_test.shape[:2])
+            or (X_train.shape[0] != len(tickers))
+    ):
+        raise Exception(f"Please make sure all tensor lengths are equal.")
+
+    # Lagged rows have no missing values, so leading NaN rows are padding
+    train_paddings = np.isnan(X_train[:, :, 0]).sum(axis=1)
+    arrays = {'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test}
+    task_arguments = [(ticker, models, i, int(train_paddings[i]),
+                       dictionary_X_test_scaler[ticker], dictionary_y_test_scaler[ticker], generation_directory,
+                       TRAINED_FILES_DIRECTORY, model_search_path(ticker))
+                      for i, ticker in enumerate(tickers)]
+
+    training_errors.clear()
+    training_seconds.clear()
+    for ticker, (result, error) in zip(tickers, parallel_training.map_tasks(train_ticker, arrays, task_arguments,
+                                                                            workers)):
+        if error is not None:
+            training_errors[ticker] = error
+            print(f'Failed to train {ticker}: {error}')
+            continue
+
+        best_model_fitted_name = str(result['model']).split("(")[0]
         print(f'''\nModel: {best_model_fitted_name}
         Ticker: {ticker}
-        Mean Absolute Error: {lowest_mae}''')
-        # plot_predictions(ticker, best_model_fitted_name, df_dictionary_y_train_scale_inversed[ticker],
-        #                  df_dictionary_y_test_scale_inversed[ticker], y_pred, lowest_mae, future_y_pred)
+        Mean Absolute Error: {result['mae']}''')
 
         # Store fitted model
-        trained_models[ticker] = best_model_fitted
+        trained_models[ticker] = result['model']
+        training_seconds[ticker] = result['seconds']
         # Store predictions
-        predictions_close_price_dictionary[ticker] = np.round(future_y_pred.flatten(), 2)
+        predictions_close_price_dictionary[ticker] = result['predictions']
+
+
+# TRAINING_MODE=incremental: per ticker of df_raw, the linear models are updated from the previous cycle's sufficient
+# statistics and solved in the process (incremental_training.py), then saved like train_ticker's. Fills the same
+# dictionaries as all_models_train_and_evaluate.
+def incremental_train_and_evaluate(models, df_raw, generation_directory=None):
+    if MODEL_SELECTION != 'path' and not incremental_training.supports(models):
+        raise Exception(f"Incremental training supports LinearRegression and ElasticNet models only.")
+    statistics_directory = os.path.join(TRAINED_FILES_DIRECTORY, SUFFICIENT_STATISTICS_DIRECTORY_NAME)
+
+    training_errors.clear()
+    training_seconds.clear()
+    for ticker in df_raw.index.get_level_values('ticker').unique():
+        started_at = time.perf_counter()
+        df = df_raw.loc[ticker]
+        try:
+            result = incremental_training.train_ticker(os.path.join(statistics_directory, f'{ticker}.pkl'),
+                                                       df['vwap'].to_numpy(), df[LABEL[0]].to_numpy(), models,
+                                                       FUTURE_DATAPOINTS_QUANTITY, FEATURES, LABEL,
+                                                       model_search_path(ticker))
+            save_as_local_file(ticker, result['model'], result['x_scaler'], result['y_scaler'], generation_directory)
+        except Exception as error:
+            training_errors[ticker] = f'{type(error).__name__}: {error}'
+            print(f'Failed to train {ticker}: {training_errors[ticker]}')
+            continue
+
+        print(f'''\nModel: {str(result['model']).split("(")[0]}
+        Ticker: {ticker}
+        Mean Absolute Error: {result['mae']}
+        Sufficient statistics: {'rebuilt' if result['rebuilt'] else 'updated'}''')
+        trained_models[ticker] = result['model']
+        training_seconds[ticker] = time.perf_counter() - started_at
+        predictions_close_price_dictionary[ticker] = result['predictions']
+
+
+# File of ticker's regularization path warm starts, or None when MODEL_SELECTION is not 'path'
+def model_search_path(ticker):
+    if MODEL_SELECTION != 'path':
+        return None
+    return os.path.join(TRAINED_FILES_DIRECTORY, MODEL_SEARCH_DIRECTORY_NAME, f'{ticker}.pkl')
 
 
-df_dictionary_X_train_scale_inversed = {}
-df_dictionary_X_test_scale_inversed = {}
-df_dictionary_y_train_scale_inversed = {}
-df_dictionary_y_test_scale_inversed = {}
+training_errors = {}  # key: ticker, value: error of the last cycle's train_ticker task
+training_seconds = {}  # key: ticker, value: seconds of the last cycle's train_ticker task
 
 """# 5. Prediction Post-processing
 
@@ -401,22 +484,20 @@ df_dictionary_y_test_scale_inversed = {}
 """
 
 
-def save_as_local_file(ticker):
-    model = trained_models[ticker]
+def save_as_local_file(ticker, model, x_scaler, y_scaler, generation_directory=None, trained_files_directory=None):
+    trained_files_directory = TRAINED_FILES_DIRECTORY if trained_files_directory is None else trained_files_directory
     model_name = str(model).split("(")[0]
 
     if model_name in models_names:
-        # save trained models
-        with open(f'{TRAINED_FILES_DIRECTORY}/model/{ticker}.pkl', 'wb') as f:
-            pickle.dump(model, f)  # serialize the object
+        # save model, x_test_scaler and y_test_scaler as one bundle of the generation being written
+        if generation_directory is not None:
+            model_generations.write_bundle(generation_directory, ticker, model, x_scaler, y_scaler)
 
-        # save x_test_scaler
-        with open(f'{TRAINED_FILES_DIRECTORY}/x_scaler/{ticker}.pkl', 'wb') as f:
-            pickle.dump(dictionary_X_test_scaler[ticker], f)  # serialize the object
-
-        # save y_test_scaler
-        with open(f'{TRAINED_FILES_DIRECTORY}/y_scaler/{ticker}.pkl', 'wb') as f:
-            pickle.dump(dictionary_y_test_scaler[ticker], f)  # serialize the object
+        # save trained models, x_test_scaler and y_test_scaler, each replaced atomically
+        for prefix, trained_object in [('model', model), ('x_scaler', x_scaler), ('y_scaler', y_scaler)]:
+            os.makedirs(f'{trained_files_directory}/{prefix}', exist_ok=True)
+            model_generations.write_atomically(f'{trained_files_directory}/{prefix}/{ticker}.pkl',
+                                               pickle.dumps(trained_object))  # serialize the object
 
     else:
         raise Exception(f"Please implement saving of {ticker}'s model: {model_name}.")
@@ -442,54 +523,112 @@ def save_as_local_file(ticker):
 
 
 # predictions_coef_dictionary[ticker] = [[-5.90832260e-01  5.43316834e-01  ...]]
-def combine_predictions_to_dictionary():
-    # Add ticker, predicted close prices to dictionary
-    for i, ticker in enumerate(trained_models):
-        output_dictionary = {}
-
-        model_name = str(trained_models[ticker]).split("(")[0]
-        index = list(range(len(predictions_close_price_dictionary[ticker]))),  # generates ([0, 1, ... n],)
-
-        # JSON output format
-        if model_name == "LinearRegression" or model_name == "ElasticNet":
-            output_dictionary[ticker] = {
-                "tickerName": ticker,
-                "predictions": predictions_close_price_dictionary[ticker]
-            }
+# Bundles were saved into staging_directory by the training tasks. Tickers that failed keep their previous bundle.
+def combine_predictions_to_dictionary(generation, staging_directory):
+    try:
+        if len(trained_models) == 0:
+            shutil.rmtree(staging_directory, ignore_errors=True)
+            return
 
-        else:
-            raise Exception(f"Please ensure loop checks for {model_name} and outputs its JSON.")
+        # Add ticker, predicted close prices to dictionary
+        for i, ticker in enumerate(trained_models):
+            output_dictionary = {}
 
-        # save_dictionary_as_json(ticker, output_dictionary)
-        save_as_local_file(ticker)
-        print(f'{i+1} / {len(trained_models)}')
+            model_name = str(trained_models[ticker]).split("(")[0]
+            index = list(range(len(predictions_close_price_dictionary[ticker]))),  # generates ([0, 1, ... n],)
 
+            # JSON output format
+            if model_name == "LinearRegression" or model_name == "ElasticNet":
+                output_dictionary[ticker] = {
+                    "tickerName": ticker,
+                    "predictions": predictions_close_price_dictionary[ticker]
+                }
 
-"""### Execute"""
+            else:
+                raise Exception(f"Please ensure loop checks for {model_name} and outputs its JSON.")
 
+            # save_dictionary_as_json(ticker, output_dictionary)
+            print(f'{i+1} / {len(trained_models)}')
 
-def execute():
-    logger = logging.getLogger('uvicorn')
-    logger.info('ML - 1/7 - Start')
+        carried_tickers = model_generations.carry_forward_bundles(TRAINED_FILES_DIRECTORY, staging_directory)
+        if carried_tickers:
+            print(f'Kept previous models of {carried_tickers}')
 
-    # Load JSON to global MultiIndex Dataframe
-    df_raw = json_to_dataframes(DOWNLOAD_DIRECTORY)
-    logger.info('ML - 2/7 - Load Dataframes Complete')
+        # Coefficients of every linear model of the generation in one memory-mappable file, served without unpickling
+        bundled_tickers = coefficient_bundle.write_generation_bundle(staging_directory)
+        print(f'Bundled coefficients of {len(bundled_tickers)} tickers')
+    except Exception:
+        shutil.rmtree(staging_directory, ignore_errors=True)
+        raise
 
-    df_feature_engineered = add_lagged_features(df_raw, LABEL, FEATURES, FUTURE_DATAPOINTS_QUANTITY)
-    logger.info('ML - 3/7 - Feature Engineer Complete')
+    # All tickers of this cycle are published together as one new generation
+    model_generations.publish_generation(TRAINED_FILES_DIRECTORY, generation, staging_directory)
+    print(f'Published generation {generation}')
 
-    df_X_train, df_X_test, df_y_train, df_y_test = train_test_split_scale(df_feature_engineered, FEATURES, LABEL,
-                                                                          FUTURE_DATAPOINTS_QUANTITY)
-    logger.info('ML - 4/7 - Train-Test-Split and Scale Complete')
 
-    all_models_train_and_evaluate(models, df_X_train, df_X_test, df_y_train, df_y_test)
-    logger.info('ML - 5/7 - Model Training and Evaluate - Complete')
+"""### Execute"""
 
-    combine_predictions_to_dictionary()
-    logger.info('ML - 6/7 - Save Models, X_Scalers, Y_Scalers - Complete')
 
-    logger.info('ML - 7/7 - Pipeline Complete. Pending next cycle of ML Pipeline according to set interval.')
+# progress: optional callback receiving each stage's message, e.g. to report back from a training worker process.
+# Returns the timings of the cycle: {'stage_seconds': {stage: seconds}, 'ticker_seconds': {ticker: seconds}}
+def execute(progress=None):
+    logger = logging.getLogger('uvicorn')
+    stage_seconds = {}
+    stage_started_at = time.perf_counter()
+
+    # stage: name under which the time since the previous stage's report is recorded
+    def report(message, stage=None):
+        nonlocal stage_started_at
+        if stage is not None:
+            now = time.perf_counter()
+            stage_seconds[stage] = now - stage_started_at
+            stage_started_at = now
+        logger.info(message)
+        if progress is not None:
+            progress(message)
+
+    report('ML - 1/7 - Start')
+
+    # Load the bar segments appended by ingestion when there are any. Otherwise refresh the columnar price store from
+    # the downloaded JSON and load that. Either way to a global MultiIndex Dataframe.
+    if bar_segments.LocalSegmentStore(BAR_SEGMENTS_DIRECTORY).tickers():
+        df_raw = json_to_dataframes(BAR_SEGMENTS_DIRECTORY)
+    else:
+        price_store.convert_directory(DOWNLOAD_DIRECTORY, PRICE_STORE_DIRECTORY)
+        df_raw = json_to_dataframes(PRICE_STORE_DIRECTORY)
+    report(f'ML - 2/7 - Load Dataframes Complete ({LOADER_CACHE.reused} reused, {LOADER_CACHE.reloaded} reloaded)',
+           'load_dataframes')
+
+    incremental = TRAINING_MODE == 'incremental'
+    if not incremental:
+        df_feature_engineered = add_lagged_features(df_raw, LABEL, FEATURES, FUTURE_DATAPOINTS_QUANTITY)
+        report('ML - 3/7 - Feature Engineer Complete', 'feature_engineering')
+
+        tickers, X_train, X_test, y_train, y_test = train_test_split_scale(df_feature_engineered, FEATURES, LABEL,
+                                                                           FUTURE_DATAPOINTS_QUANTITY)
+        report('ML - 4/7 - Train-Test-Split and Scale Complete', 'train_test_split_scale')
+
+    # Training tasks save their ticker's files into the new generation's staging directory as they finish
+    generation, staging_directory = model_generations.start_generation(TRAINED_FILES_DIRECTORY)
+    try:
+        trained_models.clear()
+        predictions_close_price_dictionary.clear()
+        if incremental:
+            # Lags and scaling are computed per ticker from the raw window
+            incremental_train_and_evaluate(models, df_raw, staging_directory)
+        else:
+            all_models_train_and_evaluate(models, tickers, X_train, X_test, y_train, y_test, staging_directory)
+    except Exception:
+        shutil.rmtree(staging_directory, ignore_errors=True)
+        raise
+    report(f'ML - 5/7 - Model Training and Evaluate - Complete ({len(trained_models)} trained, '
+           f'{len(training_errors)} failed)', 'model_training')
+
+    combine_predictions_to_dictionary(generation, staging_directory)
+    report('ML - 6/7 - Save Models, X_Scalers, Y_Scalers - Complete', 'save_models')
+
+    report('ML - 7/7 - Pipeline Complete. Pending next cycle of ML Pipeline according to set interval.')
+    return {'stage_seconds': stage_seconds, 'ticker_seconds': dict(training_seconds)}
 
 
 if __name__ == "__main__":
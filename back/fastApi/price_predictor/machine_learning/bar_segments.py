@@ -0,0 +1,162 @@
+"""Append-only, gzip compressed daily segments of bars, written by ingestion (service/get_data.py) and read by the
+serving API (main.py) and the ML pipeline (json_to_dataframes).
+
+    <root>/<ticker>/<YYYY-MM-DD>.jsonl.gz     bars of one UTC day, one JSON record per line
+
+Each ingestion run only encodes the bars newer than the last stored timestamp, as one gzip member per day touched.
+Concatenated gzip members are one valid gzip stream, so a segment grows by appending the new member's bytes. The
+(small) day segment is rewritten with the member appended and swapped in whole, by os.replace on a local directory or by
+re-putting the object on S3, so a reader never sees a partially written member.
+Readers stitch the newest segments together and drop bars that were stored twice.
+"""
+import gzip
+import io
+import os
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+SEGMENT_SUFFIX = '.jsonl.gz'
+COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'vwap', 'timestamp', 'transactions', 'otc']
+
+
+def segment_name(day):
+    return f'{day}{SEGMENT_SUFFIX}'
+
+
+# UTC day of a polygon timestamp (milliseconds since epoch), e.g. '2024-08-16'
+def day_of(timestamp):
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+# One gzip member of bars as JSON lines
+def encode_bars(df):
+    lines = df[[column for column in COLUMNS if column in df.columns]].to_json(orient='records', lines=True)
+    return gzip.compress(lines.encode(), compresslevel=6)
+
+
+def decode_bars(data):
+    text = gzip.decompress(data)
+    if not text.strip():
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.read_json(io.BytesIO(text), lines=True, convert_dates=False, keep_default_dates=False)
+
+
+'''
+Backends
+'''
+
+
+class LocalSegmentStore:
+    def __init__(self, root):
+        self.root = root
+
+    def tickers(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(ticker for ticker in os.listdir(self.root) if self.days(ticker))
+
+    # Days with a segment, oldest first
+    def days(self, ticker):
+        directory = os.path.join(self.root, ticker)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+    def read(self, ticker, day):
+        with open(os.path.join(self.root, ticker, segment_name(day)), 'rb') as f:
+            return f.read()
+
+    # The appended segment is written next to the old one and replaces it, so a reader reading while ingestion writes,
+    # or after ingestion died mid-write, gets the old segment or the new one, never a truncated gzip member. The
+    # temporary file does not end with SEGMENT_SUFFIX, so days() ignores one left behind.
+    def append(self, ticker, day, member):
+        os.makedirs(os.path.join(self.root, ticker), exist_ok=True)
+        path = os.path.join(self.root, ticker, segment_name(day))
+        try:
+            with open(path, 'rb') as f:
+                existing = f.read()
+        except FileNotFoundError:
+            existing = b''
+        temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as f:
+            f.write(existing + member)
+        os.replace(temporary_path, path)
+
+
+# S3 (or any S3-compatible store). Objects cannot be appended to, so the day object is re-put with the new member
+# appended to its compressed bytes. Only the days receiving new bars are read and written.
+class S3SegmentStore:
+    def __init__(self, s3, bucket_name, prefix='bars'):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+
+    def _key(self, ticker, day=None):
+        return f'{self.prefix}/{ticker}/' + (segment_name(day) if day else '')
+
+    def days(self, ticker):
+        days = []
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self._key(ticker)):
+            days.extend(item['Key'].rsplit('/', 1)[1][:-len(SEGMENT_SUFFIX)] for item in page.get('Contents', [])
+                        if item['Key'].endswith(SEGMENT_SUFFIX))
+        return sorted(days)
+
+    def read(self, ticker, day):
+        return self.s3.get_object(Bucket=self.bucket_name, Key=self._key(ticker, day))['Body'].read()
+
+    def append(self, ticker, day, member):
+        try:
+            existing = self.read(ticker, day)
+        except self.s3.exceptions.NoSuchKey:
+            existing = b''
+        self.s3.put_object(Bucket=self.bucket_name, Key=self._key(ticker, day), Body=existing + member,
+                           ContentType='application/gzip')
+
+
+'''
+Writer and readers
+'''
+
+
+# Last stored timestamp of a ticker, or None when it has no segments
+def latest_timestamp(store, ticker):
+    days = store.days(ticker)
+    if not days:
+        return None
+    return int(decode_bars(store.read(ticker, days[-1]))['timestamp'].max())
+
+
+# Appends the bars of df newer than last_timestamp, the ticker's last stored timestamp (None = nothing stored yet).
+# Returns (rows appended, bytes appended).
+def append_bars(store, ticker, df, last_timestamp):
+    new = df if last_timestamp is None else df[df['timestamp'] > last_timestamp]
+    new = new.drop_duplicates('timestamp').sort_values('timestamp')
+    appended_bytes = 0
+    for day, day_bars in new.groupby(new['timestamp'].map(day_of), sort=True):
+        member = encode_bars(day_bars)
+        store.append(ticker, day, member)
+        appended_bytes += len(member)
+    return len(new), appended_bytes
+
+
+# Bars of the newest segments, oldest first, with at least `rows` bars when that many are stored (all by default)
+def read_bars(store, ticker, rows=None):
+    frames = []
+    row_count = 0
+    for day in reversed(store.days(ticker)):
+        frames.append(decode_bars(store.read(ticker, day)))
+        row_count += len(frames[-1])
+        if rows is not None and row_count >= rows:
+            break
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    df = pd.concat(frames[::-1], ignore_index=True).reindex(columns=COLUMNS)
+    df = df.drop_duplicates('timestamp', keep='last').sort_values('timestamp', kind='stable')
+    return df.reset_index(drop=True) if rows is None else df[-rows:].reset_index(drop=True)
+
+
+def has_ticker(root, ticker):
+    return bool(LocalSegmentStore(root).days(ticker))
@@ -0,0 +1,142 @@
+"""Single-file bundle of every linear ticker's coefficients, written with each generation by the ML pipeline and
+memory-mapped by the serving API.
+
+    <generation>/coefficients.bin
+
+    magic        8 bytes  b'COEFBND1'
+    header size  8 bytes  little-endian uint64
+    header       JSON     {"version": 1, "tickers": [...], "feature_count": 39,
+                           "arrays": {name: [offset, dtype, shape]}}
+    arrays       little-endian float64, each starting at a multiple of ALIGNMENT bytes from the start of the file
+
+Arrays (one row per ticker, in header order):
+    coef, x_center, x_scale, weights   (tickers, feature_count)
+    intercept, y_center, y_scale, bias (tickers,)
+
+weights and bias are the FusedPredictor of the ticker's pipeline, verified against sklearn when the bundle is written,
+so the serving API predicts from zero-copy row views without unpickling anything. Opening a bundle only parses the
+header, whatever the number of tickers, and processes mapping the same file share its pages in the page cache.
+Pipelines that are not linear are left out and keep being served from their pickled bundles.
+"""
+import json
+import os
+import pickle
+
+import numpy as np
+
+from . import fused_predictor
+from . import model_generations
+
+FILENAME = 'coefficients.bin'
+MAGIC = b'COEFBND1'
+BUNDLE_VERSION = 1
+ALIGNMENT = 64
+DTYPE = '<f8'
+MATRIX_ARRAYS = ['coef', 'x_center', 'x_scale', 'weights']
+VECTOR_ARRAYS = ['intercept', 'y_center', 'y_scale', 'bias']
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+# pipelines: key: ticker, value: (model, x_scaler, y_scaler). Returns the tickers written.
+def write_bundle(path, pipelines):
+    rows = {}
+    for ticker, (model, x_scaler, y_scaler) in sorted(pipelines.items()):
+        try:
+            fused = fused_predictor.compile_verified_pipeline(model, x_scaler, y_scaler)
+        except ValueError:
+            fused = None
+        if fused is None:
+            continue
+        parameters = fused_predictor.linear_pipeline_parameters(model, x_scaler, y_scaler)
+        rows[ticker] = dict(parameters, weights=fused.weights, bias=fused.bias)
+
+    tickers = list(rows)
+    feature_count = len(rows[tickers[0]]['coef']) if tickers else 0
+    arrays = {name: np.array([rows[ticker][name] for ticker in tickers],
+                             dtype=DTYPE).reshape(len(tickers), feature_count)
+              for name in MATRIX_ARRAYS}
+    arrays.update({name: np.array([rows[ticker][name] for ticker in tickers], dtype=DTYPE) for name in VECTOR_ARRAYS})
+
+    # Offsets depend on the header's size, which depends on the offsets: grow the header until it fits
+    header = {'version': BUNDLE_VERSION, 'tickers': tickers, 'feature_count': feature_count, 'arrays': {}}
+    header_size = 0
+    while True:
+        offset = _aligned(len(MAGIC) + 8 + header_size)
+        for name, array in arrays.items():
+            header['arrays'][name] = [offset, DTYPE, list(array.shape)]
+            offset = _aligned(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode()
+        if len(header_bytes) <= header_size:
+            break
+        header_size = len(header_bytes)
+    header_bytes = header_bytes.ljust(header_size)
+
+    data = bytearray(offset)
+    data[:len(MAGIC)] = MAGIC
+    data[len(MAGIC):len(MAGIC) + 8] = np.uint64(header_size).astype('<u8').tobytes()
+    data[len(MAGIC) + 8:len(MAGIC) + 8 + header_size] = header_bytes
+    for name, array in arrays.items():
+        start = header['arrays'][name][0]
+        data[start:start + array.nbytes] = array.tobytes()
+    model_generations.write_atomically(path, bytes(data))
+    return tickers
+
+
+# Writes FILENAME into a generation (or staging) directory from its pickled bundles. Returns the tickers written.
+def write_generation_bundle(directory):
+    pipelines = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.pkl'):
+            with open(os.path.join(directory, filename), 'rb') as f:
+                bundle = pickle.load(f)
+            pipelines[filename.split(".")[0]] = (bundle['model'], bundle['x_scaler'], bundle['y_scaler'])
+    return write_bundle(os.path.join(directory, FILENAME), pipelines)
+
+
+class CoefficientBundle:
+    # buffer: the bundle's bytes, e.g. np.memmap of the file or the bytes read from an object store
+    def __init__(self, buffer):
+        buffer = np.frombuffer(buffer, dtype=np.uint8) if not isinstance(buffer, np.ndarray) else buffer
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError('Not a coefficient bundle')
+        header_size = int(buffer[len(MAGIC):len(MAGIC) + 8].view('<u8')[0])
+        header = json.loads(bytes(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + header_size]))
+        if header['version'] != BUNDLE_VERSION:
+            raise ValueError(f'Unsupported coefficient bundle version {header["version"]}')
+        self.tickers = header['tickers']
+        self.feature_count = header['feature_count']
+        self.rows = {ticker: row for row, ticker in enumerate(self.tickers)}
+        self._fused_predictors = {}
+        self.arrays = {}  # key: array name, value: read-only view into buffer
+        for name, (offset, dtype, shape) in header['arrays'].items():
+            count = int(np.prod(shape))
+            array = buffer[offset:offset + count * np.dtype(dtype).itemsize].view(dtype).reshape(shape)
+            array.flags.writeable = False
+            self.arrays[name] = array
+
+    @classmethod
+    def open(cls, path):
+        return cls(np.memmap(path, dtype=np.uint8, mode='r'))
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    # The ticker's row of every array: zero-copy views of the matrices, e.g. {'coef': (39,) view, 'intercept': 1.5}
+    def row(self, ticker):
+        row = self.rows[ticker]
+        return {name: array[row] for name, array in self.arrays.items()}
+
+    # FusedPredictor predicting from the ticker's row of weights. Raises KeyError for a ticker not in the bundle.
+    def fused_predictor(self, ticker):
+        fused = self._fused_predictors.get(ticker)
+        if fused is None:
+            row = self.rows[ticker]
+            fused = fused_predictor.FusedPredictor(self.arrays['weights'][row], float(self.arrays['bias'][row]))
+            self._fused_predictors[ticker] = fused
+        return fused
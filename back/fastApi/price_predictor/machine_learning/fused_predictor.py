@@ -0,0 +1,83 @@
+"""Linear pipelines folded into one affine map, computed by the ML pipeline for the coefficient bundle and by the
+serving API when it loads a pickled linear model.
+"""
+import numpy as np
+
+
+# Pull the affine parameters out of a RobustScaler -> linear model -> RobustScaler pipeline, so that many tickers can
+# be predicted together with stacked NumPy operations instead of three sklearn calls per ticker.
+# Returns None for pipelines that are not linear (e.g. tree models), which must go through sklearn one by one.
+def linear_pipeline_parameters(model, x_scaler, y_scaler):
+    if not hasattr(model, 'coef_') or not hasattr(model, 'intercept_'):
+        return None
+    coef = np.ravel(model.coef_).astype(np.float64)
+    x_center, x_scale = scaler_center_and_scale(x_scaler, coef.shape[0])
+    y_center, y_scale = scaler_center_and_scale(y_scaler, 1)
+    return {
+        'coef': coef,
+        'intercept': float(np.ravel(model.intercept_)[0]),
+        'x_center': x_center,
+        'x_scale': x_scale,
+        'y_center': float(y_center[0]),
+        'y_scale': float(y_scale[0]),
+    }
+
+
+def scaler_center_and_scale(scaler, feature_count):
+    center = getattr(scaler, 'center_', None)
+    scale = getattr(scaler, 'scale_', None)
+    center = np.zeros(feature_count) if center is None else np.ravel(center).astype(np.float64)
+    scale = np.ones(feature_count) if scale is None else np.ravel(scale).astype(np.float64)
+    return center, scale
+
+
+# A ticker's RobustScaler (x) -> linear model -> RobustScaler (y) pipeline folded into one affine map on raw prices:
+#   y = (((x - x_center) / x_scale) @ coef + intercept) * y_scale + y_center = x @ weights + bias
+# Features whose coefficient is exactly zero (e.g. pruned by ElasticNet's L1 penalty) are skipped at prediction time.
+class FusedPredictor:
+    __slots__ = ('weights', 'bias', 'feature_index', 'pruned_weights')
+
+    def __init__(self, weights, bias):
+        self.weights = weights
+        self.bias = bias
+        nonzero = np.flatnonzero(weights)
+        # Only index into x when pruning removes something, plain x @ w is faster otherwise
+        self.feature_index = nonzero if len(nonzero) < len(weights) else None
+        self.pruned_weights = weights[nonzero] if self.feature_index is not None else weights
+
+    def predict(self, x_values):
+        x_values = np.asarray(x_values, dtype=np.float64)
+        if self.feature_index is not None:
+            x_values = x_values[..., self.feature_index]
+        return x_values @ self.pruned_weights + self.bias
+
+
+# Returns None for pipelines that cannot be fused, i.e. models without coef_ and intercept_.
+def compile_pipeline(model, x_scaler, y_scaler):
+    parameters = linear_pipeline_parameters(model, x_scaler, y_scaler)
+    if parameters is None:
+        return None
+    scaled_coef = parameters['coef'] / parameters['x_scale']
+    weights = scaled_coef * parameters['y_scale']
+    bias = ((parameters['intercept'] - np.dot(scaled_coef, parameters['x_center'])) * parameters['y_scale']
+            + parameters['y_center'])
+    return FusedPredictor(weights, float(bias))
+
+
+# Raises ValueError when the fused predictor does not reproduce the sklearn pipeline on probe rows spread around the
+# x_scaler's center, e.g. for a scaler or model configuration compile_pipeline does not know about.
+def verify(fused_predictor, model, x_scaler, y_scaler, rtol=1e-7, atol=1e-6):
+    x_center, x_scale = scaler_center_and_scale(x_scaler, len(fused_predictor.weights))
+    probe = x_center + x_scale * np.random.default_rng(0).uniform(-3, 3, (8, len(x_center)))
+    expected = y_scaler.inverse_transform(model.predict(x_scaler.transform(probe)).reshape(-1, 1)).flatten()
+    actual = fused_predictor.predict(probe)
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        raise ValueError(f'Fused predictor differs from sklearn pipeline by up to {np.max(np.abs(actual - expected))}')
+
+
+# compile_pipeline + verify. Returns None when the pipeline should keep using sklearn.
+def compile_verified_pipeline(model, x_scaler, y_scaler):
+    fused_predictor = compile_pipeline(model, x_scaler, y_scaler)
+    if fused_predictor is not None:
+        verify(fused_predictor, model, x_scaler, y_scaler)
+    return fused_predictor
@@ -0,0 +1,310 @@
+"""Incremental training of the linear models from sufficient statistics (TRAINING_MODE=incremental of the ML pipeline).
+
+Per ticker, the sums over the lagged train rows of the window (count, sum of x, sum of y, X'X, X'y, y'y) are kept on
+disk with the window's prices. When the next cycle's window has moved by k new bars, the k train rows that left the
+window are subtracted and the k rows that entered are added, in O(k * 39^2). The models are then solved from the
+39 x 39 centered Gram matrix in the RobustScaler space of the train rows, whatever the window length:
+
+- LinearRegression: least squares of the normal equations.
+- ElasticNet: sklearn's objective, minimized by accelerated proximal gradient on the Gram matrix, warm started from the
+  previous cycle's coefficients, until its duality gap is below the model's tol (sklearn's stopping criterion).
+
+RobustScaler's medians and quartiles are order statistics, which have no sums to update: they are still computed from
+the window's rows by one linear-time selection per cycle, as in train_test_split_scale. Evaluation, model selection and
+the future predictions are the same as the pipeline's train_ticker.
+
+Sums are taken relative to the first price of the window they were built from, and rebuilt from the window after
+REBUILD_UPDATES updates, or whenever the window does not continue the stored one (e.g. history was rewritten).
+"""
+import os
+import pickle
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.linear_model import ElasticNet, LinearRegression
+
+from . import lag_features
+from . import model_generations
+from . import model_search
+from . import ticker_tensor
+
+STATE_VERSION = 1
+REBUILD_UPDATES = 1000
+
+
+class SufficientStatistics:
+    def __init__(self, feature_count, shift=0.0):
+        self.shift = float(shift)
+        self.count = 0
+        self.x_sum = np.zeros(feature_count)
+        self.y_sum = 0.0
+        self.xx = np.zeros((feature_count, feature_count))
+        self.xy = np.zeros(feature_count)
+        self.yy = 0.0
+
+    # sign: 1 adds the rows (x, y), -1 removes them
+    def update(self, x, y, sign=1):
+        x = np.asarray(x, dtype=np.float64) - self.shift
+        y = np.asarray(y, dtype=np.float64) - self.shift
+        self.count += sign * len(x)
+        self.x_sum += sign * x.sum(axis=0)
+        self.y_sum += sign * y.sum()
+        self.xx += sign * (x.T @ x)
+        self.xy += sign * (x.T @ y)
+        self.yy += sign * float(y @ y)
+
+    # (Gram, X'y, y'y) of the rows centered on their means, then divided by x_scale and y_scale
+    def centered_scaled(self, x_scale, y_scale):
+        gram = (self.xx - np.outer(self.x_sum, self.x_sum) / self.count) / np.outer(x_scale, x_scale)
+        xty = (self.xy - self.x_sum * self.y_sum / self.count) / (x_scale * y_scale)
+        yty = (self.yy - self.y_sum ** 2 / self.count) / y_scale ** 2
+        return gram, xty, yty
+
+    # (mean of x, mean of y) of the rows, scaled by RobustScaler's center and scale
+    def scaled_means(self, x_center, x_scale, y_center, y_scale):
+        return ((self.x_sum / self.count + self.shift - x_center) / x_scale,
+                (self.y_sum / self.count + self.shift - y_center) / y_scale)
+
+    def to_arrays(self):
+        return {'shift': self.shift, 'count': self.count, 'x_sum': self.x_sum, 'y_sum': self.y_sum, 'xx': self.xx,
+                'xy': self.xy, 'yy': self.yy}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        statistics = cls(len(arrays['x_sum']), float(arrays['shift']))
+        statistics.count = int(arrays['count'])
+        statistics.x_sum = np.array(arrays['x_sum'], dtype=np.float64)
+        statistics.y_sum = float(arrays['y_sum'])
+        statistics.xx = np.array(arrays['xx'], dtype=np.float64)
+        statistics.xy = np.array(arrays['xy'], dtype=np.float64)
+        statistics.yy = float(arrays['yy'])
+        return statistics
+
+
+'''
+Solvers, in the scaled space of the train rows
+'''
+
+
+def solve_linear_regression(gram, xty):
+    return np.linalg.lstsq(gram, xty, rcond=None)[0]
+
+
+# Duality gap of sklearn's coordinate descent with a Gram matrix (enet_coordinate_descent_gram)
+def elastic_net_dual_gap(w, gram, xty, yty, l1_reg, l2_reg):
+    gram_w = gram @ w
+    xta = xty - gram_w - l2_reg * w
+    dual_norm_xta = np.max(np.abs(xta))
+    r_norm2 = yty + w @ gram_w - 2.0 * (xty @ w)
+    if dual_norm_xta > l1_reg:
+        const = l1_reg / dual_norm_xta
+        gap = 0.5 * (r_norm2 + r_norm2 * const ** 2)
+    else:
+        const = 1.0
+        gap = r_norm2
+    return gap + l1_reg * np.abs(w).sum() - const * (yty - xty @ w) + 0.5 * l2_reg * (1 + const ** 2) * (w @ w)
+
+
+# ElasticNet solution with the nonzero coefficients and signs of w, from one linear solve of the KKT conditions, or
+# None when w has no nonzero coefficients or the solution changes their signs
+def active_set_solution(w, gram, xty, l1_reg, l2_reg):
+    active = np.flatnonzero(w)
+    if len(active) == 0:
+        return None
+    signs = np.sign(w[active])
+    try:
+        coef = np.linalg.solve(gram[np.ix_(active, active)] + l2_reg * np.eye(len(active)),
+                               xty[active] - l1_reg * signs)
+    except np.linalg.LinAlgError:
+        return None
+    if np.any(np.sign(coef) != signs):
+        return None
+    solution = np.zeros_like(w)
+    solution[active] = coef
+    return solution
+
+
+# Minimizes 1 / (2n) ||y - Xw||^2 + alpha * l1_ratio * ||w||_1 + alpha * (1 - l1_ratio) / 2 * ||w||^2 (ElasticNet)
+# by FISTA with the constant momentum of a strongly convex objective. A warm start's active set is tried first: after a
+# small change of the data, it usually still holds and is solved exactly without iterating. eigenvalues: of gram,
+# ascending, when already computed for other solves on the same gram. Returns (w, iterations, dual gap).
+def solve_elastic_net(gram, xty, yty, count, alpha, l1_ratio, tol, max_iter, warm_start=None, eigenvalues=None):
+    l1_reg = alpha * l1_ratio * count
+    l2_reg = alpha * (1.0 - l1_ratio) * count
+    eigenvalues = np.linalg.eigvalsh(gram) if eigenvalues is None else eigenvalues
+    lipschitz = max(eigenvalues[-1], 0.0) + l2_reg
+    strong_convexity = max(eigenvalues[0], 0.0) + l2_reg
+    momentum = (np.sqrt(lipschitz) - np.sqrt(strong_convexity)) / (np.sqrt(lipschitz) + np.sqrt(strong_convexity))
+    tol = tol * yty
+    w = np.zeros(len(xty)) if warm_start is None else np.array(warm_start, dtype=np.float64)
+    gap = elastic_net_dual_gap(w, gram, xty, yty, l1_reg, l2_reg)
+    if gap > tol:
+        solution = active_set_solution(w, gram, xty, l1_reg, l2_reg)
+        if solution is not None:
+            solution_gap = elastic_net_dual_gap(solution, gram, xty, yty, l1_reg, l2_reg)
+            if solution_gap < gap:
+                w, gap = solution, solution_gap
+    previous_w = w
+    iteration = 0
+    while gap > tol and iteration < max_iter:
+        iteration += 1
+        v = w + momentum * (w - previous_w)
+        v = v - (gram @ v - xty + l2_reg * v) / lipschitz
+        previous_w, w = w, np.sign(v) * np.maximum(np.abs(v) - l1_reg / lipschitz, 0.0)
+        if iteration % 10 == 0 or iteration == max_iter:
+            gap = elastic_net_dual_gap(w, gram, xty, yty, l1_reg, l2_reg)
+    return w, iteration, gap
+
+
+# A clone of model with the solved coefficients, as if fitted by sklearn on the scaled train rows
+def fitted_model(model, coef, intercept, n_iter=None, dual_gap=None):
+    fitted = clone(model)
+    fitted.coef_ = np.asarray(coef, dtype=np.float64)
+    fitted.intercept_ = float(intercept)
+    fitted.n_features_in_ = len(coef)
+    if isinstance(fitted, ElasticNet):
+        fitted.n_iter_ = n_iter
+        fitted.dual_gap_ = dual_gap
+    return fitted
+
+
+# Every model of models fitted on the train rows summed in statistics, scaled by the train split's RobustScaler center
+# and scale. warm_starts: ElasticNet coefficients of the previous cycle per model, or None.
+# Returns (fitted models, coefficients to warm start the next cycle from).
+def fit_models(statistics, x_center, x_scale, y_center, y_scale, models, warm_starts=None):
+    gram, xty, yty = statistics.centered_scaled(x_scale, y_scale)
+    x_mean, y_mean = statistics.scaled_means(x_center, x_scale, y_center, y_scale)
+    warm_starts = np.full((len(models), len(xty)), np.nan) if warm_starts is None else np.array(warm_starts)
+    fitted_models = []
+    for i, model in enumerate(models):
+        if isinstance(model, ElasticNet):
+            warm_start = None if np.isnan(warm_starts[i]).any() else warm_starts[i]
+            coef, n_iter, dual_gap = solve_elastic_net(gram, xty, yty, statistics.count, model.alpha,
+                                                       model.l1_ratio, model.tol, model.max_iter, warm_start)
+            warm_starts[i] = coef
+            fitted_models.append(fitted_model(model, coef, y_mean - x_mean @ coef, n_iter, dual_gap))
+        else:
+            coef = solve_linear_regression(gram, xty)
+            fitted_models.append(fitted_model(model, coef, y_mean - x_mean @ coef))
+    return fitted_models, warm_starts
+
+
+def supports(models):
+    return all(type(model) in (LinearRegression, ElasticNet) and model.fit_intercept for model in models)
+
+
+'''
+State
+'''
+
+
+def read_state(path):
+    try:
+        with open(path, 'rb') as file:
+            state = pickle.load(file)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+    return state if state.get('version') == STATE_VERSION else None
+
+
+def write_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model_generations.write_atomically(path, pickle.dumps(dict(state, version=STATE_VERSION)))
+
+
+# Bars the window moved by since the stored window, or None when the window does not continue it
+def window_shift(state, vwap, close):
+    previous_vwap, previous_close = state['vwap'], state['close']
+    if len(previous_vwap) != len(vwap):
+        return None
+    for shift in np.flatnonzero((previous_vwap == vwap[0]) & (previous_close == close[0])):
+        overlap = len(vwap) - shift
+        if np.array_equal(previous_vwap[shift:], vwap[:overlap]) and np.array_equal(previous_close[shift:],
+                                                                                     close[:overlap]):
+            return int(shift)
+    return None
+
+
+# SufficientStatistics of the first train_rows rows of (x, y), updated from state when possible.
+# Returns (statistics, updates since the last rebuild, whether it was rebuilt now).
+def updated_statistics(state, vwap, close, x, y, train_rows, future_window):
+    shift = None
+    if (state is not None and int(state['feature_count']) == future_window
+            and int(state['updates']) < REBUILD_UPDATES):
+        shift = window_shift(state, vwap, close)
+    if shift is None or shift >= train_rows:
+        statistics = SufficientStatistics(future_window, shift=vwap[0])
+        statistics.update(x[:train_rows], y[:train_rows])
+        return statistics, 0, True
+
+    statistics = SufficientStatistics.from_arrays(state)
+    if shift == 0:
+        return statistics, int(state['updates']), False
+    previous_x = lag_features.lag_matrix(state['vwap'], future_window)
+    previous_y = state['close'][future_window - 1:]
+    statistics.update(previous_x[:shift], previous_y[:shift], sign=-1)
+    statistics.update(x[train_rows - shift:train_rows], y[train_rows - shift:train_rows])
+    return statistics, int(state['updates']) + 1, False
+
+
+'''
+Training
+'''
+
+
+# Trains every model of models on one ticker's window of vwap and close prices, like the pipeline's train_ticker: the
+# last 2 * future_window lagged rows are the test split, the rest the train split. The sums of the train rows are read
+# from and saved to state_path. Returns the model with the lowest MAE on the first half of the test split, its MAE, the
+# future predictions, the test split's x_scaler and y_scaler and whether the sums were rebuilt.
+# model_search_path: file of the ticker's warm starts for MODEL_SELECTION=path, where the regularization path is
+# searched instead of models.
+def train_ticker(state_path, vwap, close, models, future_window, feature_names, label_names, model_search_path=None):
+    vwap = np.ascontiguousarray(vwap, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    if np.isnan(vwap).any() or np.isnan(close).any():
+        raise ValueError('Incremental training requires a window without missing prices')
+    x = lag_features.lag_matrix(vwap, future_window)
+    y = close[future_window - 1:]
+    train_rows = len(x) - 2 * future_window
+    if train_rows <= future_window:
+        raise ValueError(f'Window of {len(vwap)} prices is too short to train on')
+
+    state = read_state(state_path)
+    statistics, updates, rebuilt = updated_statistics(state, vwap, close, x, y, train_rows, future_window)
+
+    # RobustScaler centers and scales of the train and test splits
+    (x_center, x_scale), (y_center, y_scale), (x_test_center, x_test_scale), (y_test_center, y_test_scale) = [
+        tuple(array[0] for array in ticker_tensor.robust_center_and_scale(rows[np.newaxis]))
+        for rows in (x[:train_rows], y[:train_rows, np.newaxis], x[train_rows:], y[train_rows:, np.newaxis])]
+    x_test = (x[train_rows:] - x_test_center) / x_test_scale
+    y_true = y[train_rows:train_rows + future_window]
+
+    warm_starts = state.get('warm_starts') if state is not None else None
+    if warm_starts is not None and warm_starts.shape != (len(models), future_window):
+        warm_starts = None
+    if model_search_path is not None:
+        gram, xty, yty = statistics.centered_scaled(x_scale, y_scale[0])
+        x_mean, y_mean = statistics.scaled_means(x_center, x_scale, y_center[0], y_scale[0])
+        best, lowest_mae, _ = model_search.search(gram, xty, yty, statistics.count, x_mean, y_mean,
+                                                  x_test[:future_window], y_true, y_test_center[0], y_test_scale[0],
+                                                  model_search_path)
+    else:
+        fitted_models, warm_starts = fit_models(statistics, x_center, x_scale, y_center[0], y_scale[0], models,
+                                                warm_starts)
+        lowest_mae = 9999999
+        best = None
+        for fitted in fitted_models:
+            mae = model_search.validation_mae(fitted, x_test[:future_window], y_true, y_test_center[0],
+                                              y_test_scale[0])
+            # Validation: Use model that gives lowest MAE
+            if mae < lowest_mae:
+                lowest_mae = mae
+                best = fitted
+
+    future_y_pred = (x_test[-future_window:] @ best.coef_ + best.intercept_) * y_test_scale[0] + y_test_center[0]
+    write_state(state_path, dict(statistics.to_arrays(), feature_count=future_window, updates=updates, vwap=vwap,
+                                 close=close, warm_starts=warm_starts))
+    return {'model': best, 'mae': lowest_mae, 'predictions': np.round(future_y_pred, 2),
+            'x_scaler': ticker_tensor.robust_scaler(x_test_center, x_test_scale, feature_names),
+            'y_scaler': ticker_tensor.robust_scaler(y_test_center, y_test_scale, label_names),
+            'rebuilt': rebuilt}
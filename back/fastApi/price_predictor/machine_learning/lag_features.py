@@ -0,0 +1,33 @@
+"""Lag features shared by the serving API (main.py) and the ML pipeline (Price_Predictor_Notebook_Local.py).
+
+A row of lag features at time t is [p_t, p_t-1, ..., p_t-(future_window-1)]. Instead of one DataFrame.shift per lag,
+the whole (rows x future_window) matrix is a sliding-window view over one contiguous float64 array, so no prices are
+copied until a consumer (e.g. a scaler) needs to.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Column names in the order of lag_matrix's columns, e.g. ['vwap', 'lag_vwap_1', ..., 'lag_vwap_38']
+def lag_feature_names(feature, future_window):
+    return [feature] + [f'lag_{feature}_{lag}' for lag in range(1, future_window)]
+
+
+# (len(values) - future_window + 1, future_window) zero-copy view of lagged values.
+# Only rows with a complete set of lags are returned, same as DataFrame.shift followed by dropna.
+def lag_matrix(values, future_window):
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if values.shape[-1] < future_window:
+        return np.empty(values.shape[:-1] + (0, future_window))
+    return np.lib.stride_tricks.sliding_window_view(values, future_window, axis=-1)[..., ::-1]
+
+
+# DataFrame of df's columns with lag columns of `feature` appended, rows without complete lags dropped.
+# Column names match lag_feature_names, and the index is df's index from the first complete row onwards.
+def lagged_frame(df, feature, future_window):
+    lags = lag_matrix(df[feature].to_numpy(dtype=np.float64), future_window)
+    df_lags = pd.DataFrame(lags[:, 1:],
+                           columns=lag_feature_names(feature, future_window)[1:],
+                           index=df.index[future_window - 1:])
+    df_lagged = pd.concat([df.iloc[future_window - 1:], df_lags], axis=1)
+    return df_lagged.dropna()
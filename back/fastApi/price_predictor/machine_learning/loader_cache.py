@@ -0,0 +1,78 @@
+"""Change-aware cache of parsed ticker data for the ML pipeline's loader (json_to_dataframes).
+
+Each source (a <ticker>.json file or a price store ticker directory) is cached with its fingerprint:
+
+- stat: size and mtime of the file, or of every file in the directory. Unchanged stat reuses the cached value without
+  reading the source.
+- content hash: only computed when stat changed. An unchanged hash (e.g. a re-download of identical data) also reuses
+  the cached value, so only sources whose content changed are parsed again.
+
+The cache lives as long as its process, which for the training worker spans every pipeline cycle.
+"""
+import hashlib
+import os
+
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def _files(path):
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    return [path]
+
+
+def stat_fingerprint(path):
+    fingerprint = []
+    for file_path in _files(path):
+        stat = os.stat(file_path)
+        fingerprint.append((os.path.basename(file_path), stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    for file_path in _files(path):
+        digest.update(os.path.basename(file_path).encode())
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LoaderCache:
+    def __init__(self):
+        self._entries = {}  # key: source path, value: (stat fingerprint, content hash, parsed value)
+        self.reused = 0
+        self.reloaded = 0
+
+    # Call before each load cycle: resets the reused / reloaded counts
+    def start_cycle(self):
+        self.reused = 0
+        self.reloaded = 0
+
+    # Parsed value of the source at path. parse(path) only runs when the source's content changed.
+    def get(self, path, parse):
+        stat = stat_fingerprint(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stat:
+            self.reused += 1
+            return entry[2]
+
+        digest = content_hash(path)
+        if entry is not None and entry[1] == digest:
+            self._entries[path] = (stat, digest, entry[2])
+            self.reused += 1
+            return entry[2]
+
+        value = parse(path)
+        self._entries[path] = (stat, digest, value)
+        self.reloaded += 1
+        return value
+
+    # Drops sources that no longer exist, e.g. delisted tickers
+    def retain(self, paths):
+        for path in set(self._entries) - set(paths):
+            del self._entries[path]
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,129 @@
+"""Versioned, atomically published trained files, shared by the ML pipeline (writer) and the serving API (reader).
+
+Every ML pipeline cycle writes one generation. Each ticker's model, x_scaler and y_scaler are pickled together as one
+bundle, so a reader can never combine a new model with an old scaler:
+
+    <trained_files_directory>/generations/<generation>/<ticker>.pkl   {'model': ..., 'x_scaler': ..., 'y_scaler': ...}
+    <trained_files_directory>/generations/CURRENT                       name of the active generation
+
+Bundles are written into a hidden staging directory which is renamed into place once complete, and CURRENT is only
+replaced after that, so readers either see the previous generation or the complete new one.
+"""
+import os
+import pickle
+import shutil
+import time
+from datetime import datetime, timezone
+
+GENERATIONS_DIRECTORY_NAME = 'generations'
+CURRENT_FILENAME = 'CURRENT'
+GENERATIONS_TO_KEEP = 3
+# Older generations are only removed once replaced for GENERATION_RETENTION_SECONDS, so a serving snapshot of a replaced
+# generation (held by a request until it completes) can still load its bundles
+GENERATION_RETENTION_SECONDS = float(os.getenv('GENERATION_RETENTION_SECONDS', '600'))
+
+
+def generations_directory(trained_files_directory):
+    return os.path.join(trained_files_directory, GENERATIONS_DIRECTORY_NAME)
+
+
+def generation_directory(trained_files_directory, generation):
+    return os.path.join(generations_directory(trained_files_directory), generation)
+
+
+# Sortable generation name, e.g. '20240818T120000123456Z'
+def new_generation_name():
+    return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+
+
+# Returns (generation, staging directory) to write the generation's bundles into before publishing it
+def start_generation(trained_files_directory):
+    generation = new_generation_name()
+    staging_directory = os.path.join(generations_directory(trained_files_directory), f'.{generation}.staging')
+    os.makedirs(staging_directory)
+    return generation, staging_directory
+
+
+# Writes any file by renaming a fully written temporary file over it
+def write_atomically(path, data):
+    temporary_path = f'{path}.tmp-{os.getpid()}'
+    with open(temporary_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def write_bundle(directory, ticker, model, x_scaler, y_scaler):
+    bundle = {'model': model, 'x_scaler': x_scaler, 'y_scaler': y_scaler}
+    write_atomically(os.path.join(directory, f'{ticker}.pkl'), pickle.dumps(bundle))
+
+
+# (model, x_scaler, y_scaler) of a pickled bundle
+def bundle_from_bytes(data):
+    bundle = pickle.loads(data)
+    return bundle['model'], bundle['x_scaler'], bundle['y_scaler']
+
+
+def read_bundle(path):
+    with open(path, 'rb') as f:
+        return bundle_from_bytes(f.read())
+
+
+# Copies the active generation's bundles of tickers that are missing from the staging directory, e.g. because their
+# training failed this cycle, so a published generation never drops a ticker that was previously served
+def carry_forward_bundles(trained_files_directory, staging_directory):
+    current_generation = read_current_generation(trained_files_directory)
+    if current_generation is None:
+        return []
+    current_directory = generation_directory(trained_files_directory, current_generation)
+    if not os.path.isdir(current_directory):
+        return []
+    carried_tickers = []
+    for filename in sorted(os.listdir(current_directory)):
+        if filename.endswith('.pkl') and not os.path.exists(os.path.join(staging_directory, filename)):
+            shutil.copyfile(os.path.join(current_directory, filename), os.path.join(staging_directory, filename))
+            carried_tickers.append(filename.split(".")[0])
+    return carried_tickers
+
+
+# Moves the staging directory into place, points CURRENT at it and removes the generations beyond the newest
+# GENERATIONS_TO_KEEP that were replaced more than retention_seconds (default GENERATION_RETENTION_SECONDS) ago.
+# A generation's directory modification time is when it was published, i.e. when it replaced the previous one.
+def publish_generation(trained_files_directory, generation, staging_directory, retention_seconds=None):
+    retention_seconds = GENERATION_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+    directory = generation_directory(trained_files_directory, generation)
+    os.replace(staging_directory, directory)
+    os.utime(directory)
+    write_atomically(os.path.join(generations_directory(trained_files_directory), CURRENT_FILENAME),
+                     generation.encode())
+    generations = list_generations(trained_files_directory)
+    now = time.time()
+    for old_generation, next_generation in zip(generations[:-GENERATIONS_TO_KEEP], generations[1:]):
+        replaced_at = os.stat(generation_directory(trained_files_directory, next_generation)).st_mtime
+        if now - replaced_at >= retention_seconds:
+            shutil.rmtree(generation_directory(trained_files_directory, old_generation), ignore_errors=True)
+
+
+def list_generations(trained_files_directory):
+    directory = generations_directory(trained_files_directory)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory)
+                  if not name.startswith('.') and os.path.isdir(os.path.join(directory, name)))
+
+
+# Active generation name, or None when no generation has been published yet
+def read_current_generation(trained_files_directory):
+    try:
+        with open(os.path.join(generations_directory(trained_files_directory), CURRENT_FILENAME), 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# key: ticker, value: (model, x_scaler, y_scaler) of every bundle in the generation
+def load_generation(trained_files_directory, generation):
+    directory = generation_directory(trained_files_directory, generation)
+    return {filename.split(".")[0]: read_bundle(os.path.join(directory, filename))
+            for filename in sorted(os.listdir(directory)) if filename.endswith('.pkl')}
@@ -0,0 +1,107 @@
+"""Regularization path search of each ticker's model (MODEL_SELECTION=path of the ML pipeline).
+
+Instead of the fixed models list, a ticker's model is chosen among LinearRegression and ElasticNet over ALPHAS x
+L1_RATIOS, by MAE on the first half of the test split like the pipeline's train_ticker:
+
+- The 39 x 39 centered Gram matrix of the scaled train rows and its eigenvalues are computed once per ticker and shared
+  by every candidate, solved with incremental_training's solvers. In TRAINING_MODE=incremental, the Gram matrix comes
+  from the sufficient statistics instead of the rows.
+- Along each l1_ratio, alphas are visited from the smallest. A candidate is warm started from its coefficients of the
+  previous cycle, or else from the previous alpha's.
+- Lightly regularized candidates usually predict prices best, and validation MAE grows with alpha past the best one.
+  So a path stops after PATIENCE alphas in a row that do not improve on its lowest MAE: the larger alphas clearly lose
+  and are not solved. LinearRegression, the alpha = 0 end of every path, is always evaluated.
+
+Coefficients of the evaluated candidates are kept per ticker, under TRAINED_FILES_DIRECTORY, for the next cycle.
+"""
+import os
+import pickle
+
+import numpy as np
+from sklearn.linear_model import ElasticNet, LinearRegression
+
+from . import incremental_training
+from . import model_generations
+
+# Includes the pipeline's ElasticNet(alpha=0.2, l1_ratio=0.2)
+ALPHAS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+L1_RATIOS = (0.2, 0.5, 0.8)
+PATIENCE = 2
+
+
+# (Gram, X'y, y'y, count, mean of x, mean of y) of the rows x, y centered on their means
+def centered_gram(x, y):
+    x_mean, y_mean = x.mean(axis=0), float(y.mean())
+    x_centered, y_centered = x - x_mean, y - y_mean
+    return (x_centered.T @ x_centered, x_centered.T @ y_centered, float(y_centered @ y_centered), len(x), x_mean,
+            y_mean)
+
+
+# key: (alpha, l1_ratio), value: ElasticNet coefficients of the previous cycle
+def read_warm_starts(path):
+    try:
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return {}
+
+
+def write_warm_starts(path, warm_starts):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model_generations.write_atomically(path, pickle.dumps(warm_starts))
+
+
+# MAE in prices of fitted's predictions of the validation rows, inverse scaled by y_center and y_scale
+def validation_mae(fitted, x_validation, y_validation, y_center, y_scale):
+    y_pred = (x_validation @ fitted.coef_ + fitted.intercept_) * y_scale + y_center
+    return float(np.mean(np.abs(y_validation - y_pred)))
+
+
+# Searches LinearRegression and the ElasticNet path of every l1_ratio for the lowest validation MAE. gram, xty, yty,
+# count, x_mean and y_mean are those of the scaled train rows. x_validation is scaled like the rows predicted later,
+# y_validation in prices. Warm starts are read from and saved to warm_starts_path, when given.
+# Returns (model, MAE, number of candidates evaluated).
+def search(gram, xty, yty, count, x_mean, y_mean, x_validation, y_validation, y_center, y_scale,
+           warm_starts_path=None, alphas=ALPHAS, l1_ratios=L1_RATIOS, patience=PATIENCE):
+    previous_starts = read_warm_starts(warm_starts_path) if warm_starts_path is not None else {}
+    warm_starts = dict(previous_starts)
+    eigenvalues = np.linalg.eigvalsh(gram)
+    # Candidates are compared by their coefficients. Only the selected one becomes an estimator.
+    x_validation_centered = x_validation - x_mean
+
+    def mae_of(coef):
+        y_pred = (x_validation_centered @ coef + y_mean) * y_scale + y_center
+        return float(np.mean(np.abs(y_validation - y_pred)))
+
+    coef = incremental_training.solve_linear_regression(gram, xty)
+    best = (LinearRegression(), coef, None, None)
+    lowest_mae = mae_of(coef)
+    evaluated = 1
+    for l1_ratio in l1_ratios:
+        path_mae = np.inf
+        misses = 0
+        coef = None
+        for alpha in sorted(alphas):
+            model = ElasticNet(alpha=alpha, l1_ratio=l1_ratio)
+            warm_start = previous_starts.get((alpha, l1_ratio))
+            if warm_start is None or warm_start.shape != xty.shape:
+                warm_start = coef
+            coef, n_iter, dual_gap = incremental_training.solve_elastic_net(
+                gram, xty, yty, count, alpha, l1_ratio, model.tol, model.max_iter, warm_start, eigenvalues)
+            warm_starts[(alpha, l1_ratio)] = coef
+            mae = mae_of(coef)
+            evaluated += 1
+            if mae < lowest_mae:
+                best, lowest_mae = (model, coef, n_iter, dual_gap), mae
+            if mae < path_mae:
+                path_mae, misses = mae, 0
+            else:
+                misses += 1
+                if misses >= patience:
+                    break
+
+    if warm_starts_path is not None:
+        write_warm_starts(warm_starts_path, warm_starts)
+    model, coef, n_iter, dual_gap = best
+    return (incremental_training.fitted_model(model, coef, y_mean - x_mean @ coef, n_iter, dual_gap), lowest_mae,
+            evaluated)
@@ -0,0 +1,129 @@
+"""Process pool for per-ticker ML pipeline tasks, with NumPy inputs passed through shared memory.
+
+The parent copies each input array once into a shared memory block (SharedArrays). Tasks only receive the blocks'
+names plus their own small arguments (e.g. row ranges and scalers), and workers map the blocks as NumPy views instead
+of unpickling DataFrames. Results and errors are gathered per task.
+"""
+import multiprocessing
+import multiprocessing.util
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Worker processes of the ML pipeline. 0 = one per CPU available to this process.
+TRAINING_PROCESSES = int(os.getenv('TRAINING_PROCESSES', '0'))
+
+
+def available_cpus():
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+
+def worker_count(workers=None):
+    workers = TRAINING_PROCESSES if workers is None else workers
+    return workers if workers > 0 else available_cpus()
+
+
+# Parent side: named arrays copied into shared memory. Use as a context manager so the blocks are always unlinked.
+class SharedArrays:
+    def __init__(self, arrays):
+        self._blocks = []
+        self.descriptors = {}  # key: array name, value: (shared memory name, shape, dtype)
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self._blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.descriptors[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Worker side: blocks attached by this process, kept open while they are still in use by the current descriptors
+_attached_blocks = {}
+
+
+def attach(descriptors):
+    names = {shared_name for shared_name, _, _ in descriptors.values()}
+    for stale_name in [name for name in _attached_blocks if name not in names]:
+        _attached_blocks.pop(stale_name).close()
+    arrays = {}
+    for array_name, (shared_name, shape, dtype) in descriptors.items():
+        if shared_name not in _attached_blocks:
+            _attached_blocks[shared_name] = shared_memory.SharedMemory(name=shared_name)
+        arrays[array_name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_attached_blocks[shared_name].buf)
+    return arrays
+
+
+def _call(function, arrays, arguments):
+    try:
+        return function(arrays, *arguments), None
+    except Exception as err:
+        return None, f'{type(err).__name__}: {err}\n{traceback.format_exc()}'
+
+
+def _run_task(function, descriptors, arguments):
+    return _call(function, attach(descriptors), arguments)
+
+
+# Reused across pipeline cycles, so worker start-up (spawn + imports) is only paid once
+_executor = None
+_executor_workers = None
+
+
+def _get_executor(workers):
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown()
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _executor_workers = workers
+        # When this process is itself a worker (e.g. the training worker), it joins its child processes on exit
+        # before interpreter shutdown would stop the pool, so stop the pool first, before the pool's own queues
+        # stop their feeder threads (finalizers of priority 10).
+        multiprocessing.util.Finalize(None, shutdown, exitpriority=100)
+    return _executor
+
+
+def shutdown():
+    global _executor, _executor_workers
+    if _executor is not None:
+        _executor.shutdown()
+    _executor, _executor_workers = None, None
+
+
+# Runs function(arrays, *arguments) for every tuple of task_arguments, where arrays are the shared arrays as NumPy
+# views. Returns one (result, error) per task, in task order. workers <= 1 runs the tasks in this process.
+# function must be a picklable module-level function.
+def map_tasks(function, arrays, task_arguments, workers=None):
+    workers = min(worker_count(workers), max(len(task_arguments), 1))
+    if workers <= 1:
+        return [_call(function, arrays, arguments) for arguments in task_arguments]
+
+    with SharedArrays(arrays) as shared_arrays:
+        executor = _get_executor(workers)
+        futures = [executor.submit(_run_task, function, shared_arrays.descriptors, arguments)
+                   for arguments in task_arguments]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as err:
+                # A worker died, e.g. killed by the OOM killer. Its tasks fail, the next cycle gets a new pool.
+                results.append((None, f'{type(err).__name__}: {err}'))
+        if any(isinstance(future.exception(), BrokenProcessPool) for future in futures):
+            shutdown()
+        return results
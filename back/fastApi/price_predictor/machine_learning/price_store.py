@@ -0,0 +1,152 @@
+"""Columnar on-disk price store shared by the serving API and the ML pipeline.
+
+Each ticker is a directory holding one fixed-width little-endian array file per column plus a small header:
+
+    <store_directory>/<ticker>/header.json     {"version": 1, "rows": n, "columns": {"vwap": "<f8", ...}, ...}
+    <store_directory>/<ticker>/<column>.bin    n values of the column's dtype
+    <store_directory>/<ticker>/index.bin       n int64 row labels of the source JSON
+
+Columns are read through np.memmap, so reading the latest prices of one column only touches that column's tail pages
+instead of parsing the whole split-orient JSON file.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+HEADER_FILENAME = 'header.json'
+INDEX_FILENAME = 'index.bin'
+STORE_VERSION = 1
+
+
+def ticker_directory(store_directory, ticker):
+    return os.path.join(store_directory, ticker)
+
+
+def has_ticker(store_directory, ticker):
+    return os.path.isfile(os.path.join(ticker_directory(store_directory, ticker), HEADER_FILENAME))
+
+
+# Tickers with a complete header in the store, e.g. ['AAPL', 'META', 'NVDA']
+def tickers(store_directory):
+    if not os.path.isdir(store_directory):
+        return []
+    return sorted(ticker for ticker in os.listdir(store_directory) if has_ticker(store_directory, ticker))
+
+
+def read_header(store_directory, ticker):
+    with open(os.path.join(ticker_directory(store_directory, ticker), HEADER_FILENAME), 'r') as file:
+        return json.load(file)
+
+
+# Read-only memory-mapped view of a whole column
+def read_column(store_directory, ticker, column, header=None):
+    header = header or read_header(store_directory, ticker)
+    if column not in header['columns']:
+        raise KeyError(f'{ticker} has no column {column}. Available: {list(header["columns"])}')
+    return _map_array(os.path.join(ticker_directory(store_directory, ticker), f'{column}.bin'),
+                      header['columns'][column], header['rows'])
+
+
+# Copy of the last `count` values of a column, oldest first
+def read_column_tail(store_directory, ticker, column, count):
+    return np.array(read_column(store_directory, ticker, column)[-count:])
+
+
+# DataFrame of the stored columns (all by default), indexed by the source JSON's row labels
+def read_frame(store_directory, ticker, columns=None):
+    header = read_header(store_directory, ticker)
+    columns = list(header['columns']) if columns is None else columns
+    index = _map_array(os.path.join(ticker_directory(store_directory, ticker), INDEX_FILENAME), '<i8', header['rows'])
+    return pd.DataFrame({column: np.array(read_column(store_directory, ticker, column, header)) for column in columns},
+                        index=pd.Index(np.array(index)))
+
+
+def _map_array(path, dtype, rows):
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+
+'''
+Converter from split-orient JSON (sample_local_data/<ticker>.json)
+'''
+
+
+# Fixed-width dtype for a column. Non-numeric columns (e.g. polygon's all-null `otc`) are stored as float64 with NaN.
+def _column_array(series):
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype='|u1')
+    if pd.api.types.is_integer_dtype(series):
+        return series.to_numpy(dtype='<i8')
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype='<f8', na_value=np.nan)
+
+
+def write_frame(store_directory, ticker, df, source=None):
+    os.makedirs(store_directory, exist_ok=True)
+    # Write into a temporary directory, then swap it in so readers never see a partially written ticker
+    temporary_directory = ticker_directory(store_directory, f'.{ticker}.tmp-{os.getpid()}')
+    shutil.rmtree(temporary_directory, ignore_errors=True)
+    os.makedirs(temporary_directory)
+
+    columns = {}
+    for column in df.columns:
+        values = _column_array(df[column])
+        values.tofile(os.path.join(temporary_directory, f'{column}.bin'))
+        columns[str(column)] = values.dtype.str
+    index = df.index.to_numpy() if pd.api.types.is_integer_dtype(df.index) else np.arange(len(df))
+    index.astype('<i8').tofile(os.path.join(temporary_directory, INDEX_FILENAME))
+    header = {'version': STORE_VERSION, 'rows': len(df), 'columns': columns, 'source': source}
+    with open(os.path.join(temporary_directory, HEADER_FILENAME), 'w') as file:
+        json.dump(header, file)
+
+    final_directory = ticker_directory(store_directory, ticker)
+    if os.path.isdir(final_directory):
+        old_directory = ticker_directory(store_directory, f'.{ticker}.old-{os.getpid()}')
+        os.replace(final_directory, old_directory)
+        os.replace(temporary_directory, final_directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+    else:
+        os.replace(temporary_directory, final_directory)
+    return header
+
+
+def convert_json(json_path, store_directory, ticker=None):
+    ticker = ticker or os.path.basename(json_path).split(".")[0]
+    with open(json_path, 'r') as file:
+        data_dict = json.load(file)
+    df = pd.DataFrame(data=data_dict['data'],
+                      columns=data_dict['columns'],
+                      index=data_dict['index'])
+    df.columns = df.columns.str.replace(' ', '')
+    source = {'filename': os.path.basename(json_path), 'mtime_ns': os.stat(json_path).st_mtime_ns}
+    return write_frame(store_directory, ticker, df, source)
+
+
+# Converts every non-empty <ticker>.json of source_directory whose store copy is missing or older than the JSON.
+# Returns the converted tickers.
+def convert_directory(source_directory, store_directory):
+    converted = []
+    for filename in sorted(os.listdir(source_directory)):
+        json_path = os.path.join(source_directory, filename)
+        if not filename.endswith('.json') or os.path.getsize(json_path) <= 0:
+            continue
+        ticker = filename.split(".")[0]
+        if has_ticker(store_directory, ticker):
+            source = read_header(store_directory, ticker).get('source') or {}
+            if source.get('mtime_ns') == os.stat(json_path).st_mtime_ns:
+                continue
+        try:
+            convert_json(json_path, store_directory, ticker)
+            converted.append(ticker)
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Error converting file {filename}: {e}")
+    return converted
+
+
+if __name__ == '__main__':
+    # e.g. python -m machine_learning.price_store sample_local_data sample_local_store
+    import sys
+    print(f'Converted: {convert_directory(sys.argv[1], sys.argv[2])}')
@@ -0,0 +1,69 @@
+"""Dense (ticker, time, feature) tensors for the ML pipeline's train-test split and robust scaling.
+
+Tickers may have different numbers of rows. Each ticker's rows are aligned to the end of the time axis and shorter
+tickers are padded with NaN at the start, so the test split (the newest rows of every ticker) is a plain slice and
+NaN-aware reductions along the time axis ignore the padding.
+
+robust_center_and_scale computes what RobustScaler().fit computes for each ticker (nanmedian, 25th-75th percentile
+range, near-zero ranges replaced by 1), for all tickers in one call. robust_scaler wraps one ticker's result in a fitted
+RobustScaler, so pickled scalers stay interchangeable with ones fitted by sklearn.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import RobustScaler
+
+QUANTILE_RANGE = (25.0, 75.0)  # RobustScaler's default
+
+
+# Row ranges of each ticker in a MultiIndex DataFrame whose rows are grouped by ticker. key: ticker, value: (start, stop)
+def ticker_row_ranges(df):
+    ticker_codes, tickers = pd.factorize(df.index.get_level_values('ticker'))
+    starts = np.flatnonzero(np.r_[True, ticker_codes[1:] != ticker_codes[:-1]])
+    stops = np.r_[starts[1:], len(ticker_codes)]
+    if len(starts) != len(tickers):
+        raise Exception(f"Please make sure each ticker's rows are contiguous.")
+    return {tickers[ticker_codes[start]]: (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+
+# Returns (tickers, tensor of shape (tickers, longest ticker's rows, columns), rows of each ticker).
+def from_frame(df, columns):
+    row_ranges = ticker_row_ranges(df)
+    tickers = list(row_ranges)
+    lengths = np.array([stop - start for start, stop in row_ranges.values()], dtype=np.int64)
+    values = df[columns].to_numpy(dtype=np.float64)
+
+    tensor = np.full((len(tickers), int(lengths.max(initial=0)), len(columns)), np.nan)
+    for i, (start, stop) in enumerate(row_ranges.values()):
+        tensor[i, tensor.shape[1] - (stop - start):] = values[start:stop]
+    return tickers, tensor, lengths
+
+
+# (center, scale), each of shape (tickers, features), of a (tickers, time, features) tensor. NaN rows are ignored.
+def robust_center_and_scale(tensor):
+    center = np.empty((tensor.shape[0], tensor.shape[2]))
+    quantiles = np.empty((len(QUANTILE_RANGE),) + center.shape)
+    # The NaN-aware reductions are several times slower, so they only run on tickers that are padded
+    padded = np.isnan(tensor).any(axis=(1, 2))
+    for tickers, median, percentile in [(~padded, np.median, np.percentile),
+                                        (padded, np.nanmedian, np.nanpercentile)]:
+        if tickers.any():
+            center[tickers] = median(tensor[tickers], axis=1)
+            quantiles[:, tickers] = percentile(tensor[tickers], QUANTILE_RANGE, axis=1)
+    scale = quantiles[1] - quantiles[0]
+    # Near constant features keep their values, same as sklearn's _handle_zeros_in_scale
+    scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.0
+    return center, scale
+
+
+def robust_scale(tensor, center, scale):
+    return (tensor - center[:, np.newaxis, :]) / scale[:, np.newaxis, :]
+
+
+# RobustScaler fitted to one ticker's center and scale, as if fitted on a DataFrame with columns feature_names
+def robust_scaler(center, scale, feature_names):
+    scaler = RobustScaler(quantile_range=QUANTILE_RANGE)
+    scaler.center_ = np.array(center, dtype=np.float64)
+    scaler.scale_ = np.array(scale, dtype=np.float64)
+    scaler.n_features_in_ = len(feature_names)
+    scaler.feature_names_in_ = np.asarray(feature_names, dtype=object)
+    return scaler
@@ -0,0 +1,194 @@
+"""Runs the ML pipeline in a dedicated worker process, away from the serving API's GIL and CPUs.
+
+- One persistent worker process (a single-process ProcessPoolExecutor), so pandas/sklearn are imported once.
+- Runs never overlap: triggers during a run are coalesced into one follow-up run.
+- CPU affinity, niceness and BLAS/OpenMP thread counts of the worker are configurable.
+- The worker reports progress (e.g. 'ML - 3/7 - ...') back to the API process through a queue.
+- A run's return value, e.g. the pipeline's stage and ticker timings, is handed to on_complete in the API process.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger('uvicorn')
+
+BLAS_THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                         'VECLIB_MAXIMUM_THREADS']
+
+'''
+Worker process
+'''
+
+_progress_queue = None
+_blas_threads = None
+
+
+# Runs once in the worker process, before the pipeline imports NumPy / sklearn
+def _initialize_worker(progress_queue, cpus, blas_threads, nice):
+    global _progress_queue, _blas_threads
+    _progress_queue = progress_queue
+    _blas_threads = blas_threads
+    if blas_threads:
+        for variable in BLAS_THREAD_VARIABLES:
+            os.environ[variable] = str(blas_threads)
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:cpus])
+    if nice:
+        os.nice(nice)
+
+
+# Progress messages are tagged with their run's number, so the API process can drop a run's messages arriving after
+# the next run started
+def _run_in_worker(target, run):
+    from threadpoolctl import threadpool_limits
+
+    def report_progress(message):
+        _progress_queue.put((run, message))
+
+    with threadpool_limits(limits=_blas_threads):
+        return target(report_progress)
+
+
+# Default target: one cycle of the ML pipeline. Returns its timings.
+def execute_pipeline(progress):
+    from . import Price_Predictor_Notebook_Local as ml
+    return ml.execute(progress=progress)
+
+
+'''
+API process
+'''
+
+
+class TrainingWorker:
+    # target: picklable module-level function taking a progress callback, run in the worker process.
+    # cpus: number of CPUs the worker may run on (None = all), blas_threads: BLAS/OpenMP threads in the worker,
+    # nice: niceness added to the worker so serving wins CPU contention.
+    # on_complete: optional callback receiving the return value of each successful run, in the API process.
+    def __init__(self, target=execute_pipeline, cpus=None, blas_threads=1, nice=0, on_complete=None):
+        self.target = target
+        self.on_complete = on_complete
+        self.cpus = cpus
+        self.blas_threads = blas_threads
+        self.nice = nice
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress_queue = None
+        self._running = False
+        self._pending = False
+        self._idle = threading.Event()
+        self._idle.set()
+        self._status = {
+            'state': 'idle',
+            'stage': None,
+            'runs_started': 0,
+            'runs_completed': 0,
+            'runs_failed': 0,
+            'runs_coalesced': 0,
+            'last_started_at': None,
+            'last_finished_at': None,
+            'last_duration_seconds': None,
+            'last_error': None,
+        }
+
+    # Starts a run, or if one is already running, schedules exactly one follow-up run. Returns True if started now.
+    def trigger(self):
+        with self._lock:
+            if self._running:
+                if self._pending:
+                    self._status['runs_coalesced'] += 1
+                self._pending = True
+                return False
+            self._start_locked()
+            return True
+
+    def status(self):
+        with self._lock:
+            return dict(self._status, pending=self._pending)
+
+    # Blocks until no run is active or pending. Returns False on timeout.
+    def wait_until_idle(self, timeout=None):
+        return self._idle.wait(timeout)
+
+    def shutdown(self):
+        with self._lock:
+            self._pending = False
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._progress_queue.put(None)
+                self._executor = None
+
+    def _start_locked(self):
+        if self._executor is None:
+            context = multiprocessing.get_context('spawn')
+            self._progress_queue = context.Queue()
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=context,
+                                                 initializer=_initialize_worker,
+                                                 initargs=(self._progress_queue, self.cpus, self.blas_threads,
+                                                           self.nice))
+            threading.Thread(target=self._receive_progress, args=(self._progress_queue,), daemon=True,
+                             name='training-progress').start()
+        self._running = True
+        self._idle.clear()
+        self._status.update(state='running', stage=None, last_started_at=time.time())
+        self._status['runs_started'] += 1
+        future = self._executor.submit(_run_in_worker, self.target, self._status['runs_started'])
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        with self._lock:
+            if future.cancelled():  # shutdown() before the run started
+                self._running = False
+                self._status['state'] = 'idle'
+                self._idle.set()
+                return
+            finished_at = time.time()
+            self._status.update(last_finished_at=finished_at,
+                                last_duration_seconds=finished_at - self._status['last_started_at'])
+            error = future.exception()
+            if error is None:
+                self._status['runs_completed'] += 1
+                self._status['last_error'] = None
+                if self.on_complete is not None:
+                    try:
+                        self.on_complete(future.result())
+                    except Exception as err:
+                        logger.error(f'Training run on_complete failed: {err}')
+            else:
+                self._status['runs_failed'] += 1
+                self._status['last_error'] = f'{type(error).__name__}: {error}'
+                logger.error(f'Training run failed: {error}')
+                if isinstance(error, BrokenProcessPool):
+                    # The worker died, e.g. killed by the OOM killer. Start a new one for the next run.
+                    self._progress_queue.put(None)
+                    self._executor = None
+            if self._pending:
+                # Stay marked as running so triggers keep coalescing, and submit from another thread: this callback
+                # runs on the executor's management thread.
+                self._pending = False
+                threading.Thread(target=self._start_follow_up, daemon=True, name='training-follow-up').start()
+            else:
+                self._running = False
+                self._status['state'] = 'idle'
+                self._idle.set()
+
+    def _start_follow_up(self):
+        with self._lock:
+            self._start_locked()
+
+    # Messages are applied by this thread, so a run's last messages may be applied after the run completed
+    def _receive_progress(self, progress_queue):
+        while True:
+            item = progress_queue.get()
+            if item is None:
+                return
+            run, message = item
+            with self._lock:
+                if run != self._status['runs_started']:
+                    continue
+                self._status['stage'] = message
+            logger.info(f'Training worker: {message}')
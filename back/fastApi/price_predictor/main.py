@@ -1,23 +1,46 @@
 import json
 import os
+import threading
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, RedirectResponse
 from dotenv import load_dotenv
 from .service import utils as utils
+from .service import stacked_predictor
+from .service import model_registry
+from .service import artifact_store
+from .service import leader_election
+from .service import micro_batcher
+from .service import wire_format
+from .service import metrics
+from .service import prediction_cache
+from .service import backtest_sessions
 import logging
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import List, Type
+from typing import List, Optional
 from pydantic import BaseModel
 import pickle
 import numpy as np
 import pandas as pd
 from apscheduler.schedulers.background import BackgroundScheduler
 from polygon import RESTClient
-from .machine_learning import Price_Predictor_Notebook_Local as ml
+from .machine_learning import lag_features
+from .machine_learning import price_store
+from .machine_learning import bar_segments
+from .machine_learning import training_worker
 
 # Load
 app = FastAPI(docs_url="/documentation", redoc_url=None)
+
+
+# Every request is timed (service/metrics.py), and endpoints taking a DTO body also answer the float JSON and float64
+# wire formats (service/wire_format.py)
+class ServingRoute(metrics.TimedRoute, wire_format.WireRoute):
+    pass
+
+
+app.router.route_class = ServingRoute
 logger = logging.getLogger('uvicorn')
 load_dotenv()
 
@@ -29,6 +52,7 @@ AWS_S3_ACCESS_KEY_ID = os.getenv('AWS_S3_ACCESS_KEY_ID')
 AWS_S3_SECRET_ACCESS_KEY = os.getenv('AWS_S3_SECRET_ACCESS_KEY')
 AWS_S3_PREDICTION_BUCKET_NAME = os.getenv('AWS_S3_PREDICTION_BUCKET_NAME')
 AWS_S3_MODEL_BUCKET_NAME = os.getenv('AWS_S3_MODEL_BUCKET_NAME')
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL')  # None = AWS
 
 # POLYGON
 POLYGON_API_KEY = os.getenv('POLYGON_API_KEY')
@@ -38,13 +62,81 @@ PARENT_DIRECTORY_PATH = str(utils.get_project_root())
 REPO_ROOT_PATH = str(utils.get_repo_root())
 TRAINED_FILES_DIRECTORY = PARENT_DIRECTORY_PATH + '/sample_local_trained_files'
 DATA_DIRECTORY = PARENT_DIRECTORY_PATH + '/sample_local_data'
+PRICE_STORE_DIRECTORY = PARENT_DIRECTORY_PATH + '/sample_local_store'
+# Compressed daily bar segments appended by ingestion (service/get_data.py), preferred over the price store
+BAR_SEGMENTS_DIRECTORY = os.getenv('BAR_SEGMENTS_DIRECTORY', PARENT_DIRECTORY_PATH + '/sample_local_segments')
+
+# WIRE FORMATS - responses of at least GZIP_MINIMUM_BYTES are gzip compressed for clients accepting it, at
+# GZIP_COMPRESS_LEVEL: level 1 compresses JSON about 10x faster than 9, into 8% more bytes
+GZIP_MINIMUM_BYTES = int(os.getenv('GZIP_MINIMUM_BYTES', '1000'))
+GZIP_COMPRESS_LEVEL = int(os.getenv('GZIP_COMPRESS_LEVEL', '1'))
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_BYTES, compresslevel=GZIP_COMPRESS_LEVEL)
 
 # IN-MEMORY DATA
 FEATURE = 'vwap'
 FEATURE_COUNT = 39
-LOADED_MODELS = {}
-LOADED_X_SCALERS = {}
-LOADED_Y_SCALERS = {}
+# Active ModelSet (models, x_scalers, y_scalers) is MODEL_REGISTRY.active, polled for new generations every
+# MODEL_RELOAD_SECONDS. Falls back to the unversioned model/, x_scaler/, y_scaler/ layout via load_all_pickle_files.
+MODEL_RELOAD_SECONDS = int(os.getenv('MODEL_RELOAD_SECONDS', '10'))
+# Trained files are read from TRAINED_FILES_DIRECTORY ('local') or AWS_S3_MODEL_BUCKET_NAME ('s3'), by
+# ARTIFACT_LOAD_CONCURRENCY threads sharing one client
+ARTIFACT_STORE = os.getenv('ARTIFACT_STORE', 'local')
+ARTIFACT_LOAD_CONCURRENCY = int(os.getenv('ARTIFACT_LOAD_CONCURRENCY', '16'))
+# A generation's bundles are loaded when their ticker is first requested. The least recently used are evicted beyond
+# MODEL_MEMORY_BUDGET_MB (0 = unlimited), except those of MODEL_PINNED_TICKERS (comma separated), always resident.
+MODEL_MEMORY_BUDGET_MB = float(os.getenv('MODEL_MEMORY_BUDGET_MB', '512'))
+MODEL_PINNED_TICKERS = [ticker.strip() for ticker in os.getenv('MODEL_PINNED_TICKERS', '').split(',') if ticker.strip()]
+
+
+def make_artifact_store():
+    if ARTIFACT_STORE == 's3':
+        s3 = artifact_store.make_s3_client(AWS_S3_ENDPOINT_URL, ARTIFACT_LOAD_CONCURRENCY,
+                                           aws_access_key_id=AWS_S3_ACCESS_KEY_ID,
+                                           aws_secret_access_key=AWS_S3_SECRET_ACCESS_KEY)
+        return artifact_store.S3ArtifactStore(s3, AWS_S3_MODEL_BUCKET_NAME)
+    return artifact_store.LocalArtifactStore(TRAINED_FILES_DIRECTORY)
+
+
+MODEL_REGISTRY = model_registry.ModelRegistry(
+    store=make_artifact_store(), legacy_loader=lambda store, metrics: load_all_pickle_files(store, metrics),
+    load_concurrency=ARTIFACT_LOAD_CONCURRENCY, memory_budget_bytes=int(MODEL_MEMORY_BUDGET_MB * 1024 * 1024),
+    pinned_tickers=MODEL_PINNED_TICKERS)
+
+# TRAINING - ml.execute runs in a separate worker process every TRAINING_INTERVAL_MINUTES, limited to
+# TRAINING_WORKER_CPUS CPUs (empty = all) and TRAINING_WORKER_BLAS_THREADS BLAS threads, niced by TRAINING_WORKER_NICE.
+TRAINING_INTERVAL_MINUTES = int(os.getenv('TRAINING_INTERVAL_MINUTES', '1'))
+TRAINING_WORKER = training_worker.TrainingWorker(cpus=int(os.getenv('TRAINING_WORKER_CPUS') or 0) or None,
+                                                 blas_threads=int(os.getenv('TRAINING_WORKER_BLAS_THREADS', '1')),
+                                                 nice=int(os.getenv('TRAINING_WORKER_NICE', '10')),
+                                                 on_complete=lambda timings: record_training_timings(timings))
+
+# SERVING WORKERS - with uvicorn --workers N, only the worker holding SCHEDULER_LOCK_FILE (the leader) runs the jobs
+# writing shared files: training and the price store conversion. Every worker polls for new generations and maps the
+# same coefficient bundles, whose pages are shared between them.
+SCHEDULER_LOCK_FILE = os.getenv('SCHEDULER_LOCK_FILE', PARENT_DIRECTORY_PATH + '/.scheduler.lock')
+SCHEDULER_LEADER = leader_election.FileLeaderLock(SCHEDULER_LOCK_FILE)
+PRICE_STORE_CONVERSION = None  # Thread converting the price store, started by the leader on startup
+
+# MICRO-BATCHING - live and backtest predictions arriving within MICRO_BATCH_WINDOW_MS of each other (0 = disabled),
+# up to MICRO_BATCH_MAX_SIZE, are predicted together in one sklearn pipeline pass per ticker. Only models that are not
+# linear are batched, fused linear models are always predicted directly, see benchmark/README.md
+MICRO_BATCH_WINDOW_MS = float(os.getenv('MICRO_BATCH_WINDOW_MS', '0'))
+MICRO_BATCH_MAX_SIZE = int(os.getenv('MICRO_BATCH_MAX_SIZE', '64'))
+PREDICTION_BATCHER = None  # MicroBatcher of (model_set, ticker_dto, x_values) requests, created on startup
+
+# PREDICTION CACHE - live predictions are cached per (ticker, prices version, model generation), so the requests for a
+# ticker within one bar read its prices and predict once. Up to PREDICTION_CACHE_SIZE tickers, 0 = disabled.
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '10000'))
+PREDICTION_CACHE = prediction_cache.PredictionCache(PREDICTION_CACHE_SIZE) if PREDICTION_CACHE_SIZE > 0 else None
+
+# BACKTEST SESSIONS - up to BACKTEST_SESSION_MAX sessions open at once (0 = disabled), each closed after
+# BACKTEST_SESSION_TTL_SECONDS without a step. A session is held in memory by the worker that opened it, so sessions are
+# disabled when SERVING_WORKERS, uvicorn's number of worker processes (WEB_CONCURRENCY, default 1), is more than 1
+SERVING_WORKERS = int(os.getenv('WEB_CONCURRENCY', '1'))
+BACKTEST_SESSION_MAX = int(os.getenv('BACKTEST_SESSION_MAX', '1000'))
+BACKTEST_SESSION_TTL_SECONDS = float(os.getenv('BACKTEST_SESSION_TTL_SECONDS', '900'))
+BACKTEST_SESSIONS = backtest_sessions.for_serving_workers(SERVING_WORKERS, BACKTEST_SESSION_MAX,
+                                                          BACKTEST_SESSION_TTL_SECONDS)
 
 '''
 MODELS
@@ -58,6 +150,24 @@ class HealthDTO(BaseModel):
     cloud_model_storage_name_status: str
     cloud_data_provider_api_key_status: str
     models_loaded_for_prediction_and_backtesting: List[str]
+    model_generation: Optional[str]
+    model_load_seconds: Optional[float]
+    worker_pid: int
+    scheduler_leader: bool
+
+
+class TrainingStatusDTO(BaseModel):
+    state: str
+    stage: Optional[str]
+    pending: bool
+    runs_started: int
+    runs_completed: int
+    runs_failed: int
+    runs_coalesced: int
+    last_started_at: Optional[float]
+    last_finished_at: Optional[float]
+    last_duration_seconds: Optional[float]
+    last_error: Optional[str]
 
 
 class TickerDTO(BaseModel):
@@ -71,6 +181,48 @@ class PredictionDTO(BaseModel):
     predictions: List[Decimal]
 
 
+# PredictionDTO of one ticker in a batch. error is set instead of predictions when that ticker failed.
+class BatchPredictionDTO(PredictionDTO):
+    error: Optional[str] = None
+
+
+# Full price history for a backtest. Each step is one simulated bar, i.e. the window prices[step:step + windowSize]
+# that BackTestingStrategy would otherwise send to /api/v1/predict/ticker/backtest on its own.
+class BacktestHistoryDTO(BaseModel):
+    tickerDTO: TickerDTO
+    prices: List[Decimal]
+    windowSize: int = 2 * FEATURE_COUNT - 1
+    steps: Optional[List[int]] = None
+
+
+class BacktestStepsDTO(BaseModel):
+    tickerDTO: TickerDTO
+    steps: List[int]
+    predictions: List[List[Decimal]]
+
+
+# First window of a backtest session, i.e. the prices BackTestingStrategy would send to /api/v1/predict/ticker/backtest
+# for its first simulated bar. Every step keeps the window's size.
+class BacktestSessionDTO(BaseModel):
+    tickerDTO: TickerDTO
+    prices: List[Decimal]
+
+
+# Price of the next simulated bar of a backtest session
+class BacktestSessionStepDTO(BaseModel):
+    sessionId: str
+    price: Decimal
+
+
+# Forecast vector of a backtest session's step, step 0 being the first window. error is set instead of predictions
+# when the step failed, e.g. when the session expired (tickerDTO is then unknown).
+class BacktestSessionPredictionDTO(PredictionDTO):
+    tickerDTO: Optional[TickerDTO]
+    sessionId: Optional[str]
+    step: int
+    error: Optional[str] = None
+
+
 '''
 API
 '''
@@ -82,16 +234,43 @@ def redirect_to_documentation():
 
 
 @app.get("/api/v1/health")
-def get() -> Type[HealthDTO]:
-    HealthDTO(
-        cloud_access_key_id_status="Loaded" if len(AWS_S3_ACCESS_KEY_ID) > 0 else "Not found.",
-        cloud_secret_access_key_status="Loaded" if len(AWS_S3_SECRET_ACCESS_KEY) > 0 else "Not found.",
-        cloud_prediction_storage_name_status="Loaded" if len(AWS_S3_PREDICTION_BUCKET_NAME) > 0 else "Not found.",
-        cloud_model_storage_name_status="Loaded" if len(AWS_S3_MODEL_BUCKET_NAME) > 0 else "Not found.",
-        cloud_data_provider_api_key_status="Loaded" if len(POLYGON_API_KEY) > 0 else "Not found.",
-        models_loaded_for_prediction_and_backtesting=list(LOADED_MODELS)
+def get() -> HealthDTO:
+    model_set = MODEL_REGISTRY.active
+    return HealthDTO(
+        cloud_access_key_id_status="Loaded" if AWS_S3_ACCESS_KEY_ID else "Not found.",
+        cloud_secret_access_key_status="Loaded" if AWS_S3_SECRET_ACCESS_KEY else "Not found.",
+        cloud_prediction_storage_name_status="Loaded" if AWS_S3_PREDICTION_BUCKET_NAME else "Not found.",
+        cloud_model_storage_name_status="Loaded" if AWS_S3_MODEL_BUCKET_NAME else "Not found.",
+        cloud_data_provider_api_key_status="Loaded" if POLYGON_API_KEY else "Not found.",
+        models_loaded_for_prediction_and_backtesting=list(model_set.models),
+        model_generation=model_set.generation,
+        model_load_seconds=MODEL_REGISTRY.load_metrics.total_seconds if MODEL_REGISTRY.load_metrics else None,
+        worker_pid=os.getpid(),
+        scheduler_leader=SCHEDULER_LEADER.is_leader
     )
-    return HealthDTO
+
+
+# Load times of the active generation's trained files: total and per artifact (read and unpickle), and the state of
+# the model cache
+@app.get("/api/v1/models/load_metrics")
+def get_model_load_metrics() -> dict:
+    load_metrics = MODEL_REGISTRY.load_metrics
+    summary = load_metrics.summary() if load_metrics else artifact_store.LoadMetrics().summary()
+    return {'generation': MODEL_REGISTRY.active.generation, 'store': repr(MODEL_REGISTRY.store), **summary,
+            'cache': MODEL_REGISTRY.cache.stats()}
+
+
+# Serving and training metrics of this worker in the Prometheus text format, see service/metrics.py
+@app.get("/api/v1/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+
+# Progress of the ML pipeline's training worker process. With several serving workers, only the scheduler leader's
+# status reflects the scheduled runs.
+@app.get("/api/v1/training/status")
+def get_training_status() -> TrainingStatusDTO:
+    return TrainingStatusDTO(**TRAINING_WORKER.status())
 
 
 # Accepts Backend's PredictionDTO in RequestBody
@@ -99,9 +278,10 @@ def get() -> Type[HealthDTO]:
 @app.post("/api/v1/predict/ticker/backtest")
 def by_prediction_dto_backtest(prediction_dto: PredictionDTO) -> PredictionDTO:
     predictions = []
+    model_set = MODEL_REGISTRY.active
     try:
         # Exception handling
-        if len(list(LOADED_MODELS)) == 0:
+        if len(model_set.models) == 0:
             raise EOFError(f"No models ready. Please try api `load_all_pickle_models`.")
         if prediction_dto.tickerDTO.tickerName is None or prediction_dto.predictions is None:
             raise IOError(f"tickerDTO.tickerName or predictions attributes cannot be null")
@@ -111,45 +291,175 @@ def by_prediction_dto_backtest(prediction_dto: PredictionDTO) -> PredictionDTO:
             prediction_dto.tickerDTO.tickerName = prediction_dto.tickerDTO.tickerName.replace("X:", "X_")
 
         # Prediction logic
-        x_values = add_lagged_features(df_x_values=pd.DataFrame(prediction_dto.predictions, columns=[FEATURE]),
-                                       future_window=FEATURE_COUNT)
-        predictions = predictions_from_x_values(ticker_dto=prediction_dto.tickerDTO,
-                                                x_values=x_values)
+        with metrics.STAGE_SECONDS.time('lag_features'):
+            x_values = lag_features.lag_matrix(prediction_dto.predictions, FEATURE_COUNT)
+        predictions = batched_predictions_from_x_values(ticker_dto=prediction_dto.tickerDTO,
+                                                        x_values=x_values,
+                                                        model_set=model_set)
     except Exception as err:
+        metrics.PREDICTION_ERRORS.inc('/api/v1/predict/ticker/backtest')
         logger.error(f"Exception occurred at backtest predictions for {prediction_dto.tickerDTO.tickerName}: {err}")
-    return PredictionDTO(tickerDTO=prediction_dto.tickerDTO,
-                         predictions=predictions)
+    return wire_format.dto(PredictionDTO,
+                           tickerDTO=prediction_dto.tickerDTO,
+                           predictions=predictions)
+
+
+# Accepts the whole price history once and returns every step's forecast vector in one response.
+# Note: windowSize must be >= FEATURE_COUNT, and prices must hold at least one window.
+@app.post("/api/v1/predict/ticker/backtest/rolling")
+def by_backtest_history_dto_rolling(backtest_history_dto: BacktestHistoryDTO) -> BacktestStepsDTO:
+    steps = []
+    predictions = []
+    model_set = MODEL_REGISTRY.active
+    try:
+        ticker_dto = backtest_history_dto.tickerDTO
+        window_size = backtest_history_dto.windowSize
+        # Exception handling
+        if len(model_set.models) == 0:
+            raise EOFError(f"No models ready. Please try api `load_all_pickle_models`.")
+        if window_size < FEATURE_COUNT:
+            raise IOError(f"windowSize must be at least {FEATURE_COUNT}")
+        if len(backtest_history_dto.prices) < window_size:
+            raise IOError(f"Please input at least windowSize ({window_size}) prices datapoints")
+        if ticker_dto.tickerName.startswith("X:"):
+            ticker_dto.tickerName = ticker_dto.tickerName.replace("X:", "X_")
+        if ticker_dto.tickerName not in model_set.models:
+            raise FileNotFoundError(f"{ticker_dto.tickerName} not in available models: {list(model_set.models)}")
+
+        # Prediction logic
+        steps, step_predictions = rolling_predictions_from_prices(ticker_dto=ticker_dto,
+                                                                  prices=backtest_history_dto.prices,
+                                                                  window_size=window_size,
+                                                                  steps=backtest_history_dto.steps,
+                                                                  model_set=model_set)
+        predictions = step_predictions
+    except Exception as err:
+        steps = []
+        metrics.PREDICTION_ERRORS.inc('/api/v1/predict/ticker/backtest/rolling')
+        logger.error(f"Exception occurred at rolling backtest predictions for "
+                     f"{backtest_history_dto.tickerDTO.tickerName}: {err}")
+    return wire_format.dto(BacktestStepsDTO,
+                           tickerDTO=backtest_history_dto.tickerDTO,
+                           steps=steps,
+                           predictions=predictions)
+
+
+# Opens a backtest session with its first window and returns that window's forecast vector, as step 0.
+# Note: prices must hold at least FEATURE_COUNT datapoints.
+@app.post("/api/v1/predict/ticker/backtest/sessions")
+def by_backtest_session_dto_open(backtest_session_dto: BacktestSessionDTO) -> BacktestSessionPredictionDTO:
+    session_id = None
+    predictions = []
+    error = None
+    model_set = MODEL_REGISTRY.active
+    try:
+        ticker_dto = backtest_session_dto.tickerDTO
+        # Exception handling
+        enabled_backtest_sessions()
+        if len(backtest_session_dto.prices) < FEATURE_COUNT:
+            raise IOError(f"Please input more than {FEATURE_COUNT} prices datapoints")
+        if ticker_dto.tickerName.startswith("X:"):
+            ticker_dto.tickerName = ticker_dto.tickerName.replace("X:", "X_")
+        if ticker_dto.tickerName not in model_set.models:
+            raise FileNotFoundError(f"{ticker_dto.tickerName} not in available models: {list(model_set.models)}")
+
+        # Prediction logic
+        with metrics.STAGE_SECONDS.time('load_model'):
+            session_model_set = model_set.resident([ticker_dto.tickerName])
+        prices = np.asarray(backtest_session_dto.prices, dtype=np.float64)
+        with metrics.STAGE_SECONDS.time('lag_features'):
+            x_values = lag_features.lag_matrix(prices, FEATURE_COUNT)
+        predictions = batched_predictions_from_x_values(ticker_dto, x_values, session_model_set)
+        session_id = BACKTEST_SESSIONS.open(backtest_sessions.BacktestSession(ticker_dto, session_model_set, prices,
+                                                                              predictions, FEATURE_COUNT))
+    except Exception as err:
+        predictions = []
+        error = str(err)
+        metrics.PREDICTION_ERRORS.inc('/api/v1/predict/ticker/backtest/sessions')
+        logger.error(f"Exception occurred at opening a backtest session for "
+                     f"{backtest_session_dto.tickerDTO.tickerName}: {err}")
+    return wire_format.dto(BacktestSessionPredictionDTO,
+                           tickerDTO=backtest_session_dto.tickerDTO,
+                           predictions=predictions,
+                           sessionId=session_id,
+                           step=0,
+                           error=error)
+
+
+# Appends one price to a backtest session and returns the forecast vector of its window ending with that price, i.e.
+# the /api/v1/predict/ticker/backtest response for that window. Only the new lag row is predicted.
+@app.post("/api/v1/predict/ticker/backtest/sessions/step")
+def by_backtest_session_step_dto_step(step_dto: BacktestSessionStepDTO) -> BacktestSessionPredictionDTO:
+    ticker_dto = None
+    step = 0
+    predictions = []
+    error = None
+    try:
+        session = enabled_backtest_sessions().get(step_dto.sessionId)
+        ticker_dto = session.ticker_dto
+        step, predictions = backtest_session_step(step_dto.sessionId, session, float(step_dto.price))
+    except Exception as err:
+        predictions = []
+        error = str(err)
+        metrics.PREDICTION_ERRORS.inc('/api/v1/predict/ticker/backtest/sessions/step')
+        logger.error(f"Exception occurred at backtest session {step_dto.sessionId}: {err}")
+    return wire_format.dto(BacktestSessionPredictionDTO,
+                           tickerDTO=ticker_dto,
+                           predictions=predictions,
+                           sessionId=step_dto.sessionId,
+                           step=step,
+                           error=error)
+
+
+# Closes a backtest session before it expires. Returns whether it was open.
+@app.delete("/api/v1/predict/ticker/backtest/sessions/{session_id}")
+def close_backtest_session(session_id: str) -> dict:
+    return {'sessionId': session_id, 'closed': BACKTEST_SESSIONS is not None and BACKTEST_SESSIONS.close(session_id)}
 
 
 # Accepts Backend's TickerDTO in RequestBody
 @app.post("/api/v1/predict/ticker/live")
 def by_ticker_dto_live(ticker_dto: TickerDTO) -> PredictionDTO:
     predictions = []
+    model_set = MODEL_REGISTRY.active
     try:
         ticker_name = ticker_dto.tickerName.strip()
         # Exception handling
         if ticker_name is None or ticker_name == "":
             raise IOError(f"tickerName cannot be empty")
-        if ticker_name not in list(LOADED_MODELS):
-            raise FileNotFoundError(f"{ticker_name} not in available models: {list(LOADED_MODELS)}")
+        if ticker_name not in model_set.models:
+            raise FileNotFoundError(f"{ticker_name} not in available models: {list(model_set.models)}")
         if ticker_name.startswith("X:"):
             ticker_name = ticker_name.replace("X:", "X_")
 
         # Prediction logic
         logger.info('--Start prediction--')
         logger.info(f'--Predicting {ticker_name}--')
-        predictions = predictions_from_ticker_dto(ticker_dto)
+        predictions = predictions_from_ticker_dto(ticker_dto, model_set)
         logger.info('--Finish prediction--')
     except Exception as err:
+        metrics.PREDICTION_ERRORS.inc('/api/v1/predict/ticker/live')
         logger.error(f"Exception occurred at live predictions for {ticker_dto.tickerName}: {err}")
-    return PredictionDTO(tickerDTO=ticker_dto,
-                         predictions=predictions)
+    return wire_format.dto(PredictionDTO,
+                           tickerDTO=ticker_dto,
+                           predictions=predictions)
+
+
+# Accepts a list of Backend's TickerDTO in RequestBody, e.g. every ticker of a portfolio rebalance.
+# Errors are reported per ticker in BatchPredictionDTO.error, the rest of the batch is still predicted.
+@app.post("/api/v1/predict/ticker/live/batch")
+def by_ticker_dtos_live_batch(ticker_dtos: List[TickerDTO]) -> List[BatchPredictionDTO]:
+    logger.info(f'--Start batch prediction of {len(ticker_dtos)} tickers--')
+    batch_predictions = predictions_from_ticker_dtos(ticker_dtos, MODEL_REGISTRY.active)
+    logger.info('--Finish batch prediction--')
+    return batch_predictions
 
 
+# Reloads the current generation of trained files, e.g. after copying files into TRAINED_FILES_DIRECTORY by hand
 @app.get("/api/v1/dev/load_all_pickle_models")
-async def load_models() -> List[str]:
-    load_all_pickle_files(AWS_S3_MODEL_BUCKET_NAME, LOADED_MODELS)
-    return list(LOADED_MODELS)
+def load_models() -> List[str]:
+    MODEL_REGISTRY.refresh(force=True)
+    return list(MODEL_REGISTRY.active.models)
 
 # ##########################################
 # Note:
@@ -240,10 +550,8 @@ def get_latest_ticker_api_data(ticker_name):
     )
     # Create DataFrame from polygon api json response for data processing.
     df_raw = pd.DataFrame(data_request)
-    df_feature_flip = df_raw[[FEATURE]].iloc[::-1]
-    df_ready = add_lagged_features(df_feature_flip, FEATURE_COUNT)
-    arr_features = df_ready.iloc[-FEATURE_COUNT:].values
-    return arr_features
+    arr_features = lag_features.lag_matrix(df_raw[FEATURE].values[::-1], FEATURE_COUNT)
+    return arr_features[-FEATURE_COUNT:]
 '''
 # ##########################################
 
@@ -252,49 +560,58 @@ Helper functions (Google Drive Data Source + Local Storage)
 '''
 
 
-# Read and load models from Local Source to RAM
-def load_all_pickle_files(trained_files_directory, models_dict):
+# Read and load models from an artifact store (local directory or S3) to RAM.
+# Returns key: ticker, value: (model, x_scaler, y_scaler) of the unversioned model/, x_scaler/, y_scaler/ layout.
+# The model, x_scaler and y_scaler of every ticker are loaded concurrently, and their load times added to metrics.
+def load_all_pickle_files(store, metrics=None):
+    pipelines = {}
     try:
-        trained_models = utils.get_files_with_paths(trained_files_directory+'/model', ".pkl")
-        print(trained_models)
-        if len(trained_models) > 0:
-            # Extract the keys (filenames) and filter out non-.pkl files if needed
-            keys = list(trained_models.keys())
+        keys = [key.split("/")[1] for key in store.list('model/') if key.endswith('.pkl')]
+        if len(keys) > 0:
             logger.info(f'Trained models available: {keys}')
             # Load all models
             logger.info('--Start loading models--')
+            artifacts = artifact_store.load_artifacts(
+                store, [f'{directory}/{key}' for key in keys for directory in ('model', 'x_scaler', 'y_scaler')],
+                concurrency=ARTIFACT_LOAD_CONCURRENCY, metrics=metrics)
             for key in keys:
                 ticker_name = str(key).split(".")[0]
-                load_pickle_file(trained_files_directory, ticker_name, key, models_dict)
+                pipelines[ticker_name] = (artifacts[f'model/{key}'], artifacts[f'x_scaler/{key}'],
+                                          artifacts[f'y_scaler/{key}'])
             logger.info('--Finish loading models--')
 
         else:
             print("No objects found in the bucket.")
 
     except Exception as e:
-        print(f"Failed to retrieve objects from the source: {trained_files_directory}")
+        print(f"Failed to retrieve objects from the source {store!r}: {e}")
+    return pipelines
 
 
-# loads fr
-def load_pickle_file(trained_model_path, ticker_name, key, models_dict):
-    with open(f'{trained_model_path}/model/{key}', 'rb') as f:
-        models_dict[ticker_name] = pickle.load(f)
-    logger.info(f'Model: {type(models_dict[ticker_name])}')
-    logger.info(f'Loaded {key} model. Ticker name: {ticker_name}')
+# Read and load prices jsons from local storage
+def get_latest_ticker_api_data(ticker_name):
+    prices = get_latest_ticker_prices(ticker_name)
+    with metrics.STAGE_SECONDS.time('lag_features'):
+        arr_features = lag_features.lag_matrix(prices, FEATURE_COUNT)
+    return arr_features[-FEATURE_COUNT:]
 
-    # Load x_scaler from s3 to in-memory dictionary
-    with open(f'{trained_model_path}/x_scaler/{key}', 'rb') as f:
-        LOADED_X_SCALERS[ticker_name] = pickle.load(f)
-    logger.info(f'Loaded {key} x_scaler')
 
-    # Load y_scaler from s3 to in-memory dictionary
-    with open(f'{trained_model_path}/y_scaler/{key}', 'rb') as f:
-        LOADED_Y_SCALERS[ticker_name] = pickle.load(f)
-    logger.info(f'Loaded {key} y_scaler')
+# Latest prices needed for FEATURE_COUNT rows of lagged features, i.e. 2 * FEATURE_COUNT - 1 datapoints, oldest first.
+# Decompresses only the newest bar segments when ingestion appends them, otherwise reads only the tail of the
+# memory-mapped FEATURE column when the ticker is in the columnar price store.
+def get_latest_ticker_prices(ticker_name):
+    with metrics.STAGE_SECONDS.time('read_prices'):
+        return read_latest_ticker_prices(ticker_name)
 
 
-# Read and load prices jsons from local storage
-def get_latest_ticker_api_data(ticker_name):
+def read_latest_ticker_prices(ticker_name):
+    if bar_segments.has_ticker(BAR_SEGMENTS_DIRECTORY, ticker_name):
+        bars = bar_segments.read_bars(bar_segments.LocalSegmentStore(BAR_SEGMENTS_DIRECTORY), ticker_name,
+                                      2 * FEATURE_COUNT - 1)
+        return bars[FEATURE].values
+    if price_store.has_ticker(PRICE_STORE_DIRECTORY, ticker_name):
+        return price_store.read_column_tail(PRICE_STORE_DIRECTORY, ticker_name, FEATURE, 2 * FEATURE_COUNT - 1)
+
     # Create DataFrame from simulated json response file for data processing.
     with open(f'{DATA_DIRECTORY}/{ticker_name}.json', 'r') as file:
         data_dict = json.load(file)
@@ -302,51 +619,320 @@ def get_latest_ticker_api_data(ticker_name):
     df_raw = pd.DataFrame(data=data_dict['data'],
                           columns=data_dict['columns'],
                           index=data_dict['index'])
-    df_feature_flip = df_raw[[FEATURE]].iloc[::-1]
-    df_ready = add_lagged_features(df_feature_flip, FEATURE_COUNT)
-    arr_features = df_ready.iloc[-FEATURE_COUNT:].values
-    return arr_features
-
-
-# Create lagged features for the past N periods (N = future_window)
-def add_lagged_features(df_x_values, future_window):
-    df = df_x_values.copy()
-    for lag_count in range(1, future_window):
-        df[f'lag_{FEATURE}_{lag_count}'] = df[FEATURE].shift(lag_count)
-    df.dropna(inplace=True)
-    return df
-
-
-def predictions_from_ticker_dto(ticker_dto):
-    x_values = get_latest_ticker_api_data(ticker_dto.tickerName)
-    return predictions_from_x_values(ticker_dto, np.array(x_values))
-
+    return df_raw[FEATURE].values[-(2 * FEATURE_COUNT - 1):]
+
+
+# Raises RuntimeError when backtest sessions are disabled
+def enabled_backtest_sessions():
+    if BACKTEST_SESSIONS is None:
+        raise RuntimeError(f'Backtest sessions are disabled (BACKTEST_SESSION_MAX {BACKTEST_SESSION_MAX}, '
+                           f'{SERVING_WORKERS} serving workers): they need a single serving worker, WEB_CONCURRENCY=1. '
+                           f'Please use /api/v1/predict/ticker/backtest')
+    return BACKTEST_SESSIONS
+
+
+# Predicts the lag row of the session's next price. Returns (step, forecast vector of the step). A session whose step
+# failed halfway is closed, its prices and predictions no longer being of the same window.
+def backtest_session_step(session_id, session, price):
+    with session.lock:
+        x_values = session.append(price)[np.newaxis]
+        try:
+            prediction = batched_predictions_from_x_values(session.ticker_dto, x_values, session.model_set)[0]
+        except Exception:
+            BACKTEST_SESSIONS.close(session_id)
+            raise
+        return session.steps, session.record(prediction)
+
+
+# Every backtest window shares its lag rows with its neighbours, so each lag row of the full history is predicted
+# exactly once and the per-step forecast vectors are sliced out of that single prediction array.
+def rolling_predictions_from_prices(ticker_dto, prices, window_size, steps=None, model_set=None):
+    with metrics.STAGE_SECONDS.time('lag_features'):
+        x_values = lag_features.lag_matrix(prices, FEATURE_COUNT)
+    row_predictions = np.asarray(predictions_from_x_values(ticker_dto, x_values, model_set))
+    step_predictions = np.lib.stride_tricks.sliding_window_view(row_predictions, window_size - FEATURE_COUNT + 1)
+    if steps is None:
+        steps = list(range(step_predictions.shape[0]))
+    elif any(step < 0 or step >= step_predictions.shape[0] for step in steps):
+        raise IOError(f"steps must be between 0 and {step_predictions.shape[0] - 1}")
+    return steps, step_predictions[steps]
+
+
+# Fingerprint of the file holding the ticker's newest prices, from the source read_latest_ticker_prices reads. Every new
+# bar is appended to that file or replaces it, so the fingerprint changes with the ticker's last bar without reading it.
+def latest_prices_version(ticker_name):
+    try:
+        segment_names = [name for name in os.listdir(f'{BAR_SEGMENTS_DIRECTORY}/{ticker_name}')
+                         if name.endswith(bar_segments.SEGMENT_SUFFIX)]
+    except FileNotFoundError:
+        segment_names = []
+    if segment_names:
+        path = f'{BAR_SEGMENTS_DIRECTORY}/{ticker_name}/{max(segment_names)}'
+        stat = os.stat(path)
+    else:
+        try:
+            path = f'{PRICE_STORE_DIRECTORY}/{ticker_name}/{price_store.HEADER_FILENAME}'
+            stat = os.stat(path)
+        except FileNotFoundError:
+            path = f'{DATA_DIRECTORY}/{ticker_name}.json'
+            stat = os.stat(path)
+    return path, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+# Live predictions of the ticker, from PREDICTION_CACHE when its prices and model_set did not change since they were
+# last predicted
+def predictions_from_ticker_dto(ticker_dto, model_set=None):
+    model_set = model_set or MODEL_REGISTRY.active
+    ticker_name = ticker_dto.tickerName
 
-# Pass parameters into models
-def predictions_from_x_values(ticker_dto, x_values):
+    def predict():
+        x_values = get_latest_ticker_api_data(ticker_name)
+        return batched_predictions_from_x_values(ticker_dto, np.array(x_values), model_set)
+
+    if PREDICTION_CACHE is None:
+        return predict()
+    with metrics.STAGE_SECONDS.time('prediction_cache'):
+        key = (ticker_name, latest_prices_version(ticker_name), model_set.generation, model_set.version)
+    return list(PREDICTION_CACHE.get(key, predict))
+
+
+# Predicts a batch of tickers. Fused linear pipelines are predicted together in one stacked NumPy pass, any other model
+# falls back to predictions_from_x_values. Returns one BatchPredictionDTO per TickerDTO, in request order.
+def predictions_from_ticker_dtos(ticker_dtos, model_set=None):
+    model_set = model_set or MODEL_REGISTRY.active
+    predictions = [[] for _ in ticker_dtos]
+    errors = [None for _ in ticker_dtos]
+    stacked_indices = []
+    stacked_prices = []
+    stacked_fused_predictors = []
+
+    for index, ticker_dto in enumerate(ticker_dtos):
+        try:
+            # Exception handling
+            if ticker_dto.tickerName is None or ticker_dto.tickerName.strip() == "":
+                raise IOError(f"tickerName cannot be empty")
+            ticker_dto.tickerName = ticker_dto.tickerName.strip().replace("X:", "X_")
+            ticker_name = ticker_dto.tickerName
+            if ticker_name not in model_set.models:
+                raise FileNotFoundError(f"{ticker_name} not in available models: {list(model_set.models)}")
+            prices = get_latest_ticker_prices(ticker_name)
+            if len(prices) < 2 * FEATURE_COUNT - 1:
+                raise IOError(f"{ticker_name} has {len(prices)} datapoints, {2 * FEATURE_COUNT - 1} are required")
+
+            if ticker_name not in model_set.fused_predictors:
+                with metrics.STAGE_SECONDS.time('lag_features'):
+                    x_values = lag_features.lag_matrix(prices, FEATURE_COUNT)
+                predictions[index] = predictions_from_x_values(ticker_dto, x_values, model_set)
+            else:
+                stacked_indices.append(index)
+                stacked_prices.append(prices)
+                stacked_fused_predictors.append(model_set.fused_predictors[ticker_name])
+        except Exception as err:
+            errors[index] = str(err)
+            metrics.PREDICTION_ERRORS.inc('/api/v1/predict/ticker/live/batch')
+            logger.error(f"Exception occurred at batch live predictions for {ticker_dto.tickerName}: {err}")
+
+    if len(stacked_indices) > 0:
+        try:
+            # (tickers, rows, FEATURE_COUNT) lag tensor of all linear pipelines
+            with metrics.STAGE_SECONDS.time('lag_features'):
+                x_values = lag_features.lag_matrix(np.stack(stacked_prices), FEATURE_COUNT)
+            with metrics.STAGE_SECONDS.time('stacked_predict'):
+                y_pred = stacked_predictor.predict_stacked(x_values, stacked_fused_predictors)
+            for row, index in enumerate(stacked_indices):
+                predictions[index] = y_pred[row]
+        except Exception as err:
+            metrics.PREDICTION_ERRORS.inc('/api/v1/predict/ticker/live/batch', amount=len(stacked_indices))
+            logger.error(f"Exception occurred at stacked batch live predictions: {err}")
+            for index in stacked_indices:
+                errors[index] = str(err)
+
+    return [wire_format.dto(BatchPredictionDTO, tickerDTO=ticker_dto, predictions=predictions[index],
+                            error=errors[index])
+            for index, ticker_dto in enumerate(ticker_dtos)]
+
+
+# Pass parameters into models. 'load_model' is the time to get the ticker's pipeline, loaded on a cache miss.
+def predictions_from_x_values(ticker_dto, x_values, model_set=None):
+    model_set = model_set or MODEL_REGISTRY.active
     ticker_name = ticker_dto.tickerName
-    model = LOADED_MODELS[ticker_name]
-    scaled_x_values = LOADED_X_SCALERS[ticker_name].transform(x_values)
-    y_pred = model.predict(np.array(scaled_x_values))
-    inverse_scaled_y_pred = LOADED_Y_SCALERS[ticker_name].inverse_transform(y_pred.reshape(-1, 1)).flatten()
+    with metrics.STAGE_SECONDS.time('load_model'):
+        fused_predictor = model_set.fused_predictor(ticker_name)
+        pipeline = model_set.pipeline(ticker_name) if fused_predictor is None else None
+    if fused_predictor is not None:
+        with metrics.STAGE_SECONDS.time('fused_predict'):
+            return list(fused_predictor.predict(x_values))
+    with metrics.STAGE_SECONDS.time('scale'):
+        scaled_x_values = pipeline.x_scaler.transform(x_values)
+    with metrics.STAGE_SECONDS.time('predict'):
+        y_pred = pipeline.model.predict(np.array(scaled_x_values))
+    with metrics.STAGE_SECONDS.time('inverse_scale'):
+        inverse_scaled_y_pred = pipeline.y_scaler.inverse_transform(y_pred.reshape(-1, 1)).flatten()
     return list(inverse_scaled_y_pred)
 
 
+# predictions_from_x_values, micro-batched with the other requests in flight when PREDICTION_BATCHER is running.
+# Fused linear pipelines predict in microseconds, less than any batching window, so they are never batched: the batcher
+# only ever sees models that are not linear.
+def batched_predictions_from_x_values(ticker_dto, x_values, model_set=None):
+    model_set = model_set or MODEL_REGISTRY.active
+    if PREDICTION_BATCHER is None or ticker_dto.tickerName in model_set.fused_predictors:
+        return predictions_from_x_values(ticker_dto, x_values, model_set)
+    return PREDICTION_BATCHER.submit((model_set, ticker_dto, x_values)).result()
+
+
+# Predicts a micro-batch of (model_set, ticker_dto, x_values) requests, in one sklearn pipeline pass per ticker over
+# the concatenated rows of its requests. Returns one prediction list per request, in order, or the exception of a
+# failed request.
+def predictions_from_requests(requests):
+    results = [None for _ in requests]
+    pipeline_groups = {}  # key: (model set, ticker), value: [(index, x_values)]
+    for index, (model_set, ticker_dto, x_values) in enumerate(requests):
+        pipeline_groups.setdefault((id(model_set), ticker_dto.tickerName), []).append(
+            (index, np.asarray(x_values, dtype=np.float64)))
+
+    for group in pipeline_groups.values():
+        model_set, ticker_dto, _ = requests[group[0][0]]
+        try:
+            y_pred = predictions_from_x_values(ticker_dto, np.concatenate([x_values for _, x_values in group]),
+                                               model_set)
+            boundaries = np.cumsum([len(x_values) for _, x_values in group])[:-1]
+            for (index, _), ticker_predictions in zip(group, np.split(np.asarray(y_pred), boundaries)):
+                results[index] = list(ticker_predictions)
+        except Exception as err:
+            for index, _ in group:
+                results[index] = err
+    return results
+
+
 '''
 MAIN
 '''
 
 
+# TRAINING_WORKER's on_complete: records the stage and ticker timings returned by ml.execute
+def record_training_timings(timings):
+    if not timings:
+        return
+    for stage, seconds in timings['stage_seconds'].items():
+        metrics.TRAINING_STAGE_SECONDS.observe(seconds, stage)
+    metrics.TRAINING_TICKER_SECONDS.clear()
+    for ticker, seconds in timings['ticker_seconds'].items():
+        metrics.TRAINING_TICKER_SECONDS.set(seconds, ticker)
+
+
+# Models, model cache, micro-batching and training worker state, read on each scrape of /api/v1/metrics
+@metrics.REGISTRY.collector
+def collect_serving_state():
+    model_set = MODEL_REGISTRY.active
+    load_metrics = MODEL_REGISTRY.load_metrics or artifact_store.LoadMetrics()
+    cache = MODEL_REGISTRY.cache.stats()
+    training = TRAINING_WORKER.status()
+    families = [
+        ('price_predictor_model_generation_info', 'gauge', 'Active generation of trained files.',
+         [({'generation': model_set.generation or ''}, 1)]),
+        ('price_predictor_models', 'gauge', 'Tickers with trained files in the active generation.',
+         [({}, len(model_set.tickers))]),
+        ('price_predictor_model_load_seconds', 'gauge',
+         'Time to activate the generation: its index, coefficient bundle and pinned bundles.',
+         [({}, load_metrics.total_seconds)]),
+        ('price_predictor_model_artifacts_loaded', 'gauge', 'Artifacts of the generation loaded so far.',
+         [({}, len(load_metrics.artifact_seconds))]),
+        ('price_predictor_model_loaded_bytes', 'gauge', 'Bytes of the generation\'s artifacts loaded so far.',
+         [({}, load_metrics.bytes_loaded)]),
+        ('price_predictor_model_cache_requests_total', 'counter', 'Model cache lookups, by result.',
+         [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])]),
+        ('price_predictor_model_cache_evictions_total', 'counter', 'Bundles evicted from the model cache.',
+         [({}, cache['evictions'])]),
+        ('price_predictor_model_cache_resident_bytes', 'gauge', 'Bytes of the bundles in the model cache.',
+         [({}, cache['resident_bytes'])]),
+        ('price_predictor_model_cache_budget_bytes', 'gauge', 'Memory budget of the model cache, 0 = unlimited.',
+         [({}, cache['memory_budget_bytes'])]),
+        ('price_predictor_training_runs_total', 'counter', 'ML pipeline runs of this worker, by outcome.',
+         [({'outcome': outcome}, training[f'runs_{outcome}']) for outcome in ('started', 'completed', 'failed')]),
+        ('price_predictor_training_running', 'gauge', 'Whether an ML pipeline run is in progress.',
+         [({}, int(training['state'] == 'running'))]),
+        ('price_predictor_scheduler_leader', 'gauge', 'Whether this worker runs the scheduled jobs.',
+         [({}, int(SCHEDULER_LEADER.is_leader))]),
+    ]
+    if PREDICTION_BATCHER is not None:
+        batching = PREDICTION_BATCHER.stats()
+        families.append(('price_predictor_micro_batches_total', 'counter', 'Micro-batches of predictions.',
+                         [({}, batching['batches'])]))
+        families.append(('price_predictor_micro_batched_predictions_total', 'counter',
+                         'Predictions made in micro-batches.', [({}, batching['items'])]))
+    if PREDICTION_CACHE is not None:
+        predictions = PREDICTION_CACHE.stats()
+        families.append(('price_predictor_prediction_cache_requests_total', 'counter',
+                         'Prediction cache lookups, by result.',
+                         [({'result': 'hit'}, predictions['hits']), ({'result': 'miss'}, predictions['misses'])]))
+        families.append(('price_predictor_prediction_cache_evictions_total', 'counter',
+                         'Predictions evicted from the prediction cache.', [({}, predictions['evictions'])]))
+        families.append(('price_predictor_prediction_cache_entries', 'gauge', 'Predictions in the prediction cache.',
+                         [({}, predictions['entries'])]))
+    if BACKTEST_SESSIONS is not None:
+        sessions = BACKTEST_SESSIONS.stats()
+        families.append(('price_predictor_backtest_sessions', 'gauge', 'Open backtest sessions.',
+                         [({}, sessions['open'])]))
+        families.append(('price_predictor_backtest_sessions_total', 'counter', 'Backtest sessions, by outcome.',
+                         [({'outcome': outcome}, sessions[outcome]) for outcome in ('opened', 'closed', 'expired',
+                                                                                    'refused')]))
+    return families
+
+
+# Converts the JSON prices into the price store in the background, so the leader serves while converting. Tickers not
+# converted yet are served from their JSON file: a ticker is only in the store once completely written.
+def convert_price_store():
+    try:
+        logger.info(f'Price store converted: {price_store.convert_directory(DATA_DIRECTORY, PRICE_STORE_DIRECTORY)}')
+    except Exception as err:
+        logger.error(f'Failed to convert the price store: {err}')
+
+
+# Scheduled in every serving worker, triggers training in the scheduler leader only. When the leader exits, the next
+# worker to run this takes over. Returns True if training was triggered. Training waits for the startup conversion,
+# as the ML pipeline converts the same price store.
+def trigger_training():
+    if not SCHEDULER_LEADER.try_acquire():
+        return False
+    if PRICE_STORE_CONVERSION is not None and PRICE_STORE_CONVERSION.is_alive():
+        return False
+    TRAINING_WORKER.trigger()
+    return True
+
+
 @app.on_event("startup")
 def startup_event():
-    # Load files
-    load_all_pickle_files(TRAINED_FILES_DIRECTORY, LOADED_MODELS)
+    global PREDICTION_BATCHER, PRICE_STORE_CONVERSION
+    if MICRO_BATCH_WINDOW_MS > 0 and PREDICTION_BATCHER is None:
+        PREDICTION_BATCHER = micro_batcher.MicroBatcher(predictions_from_requests, MICRO_BATCH_WINDOW_MS / 1000,
+                                                        MICRO_BATCH_MAX_SIZE)
+    # Load the index of trained files (and the pinned tickers' bundles), the rest is loaded on demand
+    MODEL_REGISTRY.refresh()
+    if SCHEDULER_LEADER.try_acquire():
+        PRICE_STORE_CONVERSION = threading.Thread(target=convert_price_store, daemon=True,
+                                                  name='price-store-conversion')
+        PRICE_STORE_CONVERSION.start()
 
     # Scheduler to periodically download source data & execute machine learning
     scheduler = BackgroundScheduler(logger=logger)
     # scheduler.add_job(get_data.main(), 'interval', hours=1)
-    scheduler.add_job(ml.execute, 'interval', minutes=1)
+    # Runs never overlap: the worker coalesces triggers that arrive during a run into one follow-up run
+    scheduler.add_job(trigger_training, 'interval', minutes=TRAINING_INTERVAL_MINUTES,
+                      max_instances=1, coalesce=True)
+    # Pick up the generations published by ml.execute, in every serving worker
+    scheduler.add_job(MODEL_REGISTRY.poll, 'interval', seconds=MODEL_RELOAD_SECONDS)
     try:
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):
         pass
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    global PREDICTION_BATCHER
+    if PREDICTION_BATCHER is not None:
+        PREDICTION_BATCHER.close()
+        PREDICTION_BATCHER = None
+    TRAINING_WORKER.shutdown()
+    SCHEDULER_LEADER.release()
@@ -0,0 +1,132 @@
+"""Stores of trained files (artifacts), read by the serving API's ModelRegistry.
+
+- LocalArtifactStore: a directory, e.g. TRAINED_FILES_DIRECTORY.
+- S3ArtifactStore: a bucket (and key prefix) of S3 or any S3-compatible store, e.g. a local stand-in.
+
+Keys are '/' separated paths relative to the store, e.g. 'generations/CURRENT' or 'model/AAPL.pkl'.
+load_artifacts reads and parses many artifacts on a thread pool. The work is I/O bound, and one boto3 client is
+thread safe, so all threads share the store's client and its pool of kept-alive connections.
+"""
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+import numpy as np
+
+
+# S3 client whose connection pool holds one kept-alive connection per loading thread
+def make_s3_client(endpoint_url=None, max_pool_connections=10, **kwargs):
+    config = Config(max_pool_connections=max_pool_connections, retries={'max_attempts': 3, 'mode': 'standard'},
+                    s3={'addressing_style': 'path'} if endpoint_url else None)
+    return boto3.client('s3', endpoint_url=endpoint_url, config=config, **kwargs)
+
+
+class LocalArtifactStore:
+    def __init__(self, root):
+        self.root = root
+
+    def __repr__(self):
+        return f'LocalArtifactStore({self.root!r})'
+
+    # Keys starting with prefix, sorted
+    def list(self, prefix=''):
+        directory = os.path.join(self.root, os.path.dirname(prefix))
+        if not os.path.isdir(directory):
+            return []
+        keys = []
+        for parent, _, filenames in os.walk(directory):
+            relative_parent = os.path.relpath(parent, self.root).replace(os.sep, '/')
+            keys.extend(name if relative_parent == '.' else f'{relative_parent}/{name}' for name in filenames)
+        return sorted(key for key in keys if key.startswith(prefix))
+
+    # Raises FileNotFoundError for a missing key
+    def read(self, key):
+        with open(os.path.join(self.root, *key.split('/')), 'rb') as f:
+            return f.read()
+
+    # Read-only uint8 array of the artifact, memory-mapped so processes mapping it share its pages
+    def map(self, key):
+        return np.memmap(os.path.join(self.root, *key.split('/')), dtype=np.uint8, mode='r')
+
+
+class S3ArtifactStore:
+    def __init__(self, s3, bucket_name, prefix=''):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+
+    def __repr__(self):
+        return f'S3ArtifactStore(s3://{self.bucket_name}/{self.prefix})'
+
+    def list(self, prefix=''):
+        keys = []
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix + prefix):
+            keys.extend(item['Key'][len(self.prefix):] for item in page.get('Contents', []))
+        return sorted(keys)
+
+    # Raises FileNotFoundError for a missing key, like LocalArtifactStore
+    def read(self, key):
+        try:
+            return self.s3.get_object(Bucket=self.bucket_name, Key=self.prefix + key)['Body'].read()
+        except self.s3.exceptions.NoSuchKey:
+            raise FileNotFoundError(f'{self!r}: {key}') from None
+
+    # Read-only uint8 array of the artifact. Objects cannot be mapped, so it is read once into memory.
+    def map(self, key):
+        return np.frombuffer(self.read(key), dtype=np.uint8)
+
+
+# Load times of one batch of artifacts. Per artifact: seconds to read and parse it.
+class LoadMetrics:
+    def __init__(self):
+        self.total_seconds = 0.0
+        self.artifact_seconds = {}  # key: artifact key, value: seconds
+        self.bytes_loaded = 0
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds, size):
+        with self._lock:
+            self.artifact_seconds[key] = seconds
+            self.bytes_loaded += size
+
+    def summary(self, slowest=5):
+        seconds = np.array(list(self.artifact_seconds.values()))
+        return {
+            'artifacts': len(seconds),
+            'bytes': self.bytes_loaded,
+            'total_seconds': round(self.total_seconds, 6),
+            'artifact_seconds_mean': round(float(seconds.mean()), 6) if len(seconds) else None,
+            'artifact_seconds_p50': round(float(np.percentile(seconds, 50)), 6) if len(seconds) else None,
+            'artifact_seconds_p95': round(float(np.percentile(seconds, 95)), 6) if len(seconds) else None,
+            'artifact_seconds_max': round(float(seconds.max()), 6) if len(seconds) else None,
+            'slowest_artifacts': {key: round(value, 6) for key, value in
+                                  sorted(self.artifact_seconds.items(), key=lambda item: -item[1])[:slowest]},
+        }
+
+
+# key: artifact key, value: parse(bytes) of every key, read on `concurrency` threads. Raises the first error.
+# Times are added to metrics (LoadMetrics) when given.
+def load_artifacts(store, keys, parse=pickle.loads, concurrency=16, metrics=None):
+    def load(key):
+        started_at = time.perf_counter()
+        data = store.read(key)
+        value = parse(data)
+        if metrics is not None:
+            metrics.record(key, time.perf_counter() - started_at, len(data))
+        return value
+
+    keys = list(keys)
+    started_at = time.perf_counter()
+    if concurrency <= 1 or len(keys) <= 1:
+        values = [load(key) for key in keys]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(keys)), thread_name_prefix='artifacts') as executor:
+            values = list(executor.map(load, keys))
+    if metrics is not None:
+        metrics.total_seconds += time.perf_counter() - started_at
+    return dict(zip(keys, values))
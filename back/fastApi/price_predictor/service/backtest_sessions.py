@@ -0,0 +1,143 @@
+"""Backtest sessions of the serving API: a backtest sends its first window of prices once, then one new price per step.
+
+A session keeps the newest feature_count prices in a LagRing, so a step predicts the one new lag row only, and the row
+predictions of its window, so a step answers the same forecast vector as /api/v1/predict/ticker/backtest would for the
+whole window. Sessions are held in memory by the worker that opened them:
+
+- A session unused for ttl_seconds expires, and is removed by the next open or lookup.
+- At most max_sessions are open at once. Opening one more is refused, the open sessions are never evicted.
+- Sessions are only enabled with a single serving worker. With several, uvicorn's workers share one listening socket,
+  so the step of a session could reach any worker, not only the one holding it.
+"""
+import collections
+import logging
+import threading
+import time
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger('uvicorn')
+
+
+# The newest `size` prices as a lag row, newest first. Every price is written twice, at pos and pos + size, so the row
+# is always the contiguous slice [pos:pos + size]: one append is O(1) and no row is copied.
+class LagRing:
+    def __init__(self, prices):
+        self.size = len(prices)
+        self._buffer = np.empty(2 * self.size, dtype=np.float64)
+        self._pos = 0
+        for price in prices:
+            self.append(price)
+
+    def append(self, price):
+        self._pos = (self._pos - 1) % self.size
+        self._buffer[self._pos] = self._buffer[self._pos + self.size] = price
+
+    # Read-only view, valid until the next append
+    def row(self):
+        row = self._buffer[self._pos:self._pos + self.size]
+        row.flags.writeable = False
+        return row
+
+
+class BacktestSession:
+    # prices: the first window, oldest first. row_predictions: one prediction per lag row of feature_count prices of
+    # that window.
+    def __init__(self, ticker_dto, model_set, prices, row_predictions, feature_count):
+        self.ticker_dto = ticker_dto
+        # ModelSet.resident of the session's ticker, kept for the whole session even when a new generation is
+        # activated and the old one's files are removed
+        self.model_set = model_set
+        self.lags = LagRing(np.asarray(prices[-feature_count:], dtype=np.float64))
+        self.row_predictions = collections.deque(row_predictions, maxlen=len(row_predictions))
+        self.steps = 0
+        self.lock = threading.Lock()  # Steps of one session are predicted one at a time
+        self.last_used_at = None
+
+    # Appends the price of the next step and returns its lag row, predicted by the caller for record()
+    def append(self, price):
+        self.lags.append(price)
+        self.steps += 1
+        return self.lags.row()
+
+    # Records the prediction of the newest lag row. Returns the forecast vector of the window ending at that row.
+    def record(self, prediction):
+        self.row_predictions.append(prediction)
+        return list(self.row_predictions)
+
+
+class BacktestSessions:
+    def __init__(self, max_sessions, ttl_seconds, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._sessions = collections.OrderedDict()  # key: session id, value: BacktestSession, least recently used first
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        self.expired = 0
+        self.refused = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    # Returns the new session's id. Raises RuntimeError when max_sessions are open.
+    def open(self, session):
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            if len(self._sessions) >= self.max_sessions:
+                self.refused += 1
+                raise RuntimeError(f'{self.max_sessions} backtest sessions are open, close one or retry later')
+            session_id = uuid.uuid4().hex
+            session.last_used_at = now
+            self._sessions[session_id] = session
+            self.opened += 1
+            return session_id
+
+    # Raises LookupError when the session is unknown, closed or expired
+    def get(self, session_id):
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise LookupError(f'Backtest session {session_id} is unknown or expired, please open a new one')
+            session.last_used_at = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    # Returns whether the session was open
+    def close(self, session_id):
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                return False
+            self.closed += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            self._expire(self._clock())
+            return {'open': len(self._sessions), 'max_sessions': self.max_sessions, 'ttl_seconds': self.ttl_seconds,
+                    'opened': self.opened, 'closed': self.closed, 'expired': self.expired, 'refused': self.refused}
+
+    # Sessions are ordered by last use, so the expired ones are the oldest
+    def _expire(self, now):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used_at < self.ttl_seconds:
+                return
+            del self._sessions[session_id]
+            self.expired += 1
+
+
+# The sessions of a worker, or None when sessions are disabled: max_sessions is 0, or serving_workers (uvicorn's
+# WEB_CONCURRENCY) is more than 1
+def for_serving_workers(serving_workers, max_sessions, ttl_seconds, clock=time.monotonic):
+    if max_sessions <= 0:
+        return None
+    if serving_workers > 1:
+        logger.warning(f'Backtest sessions are disabled: {serving_workers} serving workers, sessions need 1')
+        return None
+    return BacktestSessions(max_sessions, ttl_seconds, clock)
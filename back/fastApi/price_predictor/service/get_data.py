@@ -3,17 +3,32 @@ import os
 from datetime import datetime, timedelta
 
 import pandas as pd
-import boto3
 
 from polygon import RESTClient
 
 from pytickersymbols import PyTickerSymbols
 
-client = RESTClient()  # POLYGON_API_KEY is used
-s3 = boto3.client('s3',
-                  aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                  aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                  aws_session_token=os.getenv('AWS_SESSION_TOKEN'))
+from . import artifact_store
+from . import ingestion
+from ..machine_learning import bar_segments
+
+# Endpoints are configurable so ingestion can run against local stand-ins of the data provider and object store
+POLYGON_BASE_URL = os.getenv('POLYGON_BASE_URL', 'https://api.polygon.io')
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL')  # None = AWS
+
+# Concurrency and provider quota of get_data
+INGESTION_CONCURRENCY = int(os.getenv('INGESTION_CONCURRENCY', '16'))
+POLYGON_REQUESTS_PER_SECOND = float(os.getenv('POLYGON_REQUESTS_PER_SECOND', '50'))
+POLYGON_REQUEST_BURST = float(os.getenv('POLYGON_REQUEST_BURST', '0')) or None  # 0 = one second's worth of requests
+INGESTION_RETRIES = int(os.getenv('INGESTION_RETRIES', '3'))
+# 'segments': append new bars to compressed daily segments (machine_learning/bar_segments.py)
+# 'json': rewrite each ticker's whole window as <ticker>.json
+INGESTION_FORMAT = os.getenv('INGESTION_FORMAT', 'segments')
+BAR_SEGMENTS_PREFIX = os.getenv('BAR_SEGMENTS_PREFIX', 'bars')
+# Local directory segments are also appended to, e.g. the serving API's BAR_SEGMENTS_DIRECTORY. '' = upload only
+BAR_SEGMENTS_DIRECTORY = os.getenv('BAR_SEGMENTS_DIRECTORY', '')
+# Directory the JSON files are also written to in 'json' format, '' = upload only
+INGESTION_OUTPUT_DIRECTORY = os.getenv('INGESTION_OUTPUT_DIRECTORY', '.')
 
 stock_bucket_name = os.getenv('AWS_STOCK_BUCKET_NAME')
 
@@ -22,43 +37,105 @@ sp500_yahoo_tickers = stock_data.get_sp_500_nyc_yahoo_tickers()
 
 test_tickers = ['AAPL']
 
+# key: (store, ticker), value: last stored timestamp, so a store is only read back on the first run of this process
+last_stored_timestamps = {}
+
 ''' helper functions '''
 
 
-def get_data(stock_tickers):
+# Polygon client whose connection pool holds one kept-alive connection per worker. urllib3 keeps a single connection
+# per host by default, so concurrent workers would otherwise open and discard a connection per request.
+def make_polygon_client(api_key=None, base=POLYGON_BASE_URL, concurrency=INGESTION_CONCURRENCY):
+    client = RESTClient(api_key=api_key or os.getenv('POLYGON_API_KEY'), base=base)
+    client.client.connection_pool_kw.update(maxsize=concurrency, block=True)
+    return client
+
+
+def make_s3_client(endpoint_url=AWS_S3_ENDPOINT_URL, concurrency=INGESTION_CONCURRENCY, **kwargs):
+    return artifact_store.make_s3_client(endpoint_url,
+                                         concurrency,
+                                         aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                                         aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                                         aws_session_token=os.getenv('AWS_SESSION_TOKEN'),
+                                         **kwargs)
+
+
+def fetch_price_data(client, stock_ticker, from_, to):
+    # 10 minutes daily bars
+    dataRequest = client.list_aggs(
+        ticker=stock_ticker,
+        multiplier=10,
+        timespan='minute',
+        from_=from_,
+        to=to,
+        adjusted=True,
+        sort='desc',
+        limit=2000
+    )
+
+    # list of polygon agg objects to DataFrame
+    return pd.DataFrame(dataRequest)
+
+
+# Appends the bars newer than the last stored ones. Returns the number of bars appended.
+def append_to_segments(store_name, store, stock_ticker, priceData):
+    key = (store_name, stock_ticker)
+    if key not in last_stored_timestamps:
+        last_stored_timestamps[key] = bar_segments.latest_timestamp(store, stock_ticker)
+    rows, _ = bar_segments.append_bars(store, stock_ticker, priceData, last_stored_timestamps[key])
+    if rows:
+        last_stored_timestamps[key] = int(priceData['timestamp'].max())
+    return rows
+
+
+# Fetches every ticker concurrently within the provider's quota and stores it in the bucket (and locally) in
+# ingestion_format. Returns ingestion.ingest's result: succeeded tickers, failed tickers with errors, seconds.
+def get_data(stock_tickers, client=None, s3=None, bucket_name=None, output_directory=INGESTION_OUTPUT_DIRECTORY,
+             concurrency=INGESTION_CONCURRENCY, requests_per_second=POLYGON_REQUESTS_PER_SECOND,
+             retries=INGESTION_RETRIES, backoff_seconds=0.5, ingestion_format=INGESTION_FORMAT,
+             segments_directory=BAR_SEGMENTS_DIRECTORY):
     # Datetime strings for api
     today = datetime.today().strftime('%Y-%m-%d')
     previous_datetime = datetime.today() - timedelta(days=4)
     previous = previous_datetime.strftime('%Y-%m-%d')
 
-    for stock_ticker in stock_tickers:
-        json_file_path = stock_ticker + '.json'
-
-        # 10 minutes daily bars
-        dataRequest = client.list_aggs(
-            ticker=stock_ticker,
-            multiplier=10,
-            timespan='minute',
-            from_=today,
-            to=previous,
-            adjusted=True,
-            sort='desc',
-            limit=2000
-        )
+    # One pooled client of each kind, shared by all workers
+    client = client or make_polygon_client(concurrency=concurrency)
+    s3 = s3 or make_s3_client(concurrency=concurrency)
+    bucket_name = bucket_name or stock_bucket_name
+    segment_stores = {f's3://{bucket_name}/{BAR_SEGMENTS_PREFIX}': bar_segments.S3SegmentStore(s3, bucket_name,
+                                                                                               BAR_SEGMENTS_PREFIX)}
+    if segments_directory:
+        segment_stores[segments_directory] = bar_segments.LocalSegmentStore(segments_directory)
+
+    def fetch(stock_ticker):
+        return fetch_price_data(client, stock_ticker, today, previous)
+
+    def store(stock_ticker, priceData):
+        if ingestion_format == 'segments':
+            if priceData.empty:
+                return
+            # only the new bars, compressed and streamed from memory
+            for store_name, segment_store in segment_stores.items():
+                append_to_segments(store_name, segment_store, stock_ticker, priceData)
+            return
 
-        # list of polygon agg objects to DataFrame
-        priceData = pd.DataFrame(dataRequest)
+        json_file_path = stock_ticker + '.json'
 
-        # storing data in JSON format
-        priceData.to_json(json_file_path, orient='split', compression='infer')
-        upload_to_S3(json_file_path, stock_bucket_name, json_file_path)
+        # storing data in JSON format, uploaded from memory
+        body = priceData.to_json(orient='split').encode()
+        if output_directory:
+            with open(os.path.join(output_directory, json_file_path), 'wb') as f:
+                f.write(body)
+        s3.put_object(Bucket=bucket_name, Key=json_file_path, Body=body)
 
-        # reading the JSON file
-        #df = pd.read_json(json_file_path, orient ='split', compression = 'infer')
-        #print(df)
+    rate_limiter = ingestion.TokenBucket(requests_per_second, POLYGON_REQUEST_BURST)
+    return ingestion.ingest(stock_tickers, fetch, store, concurrency=concurrency, rate_limiter=rate_limiter,
+                            retries=retries, backoff_seconds=backoff_seconds)
 
 
-def upload_to_S3(file_name, bucket_name, object_name):
+def upload_to_S3(file_name, bucket_name, object_name, s3=None):
+    s3 = s3 or make_s3_client()
     with open(file_name, "rb") as f:
         s3.upload_fileobj(f, bucket_name, object_name)
 
@@ -67,7 +144,8 @@ def upload_to_S3(file_name, bucket_name, object_name):
 
 
 def main():
-    get_data(sp500_yahoo_tickers)
+    result = get_data(sp500_yahoo_tickers)
+    print(f'Ingested {len(result["succeeded"])} tickers in {result["seconds"]:.1f}s. Failed: {result["failed"]}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,93 @@
+"""Concurrent, rate-limited ingestion engine used by get_data.py to refresh the ticker universe.
+
+- A thread pool of `concurrency` workers fetches and stores tickers independently. The work is network bound, so the
+  threads spend their time waiting on sockets, not holding the GIL.
+- One token bucket is shared by all workers, so provider requests stay within the quota however many workers run.
+- Every fetch and store is retried with exponential backoff and jitter. A ticker that still fails is reported without
+  holding up the others.
+- The callers pass clients whose connection pools are sized to `concurrency` (see get_data.py), so connections are
+  reused instead of opened per request.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger('uvicorn')
+
+
+class TokenBucket:
+    # rate: tokens added per second, capacity: largest burst (default: one second's worth of tokens)
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError(f'rate must be positive, got {rate}')
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    # Blocks until `tokens` are available and takes them. Returns the seconds waited.
+    def acquire(self, tokens=1):
+        if tokens > self.capacity:
+            raise ValueError(f'cannot acquire {tokens} tokens from a bucket of capacity {self.capacity}')
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+
+# Calls function(), retrying up to `retries` times on any exception. Delays double from backoff_seconds and are
+# jittered, so workers that failed together do not retry together.
+def call_with_retries(function, retries=3, backoff_seconds=0.5, max_backoff_seconds=30.0, sleep=time.sleep):
+    for attempt in range(retries + 1):
+        try:
+            return function()
+        except Exception as err:
+            if attempt == retries:
+                raise
+            delay = min(max_backoff_seconds, backoff_seconds * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f'Attempt {attempt + 1} failed: {err}. Retrying in {delay:.2f}s')
+            sleep(delay)
+
+
+# Runs store(ticker, fetch(ticker)) for every ticker on `concurrency` threads. rate_limiter (e.g. a TokenBucket) is
+# acquired before every fetch attempt. Returns {'succeeded': [...], 'failed': {ticker: error}, 'seconds': ...}.
+def ingest(tickers, fetch, store, concurrency=8, rate_limiter=None, retries=3, backoff_seconds=0.5):
+    def fetch_once(ticker):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return fetch(ticker)
+
+    def ingest_ticker(ticker):
+        data = call_with_retries(lambda: fetch_once(ticker), retries, backoff_seconds)
+        call_with_retries(lambda: store(ticker, data), retries, backoff_seconds)
+
+    started_at = time.perf_counter()
+    succeeded = []
+    failed = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ingestion') as executor:
+        futures = {executor.submit(ingest_ticker, ticker): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                future.result()
+                succeeded.append(ticker)
+            except Exception as err:
+                failed[ticker] = f'{type(err).__name__}: {err}'
+                logger.error(f'Failed to ingest {ticker}: {err}')
+
+    seconds = time.perf_counter() - started_at
+    logger.info(f'Ingested {len(succeeded)} / {len(futures)} tickers in {seconds:.2f}s')
+    return {'succeeded': sorted(succeeded), 'failed': failed, 'seconds': seconds}
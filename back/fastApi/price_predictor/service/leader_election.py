@@ -0,0 +1,51 @@
+"""Leader election between the serving API's worker processes (uvicorn --workers), so that the scheduled jobs that
+write shared files (the ML pipeline, the price store conversion) run in exactly one of them.
+
+The leader holds an exclusive flock on a lock file for as long as it lives. The operating system releases the lock
+when the leader exits or crashes, and the next worker to call try_acquire() takes over.
+"""
+import fcntl
+import logging
+import os
+import threading
+
+logger = logging.getLogger('uvicorn')
+
+
+class FileLeaderLock:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self):
+        return self._file is not None
+
+    # Returns True if this process is the leader, taking the lock if it is free. Never blocks.
+    def try_acquire(self):
+        with self._lock:
+            if self._file is not None:
+                return True
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            file = open(self.path, 'a+')
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                return False
+            # For operators: the pid of the current leader
+            file.seek(0)
+            file.truncate()
+            file.write(f'{os.getpid()}\n')
+            file.flush()
+            self._file = file
+            logger.info(f'Process {os.getpid()} is the scheduler leader ({self.path})')
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._file is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                self._file.close()
+                self._file = None
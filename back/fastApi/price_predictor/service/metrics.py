@@ -0,0 +1,261 @@
+"""Metrics of the serving API and of the ML pipeline runs it triggers, rendered in the Prometheus text format by
+/api/v1/metrics.
+
+- Counter, Gauge and Histogram (fixed buckets), one series per tuple of label values. Each thread observes into its
+  own histogram series without locking, merged when scraped, so every stage of a prediction can be timed.
+- Collectors: callbacks run on each scrape for values kept elsewhere, e.g. the ModelCache's hits and misses.
+- TimedRoute: FastAPI route class timing each request, and within it the endpoint. The rest is the body's decoding
+  and validation plus the response's serialization ('codec' stage).
+
+Every uvicorn worker keeps its own metrics and answers the scrapes that reach it. Samples carry a `pid` label, so the
+series of different workers are not mixed up.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import math
+import os
+import threading
+import time
+
+from fastapi.routing import APIRoute
+
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TRAINING_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series = {}  # key: tuple of label values
+        self._lock = threading.Lock()
+
+    def _labels(self, label_values):
+        return dict(zip(self.label_names, label_values))
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *label_values, amount=1.0):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._series.items()]
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._series[label_values] = value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._series.items()]
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label_values', 'started_at')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started_at, *self.label_values)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []  # one {label values: [bucket counts, sum, count]} per observing thread
+
+    def _shard(self):
+        try:
+            return self._local.series
+        except AttributeError:
+            series = self._local.series = {}
+            with self._lock:
+                self._shards.append(series)
+            return series
+
+    # Only the calling thread writes to its shard, so no lock is taken
+    def observe(self, value, *label_values):
+        shard = self._shard()
+        series = shard.get(label_values)
+        if series is None:
+            series = shard[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+    # Context manager observing the seconds spent in its block
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def samples(self):
+        merged = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, (counts, total, count) in list(shard.items()):
+                series = merged.setdefault(key, [[0] * len(counts), 0.0, 0])
+                series[0] = [merged_count + bucket_count for merged_count, bucket_count in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        samples = []
+        for key, (counts, total, count) in merged.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    # collector() returns (name, type, documentation, [(labels, value)]) tuples, computed on each scrape
+    def collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        pid = str(os.getpid())
+        families = [(metric.name, metric.type, metric.documentation, metric.samples()) for metric in self._metrics]
+        for collector in self._collectors:
+            families.extend((name, metric_type, documentation, [(name, labels, value) for labels, value in samples])
+                            for name, metric_type, documentation, samples in collector())
+        lines = []
+        for name, metric_type, documentation, samples in families:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.extend(f'{sample_name}{_format_labels(dict(labels, pid=pid))} {_format_value(value)}'
+                         for sample_name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Serving
+REQUEST_SECONDS = REGISTRY.histogram('price_predictor_request_seconds',
+                                     'Time to handle a request, decoding and serialization included.', ['route'])
+STAGE_SECONDS = REGISTRY.histogram('price_predictor_stage_seconds',
+                                   'Time spent in each stage of the live and backtest prediction paths.', ['stage'])
+PREDICTION_ERRORS = REGISTRY.counter('price_predictor_prediction_errors_total',
+                                     'Predictions that failed, by route.', ['route'])
+
+# Training
+TRAINING_STAGE_SECONDS = REGISTRY.histogram('price_predictor_training_stage_seconds',
+                                            'Duration of each stage of the ML pipeline runs.', ['stage'],
+                                            TRAINING_BUCKETS)
+TRAINING_TICKER_SECONDS = REGISTRY.gauge('price_predictor_training_ticker_seconds',
+                                         'Duration of the last ML pipeline run\'s training task of each ticker.',
+                                         ['ticker'])
+
+# Seconds in the endpoint of the request being handled, shared with the threadpool thread running it
+_endpoint_seconds = contextvars.ContextVar('endpoint_seconds', default=None)
+
+
+def _timed_endpoint(endpoint):
+    @functools.wraps(endpoint)
+    def timed(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started_at
+            holder = _endpoint_seconds.get()
+            if holder is not None:
+                holder.append(seconds)
+            STAGE_SECONDS.observe(seconds, 'endpoint')
+
+    return timed
+
+
+# Route class recording REQUEST_SECONDS by route path, and the 'endpoint' and 'codec' stages of `def` endpoints.
+# Mixed in before other route classes, it times their handlers too.
+class TimedRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _timed_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_route_handler(request):
+            holder = []
+            token = _endpoint_seconds.set(holder)
+            started_at = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                seconds = time.perf_counter() - started_at
+                _endpoint_seconds.reset(token)
+                REQUEST_SECONDS.observe(seconds, self.path)
+                if holder:
+                    STAGE_SECONDS.observe(max(seconds - sum(holder), 0.0), 'codec')
+
+        return timed_route_handler
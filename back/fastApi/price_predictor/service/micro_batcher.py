@@ -0,0 +1,89 @@
+"""Dynamic micro-batching of concurrent prediction requests, used by the serving API's live and backtest endpoints.
+
+Requests submitted within window_seconds of the first request of a batch (or until max_batch_size requests are
+waiting) are handed to predict_batch together, on one flusher thread, so that e.g. the requests of a ticker share one
+sklearn pipeline pass instead of paying its per-call overhead each. Requests arriving while a batch is predicted wait
+for the next one.
+
+submit() returns a concurrent.futures.Future: `def` endpoints (Starlette's threadpool) block on future.result(),
+`async` callers can `await asyncio.wrap_future(future)`.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger('uvicorn')
+
+
+class MicroBatcher:
+    # predict_batch(items) returns one result per item, in order. A result that is an Exception is raised to that
+    # item's caller only.
+    def __init__(self, predict_batch, window_seconds=0.002, max_batch_size=64):
+        self._predict_batch = predict_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending = []  # (item, Future, submitted at), oldest first
+        self._condition = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('MicroBatcher is closed')
+            self._pending.append((item, future, time.perf_counter()))
+            # The flusher only needs waking to start a window or to flush a full batch early
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._condition.notify()
+        return future
+
+    # Predicts the requests still waiting, then stops the flusher thread
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def stats(self):
+        with self._condition:
+            return {'window_seconds': self.window_seconds, 'max_batch_size': self.max_batch_size,
+                    'batches': self.batches, 'items': self.items, 'largest_batch': self.largest_batch,
+                    'mean_batch_size': round(self.items / self.batches, 3) if self.batches else None}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # Wait for a first request, then for the window to elapse or the batch to fill
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = self._pending[0][2] + self.window_seconds - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if not self._pending and self._closed:
+                    return
+                batch = self._pending[:self.max_batch_size]
+                self._pending = self._pending[self.max_batch_size:]
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+            self._predict(batch)
+
+    def _predict(self, batch):
+        try:
+            results = self._predict_batch([item for item, _, _ in batch])
+        except Exception as err:
+            logger.error(f'Exception occurred at micro-batch of {len(batch)} predictions: {err}')
+            results = [err] * len(batch)
+        for (_, future, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
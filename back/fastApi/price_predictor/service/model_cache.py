@@ -0,0 +1,93 @@
+"""Memory-budgeted LRU cache of loaded ticker bundles, used by ModelRegistry to load models on demand.
+
+- get(key) loads a missing entry on first request. Concurrent requests for the same key wait for that one load
+  (single-flight) instead of loading it again.
+- Entries are charged their size in bytes (the serialized bundle size, a proxy for its memory). When the total
+  exceeds the budget, the least recently used entries are evicted.
+- Pinned keys, e.g. the bundles of the hottest tickers, are never evicted.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class ModelCache:
+    # load(key) returns (value, size in bytes). memory_budget_bytes: 0 = unlimited.
+    def __init__(self, load, memory_budget_bytes=0, pinned=()):
+        self._load = load
+        self.memory_budget_bytes = memory_budget_bytes
+        self._pinned = set(pinned)
+        self._entries = OrderedDict()  # key: key, value: (value, size), least recently used first
+        self._loading = {}  # key: key, value: Future of the load in flight
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            future = self._loading.get(key)
+            loader = future is None
+            if loader:
+                future = self._loading[key] = Future()
+                self.misses += 1
+        if not loader:
+            return future.result()
+
+        try:
+            value, size = self._load(key)
+        except BaseException as err:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(err)
+            raise
+        with self._lock:
+            del self._loading[key]
+            self._entries[key] = (value, size)
+            self.resident_bytes += size
+            self._evict(keep=key)
+        future.set_result(value)
+        return value
+
+    # Replaces the pinned keys. Pinned keys already resident stay resident until unpinned.
+    def pin(self, keys):
+        with self._lock:
+            self._pinned = set(keys)
+            self._evict()
+
+    # Drops every entry whose key is not in keys, e.g. the bundles of a generation that is no longer active
+    def retain(self, keys):
+        keys = set(keys)
+        with self._lock:
+            for key in [key for key in self._entries if key not in keys]:
+                self.resident_bytes -= self._entries.pop(key)[1]
+
+    # Evicts least recently used, unpinned entries until within budget. Call with the lock held.
+    def _evict(self, keep=None):
+        if not self.memory_budget_bytes:
+            return
+        for key in list(self._entries):
+            if self.resident_bytes <= self.memory_budget_bytes:
+                break
+            if key == keep or key in self._pinned:
+                continue
+            self.resident_bytes -= self._entries.pop(key)[1]
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'resident': len(self._entries), 'resident_bytes': self.resident_bytes,
+                    'memory_budget_bytes': self.memory_budget_bytes, 'pinned': len(self._pinned),
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
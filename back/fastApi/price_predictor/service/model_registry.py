@@ -0,0 +1,254 @@
+import itertools
+import logging
+import threading
+import time
+from collections import namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+from . import artifact_store
+from . import model_cache
+from ..machine_learning import coefficient_bundle
+from ..machine_learning import fused_predictor
+from ..machine_learning import model_generations
+
+logger = logging.getLogger('uvicorn')
+
+LEGACY_GENERATION = 'legacy'  # trained files in the unversioned model/, x_scaler/, y_scaler/ layout
+# Versions of ModelSet snapshots, unique within the process
+_model_set_versions = itertools.count(1)
+
+
+# One ticker's trained files, with the FusedPredictor compiled from them (None for non-linear models)
+class Pipeline(namedtuple('Pipeline', ['model', 'x_scaler', 'y_scaler', 'fused_predictor'])):
+    __slots__ = ()
+
+
+# Read-only mapping of ticker to one field of its Pipeline, e.g. ModelSet.models. Membership and iteration use the
+# ModelSet's index only; looking a ticker up loads its bundle if it is not resident.
+class PipelineFieldView(Mapping):
+    def __init__(self, model_set, field):
+        self._model_set = model_set
+        self._field = field
+
+    def __getitem__(self, ticker):
+        return getattr(self._model_set.pipeline(ticker), self._field)
+
+    def __iter__(self):
+        return iter(self._model_set.tickers)
+
+    def __len__(self):
+        return len(self._model_set.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self._model_set.tickers
+
+
+# fused_predictors only holds the tickers with a linear model. Tickers in the generation's coefficient bundle are
+# answered from it, membership of any other ticker loads its bundle.
+class FusedPredictorView(PipelineFieldView):
+    def __getitem__(self, ticker):
+        fused = self._model_set.fused_predictor(ticker)
+        if fused is None:
+            raise KeyError(ticker)
+        return fused
+
+    def __iter__(self):
+        return (ticker for ticker in self._model_set.tickers if ticker in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, ticker):
+        return super().__contains__(ticker) and self._model_set.fused_predictor(ticker) is not None
+
+
+# Immutable snapshot of every ticker's trained files of one generation. A request takes one snapshot and uses it
+# throughout, so it never mixes a model of one generation with the scalers of another.
+# Each ticker's source is either a resident Pipeline or the artifact key of its bundle, loaded on demand through the
+# registry's ModelCache. Linear tickers of the generation's CoefficientBundle are predicted without loading anything.
+class ModelSet:
+    def __init__(self, generation, sources, cache=None, coefficients=None):
+        self.generation = generation
+        # Differs between snapshots of the same generation, e.g. after with_pipelines
+        self.version = next(_model_set_versions)
+        self._sources = sources  # key: ticker, value: Pipeline or bundle key in cache
+        self._cache = cache
+        self.coefficients = coefficients
+        self.models = PipelineFieldView(self, 'model')  # key: ticker, value: trained Model object
+        self.x_scalers = PipelineFieldView(self, 'x_scaler')
+        self.y_scalers = PipelineFieldView(self, 'y_scaler')
+        self.fused_predictors = FusedPredictorView(self, 'fused_predictor')  # linear models only
+
+    @property
+    def tickers(self):
+        return self._sources.keys()
+
+    # Raises KeyError for a ticker without trained files
+    def pipeline(self, ticker):
+        source = self._sources[ticker]
+        return source if isinstance(source, Pipeline) else self._cache.get(source)
+
+    # FusedPredictor of the ticker, or None when its model is not linear. Raises KeyError for a ticker without trained
+    # files.
+    def fused_predictor(self, ticker):
+        source = self._sources[ticker]
+        if not isinstance(source, Pipeline) and self.coefficients is not None and ticker in self.coefficients:
+            return self.coefficients.fused_predictor(ticker)
+        return self.pipeline(ticker).fused_predictor
+
+    # Copy of this snapshot with (model, x_scaler, y_scaler) pipelines added or replaced
+    def with_pipelines(self, pipelines, generation=None):
+        return ModelSet(self.generation if generation is None else generation,
+                        {**self._sources, **compile_pipelines(pipelines)}, self._cache, self.coefficients)
+
+    # Snapshot of the given tickers only, their pipelines loaded now, so that it keeps predicting after the generation's
+    # files are removed, e.g. for a backtest session. Tickers of the CoefficientBundle keep only their FusedPredictor.
+    def resident(self, tickers):
+        sources = {}
+        for ticker in tickers:
+            source = self._sources[ticker]
+            if not isinstance(source, Pipeline) and self.coefficients is not None and ticker in self.coefficients:
+                source = Pipeline(None, None, None, self.coefficients.fused_predictor(ticker))
+            sources[ticker] = source if isinstance(source, Pipeline) else self._cache.get(source)
+        return ModelSet(self.generation, sources)
+
+    # Copy of this snapshot without the given tickers
+    def without(self, tickers):
+        return ModelSet(self.generation,
+                        {ticker: source for ticker, source in self._sources.items() if ticker not in tickers},
+                        self._cache, self.coefficients)
+
+
+def empty_model_set():
+    return ModelSet(None, {})
+
+
+# Linear pipelines are also compiled into a FusedPredictor, which is checked against the sklearn pipeline before it
+# is used.
+def compile_pipeline(ticker, model, x_scaler, y_scaler):
+    try:
+        fused = fused_predictor.compile_verified_pipeline(model, x_scaler, y_scaler)
+    except ValueError as err:
+        logger.warning(f'Not fusing {ticker}, predicting with sklearn instead: {err}')
+        fused = None
+    return Pipeline(model, x_scaler, y_scaler, fused)
+
+
+# pipelines: key: ticker, value: (model, x_scaler, y_scaler)
+def compile_pipelines(pipelines):
+    return {ticker: compile_pipeline(ticker, *pipeline) for ticker, pipeline in pipelines.items()}
+
+
+# ModelSet of resident pipelines, key: ticker, value: (model, x_scaler, y_scaler)
+def build_model_set(generation, pipelines):
+    return ModelSet(generation, compile_pipelines(pipelines))
+
+
+# Active generation name in the store, or None when no generation has been published yet
+def read_current_generation(store):
+    try:
+        return store.read(f'{model_generations.GENERATIONS_DIRECTORY_NAME}/{model_generations.CURRENT_FILENAME}'
+                          ).decode().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# key: ticker, value: artifact key of its bundle, for every bundle in the store's generation
+def generation_index(store, generation):
+    prefix = f'{model_generations.GENERATIONS_DIRECTORY_NAME}/{generation}/'
+    return {key[len(prefix):].split(".")[0]: key for key in store.list(prefix)
+            if key.endswith('.pkl') and '/' not in key[len(prefix):]}
+
+
+# Memory-mapped CoefficientBundle of the store's generation, or None when the generation has none
+def open_coefficients(store, generation, metrics=None):
+    key = f'{model_generations.GENERATIONS_DIRECTORY_NAME}/{generation}/{coefficient_bundle.FILENAME}'
+    started_at = time.perf_counter()
+    try:
+        buffer = store.map(key)
+    except FileNotFoundError:
+        return None
+    coefficients = coefficient_bundle.CoefficientBundle(buffer)
+    if metrics is not None:
+        metrics.record(key, time.perf_counter() - started_at, len(buffer))
+    return coefficients
+
+
+# Serves the newest published generation of trained files from an artifact store (by default the local
+# trained_files_directory).
+# refresh() only reads the new generation's index, then swaps it in with a single reference assignment to `active`,
+# so readers never take a lock and always see a complete ModelSet. Only concurrent refreshes are serialised.
+# Bundles are loaded the first time a ticker is requested and kept in a ModelCache of memory_budget_bytes
+# (0 = unlimited). The bundles of pinned_tickers are loaded by refresh() and never evicted.
+class ModelRegistry:
+    def __init__(self, trained_files_directory=None, legacy_loader=None, store=None, load_concurrency=16,
+                 memory_budget_bytes=0, pinned_tickers=()):
+        self.store = store if store is not None else artifact_store.LocalArtifactStore(trained_files_directory)
+        # legacy_loader(store, metrics) loads the unversioned layout when no generation has been published yet.
+        # Returns {ticker: pipeline}, all resident.
+        self.legacy_loader = legacy_loader
+        self.load_concurrency = load_concurrency
+        self.pinned_tickers = list(pinned_tickers)
+        self.cache = model_cache.ModelCache(self._load_bundle, memory_budget_bytes)
+        self.active = empty_model_set()
+        # LoadMetrics of the active ModelSet. total_seconds: reading the index and the pinned bundles.
+        # artifact_seconds: every bundle loaded since, including on demand.
+        self.load_metrics = None
+        self._refresh_lock = threading.Lock()
+
+    def activate(self, model_set):
+        self.active = model_set
+
+    # (Pipeline, size in bytes) of the bundle at key, for the cache
+    def _load_bundle(self, key):
+        started_at = time.perf_counter()
+        data = self.store.read(key)
+        ticker = key.rsplit('/', 1)[1].split(".")[0]
+        pipeline = compile_pipeline(ticker, *model_generations.bundle_from_bytes(data))
+        if self.load_metrics is not None:
+            self.load_metrics.record(key, time.perf_counter() - started_at, len(data))
+        return pipeline, len(data)
+
+    # Loads the index of the current generation and activates it if it is not active yet.
+    # Returns True if a new ModelSet was activated.
+    def refresh(self, force=False):
+        with self._refresh_lock:
+            generation = read_current_generation(self.store)
+            metrics = artifact_store.LoadMetrics()
+            started_at = time.perf_counter()
+            if generation is None:
+                if self.legacy_loader is None or (self.active.generation == LEGACY_GENERATION and not force):
+                    return False
+                generation = LEGACY_GENERATION
+                model_set = build_model_set(generation, self.legacy_loader(self.store, metrics))
+                self.load_metrics = metrics
+                self.cache.retain(())
+            elif generation == self.active.generation and not force:
+                return False
+            else:
+                index = generation_index(self.store, generation)
+                model_set = ModelSet(generation, index, self.cache, open_coefficients(self.store, generation, metrics))
+                pinned_keys = [index[ticker] for ticker in self.pinned_tickers if ticker in index]
+                self.cache.pin(pinned_keys)
+                self.load_metrics = metrics
+                if pinned_keys:
+                    with ThreadPoolExecutor(max_workers=self.load_concurrency, thread_name_prefix='artifacts') as pool:
+                        list(pool.map(self.cache.get, pinned_keys))
+
+            metrics.total_seconds = time.perf_counter() - started_at
+            self.active = model_set
+            if generation != LEGACY_GENERATION:
+                # Bundles of the previous generation are evicted. A request still holding its snapshot reloads them,
+                # which publish_generation keeps for GENERATION_RETENTION_SECONDS after they were replaced.
+                self.cache.retain(index.values())
+            logger.info(f'Activated model generation {generation} with {len(model_set.tickers)} tickers from '
+                        f'{self.store!r} in {metrics.total_seconds:.3f}s ({len(self.cache)} loaded)')
+            return True
+
+    # Safe to run from a scheduler: logs instead of raising, keeping the active ModelSet on failure
+    def poll(self):
+        try:
+            self.refresh()
+        except Exception as err:
+            logger.error(f'Failed to refresh models, keeping generation {self.active.generation}: {err}')
@@ -0,0 +1,71 @@
+"""LRU cache of live predictions, used by the live endpoint to answer repeated requests within one bar without reading
+prices or predicting again.
+
+Keys are (ticker, prices version, model generation, ModelSet version), so an entry is never served after the ticker's
+prices or models changed: a new bar or a new generation is a new key, and the stale entries age out of the LRU order.
+
+- get(key, compute) computes a missing entry on first request. Concurrent requests for the same key wait for that one
+  computation (single-flight) instead of computing it again. Failures are raised to every waiter and not cached.
+- At most max_entries entries are kept. Beyond that, the least recently used are evicted.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class PredictionCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key: key, value: predictions, least recently used first
+        self._computing = {}  # key: key, value: Future of the computation in flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    # compute() returns the predictions of key, stored as an immutable tuple
+    def get(self, key, compute):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            future = self._computing.get(key)
+            computer = future is None
+            if computer:
+                future = self._computing[key] = Future()
+                self.misses += 1
+        if not computer:
+            return future.result()
+
+        try:
+            value = tuple(compute())
+        except BaseException as err:
+            with self._lock:
+                del self._computing[key]
+            future.set_exception(err)
+            raise
+        with self._lock:
+            del self._computing[key]
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
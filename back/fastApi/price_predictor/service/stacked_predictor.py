@@ -0,0 +1,10 @@
+import numpy as np
+
+
+# x_values: (tickers, rows, features) lag tensor, fused_predictors: one FusedPredictor per ticker.
+# Returns (tickers, rows) predictions, equal to x_scaler.transform -> model.predict -> y_scaler.inverse_transform
+# applied to each ticker separately.
+def predict_stacked(x_values, fused_predictors):
+    weights = np.stack([fused_predictor.weights for fused_predictor in fused_predictors])
+    bias = np.array([fused_predictor.bias for fused_predictor in fused_predictors])
+    return np.einsum('trf,tf->tr', np.asarray(x_values, dtype=np.float64), weights) + bias[:, None]
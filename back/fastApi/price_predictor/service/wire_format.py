@@ -0,0 +1,204 @@
+"""Wire formats of the serving API's request and response bodies, negotiated per request by WireRoute.
+
+- application/json (default): the DTOs as declared, float arrays as List[Decimal], i.e. JSON strings. Unchanged.
+- FLOAT_JSON: the same JSON documents with float arrays as JSON numbers, encoded and decoded by orjson.
+- FLOAT64: packed binary, for clients that already hold float64 arrays:
+
+    header size  4 bytes  little-endian uint32
+    header       JSON     the document, every float array replaced by {"$float64": shape}
+    arrays       little-endian float64 of each replaced array, in header order
+
+A request in either format is answered in the same format, unless Accept names the other one. Float arrays skip
+Pydantic's Decimal validation both ways: request DTOs hold them as NumPy arrays, and endpoints build response DTOs
+with dto(), which leaves them as they are. Request bodies with Content-Encoding: gzip are decompressed whatever the
+format (responses are compressed by Starlette's GZipMiddleware).
+"""
+import contextvars
+import gzip
+import inspect
+import struct
+import typing
+from decimal import Decimal
+
+import numpy as np
+import orjson
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+FLOAT_JSON = 'application/vnd.price-predictor.float+json'
+FLOAT64 = 'application/vnd.price-predictor.float64'
+WIRE_MEDIA_TYPES = (FLOAT64, FLOAT_JSON)
+FLOAT_ARRAY_ANNOTATIONS = (typing.List[Decimal], typing.List[typing.List[Decimal]])
+ARRAY_PLACEHOLDER = '$float64'
+
+# True while an endpoint answers in a wire format: dto() leaves float arrays unvalidated
+_raw_arrays = contextvars.ContextVar('raw_arrays', default=False)
+
+
+# dto_class(**fields) for the default JSON contract. In a wire format, the DTO is constructed without validation, so
+# float arrays (e.g. NumPy predictions) are serialized as they are instead of through Decimal.
+def dto(dto_class, **fields):
+    if _raw_arrays.get():
+        return dto_class.model_construct(**fields)
+    return dto_class(**{name: value.tolist() if isinstance(value, np.ndarray) else value
+                        for name, value in fields.items()})
+
+
+def _is_float_list(value):
+    return len(value) > 0 and all(isinstance(item, (float, Decimal)) for item in value)
+
+
+def _orjson_default(value):
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError
+
+
+def encode(content, media_type):
+    if media_type == FLOAT_JSON:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    arrays = []
+
+    def replace_arrays(value):
+        if isinstance(value, BaseModel):
+            value = value.__dict__
+        if isinstance(value, dict):
+            return {key: replace_arrays(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)) and not _is_float_list(value):
+            return [replace_arrays(item) for item in value]
+        if isinstance(value, np.ndarray) or isinstance(value, (list, tuple)):
+            array = np.asarray(value, dtype='<f8')
+            arrays.append(array)
+            return {ARRAY_PLACEHOLDER: list(array.shape)}
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
+
+    header = orjson.dumps(replace_arrays(content), option=orjson.OPT_SERIALIZE_NUMPY)
+    return b''.join([struct.pack('<I', len(header)), header] + [array.tobytes() for array in arrays])
+
+
+# Document of a FLOAT_JSON or FLOAT64 body (or a default JSON body), FLOAT64 arrays as read-only zero-copy views
+def decode(body, media_type):
+    if media_type != FLOAT64:
+        return orjson.loads(body)
+    header_size = struct.unpack_from('<I', body)[0]
+    buffer = np.frombuffer(body, dtype=np.uint8)
+    offset = 4 + header_size
+
+    def restore_arrays(value):
+        nonlocal offset
+        if isinstance(value, dict):
+            if value.keys() == {ARRAY_PLACEHOLDER}:
+                shape = value[ARRAY_PLACEHOLDER]
+                size = int(np.prod(shape)) * 8
+                if offset + size > len(body):
+                    raise ValueError('FLOAT64 body is shorter than its header')
+                array = buffer[offset:offset + size].view('<f8').reshape(shape)
+                offset += size
+                return array
+            return {key: restore_arrays(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [restore_arrays(item) for item in value]
+        return value
+
+    return restore_arrays(orjson.loads(body[4:4 + header_size]))
+
+
+# body_type (a DTO class or List of a DTO class) of a decoded document. Float array fields become float64 NumPy arrays
+# without going through Decimal, every other field is validated as usual.
+def parse(body_type, content):
+    if typing.get_origin(body_type) is list:
+        item_type = typing.get_args(body_type)[0]
+        return [parse(item_type, item) for item in content]
+    if not isinstance(content, dict):
+        return body_type.model_validate(content)
+    arrays = {name: np.asarray(content[name], dtype=np.float64) for name, field in body_type.model_fields.items()
+              if field.annotation in FLOAT_ARRAY_ANNOTATIONS and content.get(name) is not None}
+    parsed = body_type.model_validate({**content, **{name: [] for name in arrays}})
+    for name, array in arrays.items():
+        setattr(parsed, name, array)
+    return parsed
+
+
+def _media_type(header):
+    return (header or '').split(';')[0].strip().lower()
+
+
+# Wire format of the response: the first wire media type in Accept, else the request's. None = default JSON.
+def negotiate(content_type, accept):
+    for media_range in (accept or '').split(','):
+        if _media_type(media_range) in WIRE_MEDIA_TYPES:
+            return _media_type(media_range)
+    return content_type if content_type in WIRE_MEDIA_TYPES else None
+
+
+# The DTO class (or List of a DTO class) of an endpoint's only parameter, None for any other endpoint
+def _body_type(endpoint):
+    parameters = list(inspect.signature(endpoint).parameters)
+    if len(parameters) != 1:
+        return None
+    body_type = typing.get_type_hints(endpoint).get(parameters[0])
+    model = typing.get_args(body_type)[0] if typing.get_origin(body_type) is list else body_type
+    return body_type if inspect.isclass(model) and issubclass(model, BaseModel) else None
+
+
+# Request whose body is decompressed when sent with Content-Encoding: gzip
+class GzipRequest(Request):
+    async def body(self):
+        if not hasattr(self, '_body'):
+            body = await super().body()
+            if 'gzip' in self.headers.getlist('content-encoding'):
+                body = gzip.decompress(body)
+            self._body = body
+        return self._body
+
+
+# Route answering wire format requests without FastAPI's Decimal (de)serialization. Only routes of endpoints taking a
+# single body parameter, e.g. a PredictionDTO, have a wire format. Everything else goes through FastAPI as usual.
+class WireRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        self.wire_body_type = _body_type(endpoint)
+
+    def get_route_handler(self):
+        default_handler = super().get_route_handler()
+
+        async def wire_route_handler(request):
+            if 'gzip' in request.headers.getlist('content-encoding'):
+                request = GzipRequest(request.scope, request.receive)
+            content_type = _media_type(request.headers.get('content-type'))
+            response_media_type = negotiate(content_type, request.headers.get('accept'))
+            if self.wire_body_type is None or response_media_type is None:
+                return await default_handler(request)
+
+            body = await request.body()
+            try:
+                dto_in = parse(self.wire_body_type, decode(body, content_type))
+            except ValidationError as err:
+                raise RequestValidationError(err.errors(include_url=False, include_input=False), body=None)
+            except (ValueError, TypeError, struct.error, orjson.JSONDecodeError) as err:
+                raise RequestValidationError([{'type': 'value_error', 'loc': ('body',),
+                                               'msg': f'Invalid {content_type} body: {err}'}])
+            return Response(encode(await self._call_endpoint(dto_in), response_media_type),
+                            media_type=response_media_type)
+
+        return wire_route_handler
+
+    async def _call_endpoint(self, dto_in):
+        token = _raw_arrays.set(True)
+        try:
+            if inspect.iscoroutinefunction(self.endpoint):
+                return await self.endpoint(dto_in)
+            return await run_in_threadpool(contextvars.copy_context().run, self.endpoint, dto_in)
+        finally:
+            _raw_arrays.reset(token)
@@ -0,0 +1,87 @@
+import os
+import pickle
+import time
+
+from sklearn.linear_model import LinearRegression
+
+from . import main
+from .service import artifact_store
+from .service import model_registry
+from .test_fused_predictor import fit_pipeline
+from .test_model_registry import publish
+
+CONCURRENCY = 8
+
+
+def make_s3(s3_stand_in):
+    return artifact_store.make_s3_client(s3_stand_in.url, CONCURRENCY, region_name='us-east-1',
+                                         aws_access_key_id='stand-in', aws_secret_access_key='stand-in')
+
+
+# Copies every file under directory to the stand-in bucket, keyed by its path relative to directory
+def upload_directory(s3_stand_in, bucket_name, directory):
+    for parent, _, filenames in os.walk(directory):
+        for filename in filenames:
+            key = os.path.relpath(os.path.join(parent, filename), directory).replace(os.sep, '/')
+            with open(os.path.join(parent, filename), 'rb') as f:
+                s3_stand_in.objects[f'/{bucket_name}/{key}'] = f.read()
+
+
+def test_local_and_s3_stores_load_the_same_generation(s3_stand_in, tmp_path):
+    tickers = ['AAPL', 'META', 'NVDA']
+    generation = publish(str(tmp_path), {ticker: fit_pipeline(LinearRegression(), i)[:3]
+                                         for i, ticker in enumerate(tickers)})
+    upload_directory(s3_stand_in, 'models', str(tmp_path))
+
+    local_store = artifact_store.LocalArtifactStore(str(tmp_path))
+    s3_store = artifact_store.S3ArtifactStore(make_s3(s3_stand_in), 'models')
+    assert s3_store.list('generations/') == local_store.list('generations/')
+    assert model_registry.read_current_generation(s3_store) == generation
+
+    registries = [model_registry.ModelRegistry(store=store, load_concurrency=CONCURRENCY)
+                  for store in [local_store, s3_store]]
+    for registry in registries:
+        assert registry.refresh() is True
+        assert registry.active.generation == generation and sorted(registry.active.models) == tickers
+        # Bundles are loaded on demand
+        assert [registry.active.models[ticker] for ticker in tickers] and len(registry.cache) == 3
+        assert sorted(registry.load_metrics.artifact_seconds) == [f'generations/{generation}/{ticker}.pkl'
+                                                                   for ticker in tickers]
+        assert registry.load_metrics.summary()['artifacts'] == 3
+    assert (registries[0].active.models['META'].coef_ == registries[1].active.models['META'].coef_).all()
+
+
+def test_loads_artifacts_concurrently_over_one_pooled_client(s3_stand_in):
+    s3_stand_in.latency_seconds = 0.05
+    for i in range(24):
+        s3_stand_in.objects[f'/models/model/T{i:02d}.pkl'] = pickle.dumps(i)
+    store = artifact_store.S3ArtifactStore(make_s3(s3_stand_in), 'models')
+    metrics = artifact_store.LoadMetrics()
+
+    started_at = time.perf_counter()
+    values = artifact_store.load_artifacts(store, store.list('model/'), concurrency=CONCURRENCY, metrics=metrics)
+    seconds = time.perf_counter() - started_at
+
+    assert values == {f'model/T{i:02d}.pkl': i for i in range(24)}
+    # 24 requests of 50ms each would take 1.2s one at a time
+    assert seconds < 24 * s3_stand_in.latency_seconds / 2
+    assert 1 < s3_stand_in.max_in_flight <= CONCURRENCY
+    assert len(s3_stand_in.connections) <= CONCURRENCY
+    assert len(metrics.artifact_seconds) == 24 and min(metrics.artifact_seconds.values()) >= 0.05
+
+
+def test_legacy_layout_loads_from_s3(s3_stand_in, monkeypatch):
+    model, x_scaler, y_scaler = fit_pipeline(LinearRegression())[:3]
+    for directory, value in [('model', model), ('x_scaler', x_scaler), ('y_scaler', y_scaler)]:
+        s3_stand_in.objects[f'/models/trained/{directory}/AAPL.pkl'] = pickle.dumps(value)
+    store = artifact_store.S3ArtifactStore(make_s3(s3_stand_in), 'models', prefix='trained')
+    registry = model_registry.ModelRegistry(store=store, legacy_loader=main.load_all_pickle_files)
+    monkeypatch.setattr(main, 'MODEL_REGISTRY', registry)
+
+    assert registry.refresh() is True
+    assert registry.active.generation == model_registry.LEGACY_GENERATION and list(registry.active.models) == ['AAPL']
+    assert sorted(registry.load_metrics.artifact_seconds) == ['model/AAPL.pkl', 'x_scaler/AAPL.pkl',
+                                                              'y_scaler/AAPL.pkl']
+    body = main.get_model_load_metrics()
+    assert body['artifacts'] == 3 and body['total_seconds'] > 0
+    assert body['store'] == 'S3ArtifactStore(s3://models/trained/)'
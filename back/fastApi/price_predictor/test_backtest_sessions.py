@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+from . import main
+from .machine_learning import coefficient_bundle
+from .machine_learning import lag_features
+from .machine_learning import model_generations
+from .service import backtest_sessions
+from .service import model_registry
+from .test_fused_predictor import fit_pipeline, sklearn_predictions
+from .test_main import client, loaded_test_model, random_walk_prices, ticker_dto_json
+from .test_model_registry import publish
+
+
+def test_lag_ring_rows_match_the_lag_matrix():
+    prices = random_walk_prices(100)
+    ring = backtest_sessions.LagRing(prices[:main.FEATURE_COUNT])
+    rows = [ring.row().copy()]
+    for price in prices[main.FEATURE_COUNT:]:
+        ring.append(price)
+        rows.append(ring.row().copy())
+    np.testing.assert_array_equal(np.array(rows), lag_features.lag_matrix(prices, main.FEATURE_COUNT))
+
+
+def test_session_steps_match_per_window_backtests(loaded_test_model):
+    prices = random_walk_prices(80, seed=3)
+    window_size = 50
+    first_window = [str(price) for price in prices[:window_size]]
+    opened = client.post("/api/v1/predict/ticker/backtest/sessions",
+                         json={"tickerDTO": ticker_dto_json(), "prices": first_window})
+    body = opened.json()
+    assert body["error"] is None and body["step"] == 0
+    session_id = body["sessionId"]
+
+    steps = [body]
+    for price in prices[window_size:]:
+        steps.append(client.post("/api/v1/predict/ticker/backtest/sessions/step",
+                                 json={"sessionId": session_id, "price": str(price)}).json())
+    assert [step["step"] for step in steps] == list(range(len(prices) - window_size + 1))
+    for step in (0, 1, 17, len(prices) - window_size):
+        window = prices[step:step + window_size]
+        per_window = client.post("/api/v1/predict/ticker/backtest",
+                                 json={"tickerDTO": ticker_dto_json(), "predictions": [str(price) for price in window]})
+        np.testing.assert_allclose(np.array(steps[step]["predictions"], dtype=float),
+                                   np.array(per_window.json()["predictions"], dtype=float))
+
+    assert client.delete(f"/api/v1/predict/ticker/backtest/sessions/{session_id}").json()["closed"] is True
+    closed = client.post("/api/v1/predict/ticker/backtest/sessions/step",
+                         json={"sessionId": session_id, "price": "100.0"}).json()
+    assert closed["predictions"] == [] and "unknown or expired" in closed["error"]
+
+
+def test_sessions_expire_and_are_capped():
+    now = [0.0]
+    sessions = backtest_sessions.BacktestSessions(max_sessions=2, ttl_seconds=10, clock=lambda: now[0])
+
+    def session():
+        return backtest_sessions.BacktestSession(None, None, random_walk_prices(40), [0.0, 0.0], main.FEATURE_COUNT)
+
+    first = sessions.open(session())
+    now[0] = 5.0
+    second = sessions.open(session())
+    with pytest.raises(RuntimeError):
+        sessions.open(session())
+
+    # Each use postpones expiry
+    now[0] = 12.0
+    sessions.get(second)
+    with pytest.raises(LookupError):
+        sessions.get(first)
+    sessions.open(session())
+    assert len(sessions) == 2
+    assert sessions.stats() == {'open': 2, 'max_sessions': 2, 'ttl_seconds': 10, 'opened': 3, 'closed': 0,
+                                'expired': 1, 'refused': 1}
+
+
+def test_sessions_need_a_single_serving_worker(loaded_test_model, monkeypatch):
+    assert isinstance(backtest_sessions.for_serving_workers(1, 1000, 900), backtest_sessions.BacktestSessions)
+    assert backtest_sessions.for_serving_workers(1, 0, 900) is None
+    # With several workers, the step of a session opened by one worker could reach another
+    assert backtest_sessions.for_serving_workers(2, 1000, 900) is None
+
+    monkeypatch.setattr(main, 'SERVING_WORKERS', 2)
+    monkeypatch.setattr(main, 'BACKTEST_SESSIONS', None)
+    prices = [str(price) for price in random_walk_prices(50)]
+    opened = client.post("/api/v1/predict/ticker/backtest/sessions",
+                         json={"tickerDTO": ticker_dto_json(), "prices": prices}).json()
+    assert opened["sessionId"] is None and opened["predictions"] == [] and "WEB_CONCURRENCY=1" in opened["error"]
+    step = client.post("/api/v1/predict/ticker/backtest/sessions/step",
+                       json={"sessionId": "0" * 32, "price": "100.0"}).json()
+    assert step["predictions"] == [] and "WEB_CONCURRENCY=1" in step["error"]
+    assert client.delete(f"/api/v1/predict/ticker/backtest/sessions/{'0' * 32}").json()["closed"] is False
+    assert client.get("/api/v1/metrics").status_code == 200
+
+
+def test_sessions_outlive_the_generations_they_were_opened_with(tmp_path, monkeypatch):
+    pipelines = {'AAPL': fit_pipeline(LinearRegression(), 1)[:3], 'TREE': fit_pipeline(DecisionTreeRegressor(), 2)[:3]}
+    first = publish(str(tmp_path), pipelines)
+    coefficient_bundle.write_generation_bundle(model_generations.generation_directory(str(tmp_path), first))
+    registry = model_registry.ModelRegistry(str(tmp_path))
+    registry.refresh()
+    monkeypatch.setattr(main, 'MODEL_REGISTRY', registry)
+
+    prices = random_walk_prices(60, seed=4)
+    session_ids = {}
+    for ticker in pipelines:
+        opened = client.post("/api/v1/predict/ticker/backtest/sessions",
+                             json={"tickerDTO": ticker_dto_json(ticker), "prices": [str(p) for p in prices[:-1]]})
+        session_ids[ticker] = opened.json()["sessionId"]
+
+    # Newer generations are published until the sessions' generation is removed
+    for seed in range(model_generations.GENERATIONS_TO_KEEP):
+        publish(str(tmp_path), {'AAPL': fit_pipeline(LinearRegression(), seed)[:3]}, retention_seconds=0)
+        registry.refresh()
+    assert not os.path.isdir(model_generations.generation_directory(str(tmp_path), first))
+
+    x_values = lag_features.lag_matrix(prices[1:], main.FEATURE_COUNT)
+    for ticker, session_id in session_ids.items():
+        step = client.post("/api/v1/predict/ticker/backtest/sessions/step",
+                           json={"sessionId": session_id, "price": str(prices[-1])}).json()
+        assert step["error"] is None and step["step"] == 1
+        np.testing.assert_allclose(np.array(step["predictions"], dtype=float),
+                                   sklearn_predictions(*pipelines[ticker], x_values), rtol=1e-9)
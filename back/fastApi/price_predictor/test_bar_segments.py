@@ -0,0 +1,89 @@
+import gzip
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from .machine_learning import bar_segments
+from .machine_learning import Price_Predictor_Notebook_Local as ml
+
+DAY_MS = 24 * 60 * 60 * 1000
+START_MS = 1722000000000
+
+
+def make_bars(first, count):
+    i = np.arange(first, first + count)
+    vwap = 100.0 + i * 0.25
+    return pd.DataFrame({'open': vwap, 'high': vwap + 1, 'low': vwap - 1, 'close': vwap, 'volume': 1000.0,
+                         'vwap': vwap, 'timestamp': START_MS + i * 600000, 'transactions': 10, 'otc': None})
+
+
+def test_appends_only_new_bars_as_gzip_members(tmp_path):
+    store = bar_segments.LocalSegmentStore(str(tmp_path))
+
+    assert bar_segments.append_bars(store, 'AAA', make_bars(0, 100), None)[0] == 100
+    first_size = os.path.getsize(tmp_path / 'AAA' / bar_segments.segment_name(store.days('AAA')[-1]))
+    # Overlapping window: only the 5 bars newer than the last stored one are appended
+    rows, appended_bytes = bar_segments.append_bars(store, 'AAA', make_bars(50, 55),
+                                                    bar_segments.latest_timestamp(store, 'AAA'))
+    assert rows == 5
+
+    last_day = tmp_path / 'AAA' / bar_segments.segment_name(store.days('AAA')[-1])
+    assert os.path.getsize(last_day) == first_size + appended_bytes
+    bars = bar_segments.read_bars(store, 'AAA')
+    with open(last_day, 'rb') as f:
+        # Concatenated members decompress as one stream
+        assert len(gzip.decompress(f.read()).splitlines()) == (bars['timestamp'].map(bar_segments.day_of)
+                                                               == store.days('AAA')[-1]).sum()
+    assert list(bars.columns) == bar_segments.COLUMNS
+    np.testing.assert_array_equal(bars['vwap'], make_bars(0, 105)['vwap'])
+    assert bar_segments.latest_timestamp(store, 'AAA') == START_MS + 104 * 600000
+
+
+def test_read_bars_stitches_newest_days_and_drops_duplicates(tmp_path):
+    store = bar_segments.LocalSegmentStore(str(tmp_path))
+    bars = make_bars(0, 500)  # 83 hours from 13:20 UTC, over 5 days
+    bar_segments.append_bars(store, 'AAA', bars, None)
+    # A bar stored twice, e.g. by two overlapping runs
+    store.append('AAA', bar_segments.day_of(bars['timestamp'].iloc[-1]), bar_segments.encode_bars(bars[-1:]))
+
+    assert len(store.days('AAA')) == 5 and store.tickers() == ['AAA']
+    tail = bar_segments.read_bars(store, 'AAA', rows=200)
+    np.testing.assert_array_equal(tail['timestamp'], bars['timestamp'][-200:])
+    assert bar_segments.read_bars(store, 'BBB').empty
+
+
+def test_segments_read_after_a_partial_write_are_complete(tmp_path, monkeypatch):
+    store = bar_segments.LocalSegmentStore(str(tmp_path))
+    bars = make_bars(0, 10)
+    bar_segments.append_bars(store, 'AAA', bars, None)
+    day = store.days('AAA')[-1]
+    segment = store.read('AAA', day)
+
+    # Ingestion dies after writing half of the next member
+    def killed(*args):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(bar_segments.os, 'replace', killed)
+    member = bar_segments.encode_bars(make_bars(10, 5))
+    with pytest.raises(KeyboardInterrupt):
+        store.append('AAA', day, member[:len(member) // 2])
+    monkeypatch.undo()
+
+    assert store.read('AAA', day) == segment and store.days('AAA') == [day]
+    np.testing.assert_array_equal(bar_segments.read_bars(store, 'AAA')['vwap'], bars['vwap'])
+    # The next run appends after the complete members only
+    bar_segments.append_bars(store, 'AAA', make_bars(0, 15), bar_segments.latest_timestamp(store, 'AAA'))
+    np.testing.assert_array_equal(bar_segments.read_bars(store, 'AAA')['vwap'], make_bars(0, 15)['vwap'])
+
+
+def test_pipeline_loads_segments_like_json(tmp_path):
+    bars = make_bars(0, 900)
+    bars.to_json(tmp_path / 'AAA.json', orient='split')
+    segments_directory = str(tmp_path / 'segments')
+    bar_segments.append_bars(bar_segments.LocalSegmentStore(segments_directory), 'AAA', bars, None)
+
+    from_json = ml.read_ticker_window(str(tmp_path), 'AAA.json')
+    from_segments = ml.read_ticker_window(segments_directory, 'AAA')
+    pd.testing.assert_frame_equal(from_segments.reset_index(drop=True), from_json.reset_index(drop=True),
+                                  check_dtype=False)
@@ -0,0 +1,54 @@
+import numpy as np
+from sklearn.linear_model import ElasticNet, LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+from .machine_learning import coefficient_bundle
+from .machine_learning import fused_predictor
+from .machine_learning import model_generations
+from .service import model_registry
+from .test_fused_predictor import fit_pipeline, sklearn_predictions
+from .test_model_registry import publish
+
+
+def test_bundle_round_trips_linear_pipelines_as_mapped_rows(tmp_path):
+    pipelines = {'AAPL': fit_pipeline(LinearRegression(), 1), 'META': fit_pipeline(ElasticNet(alpha=0.2), 2),
+                 'TREE': fit_pipeline(DecisionTreeRegressor(max_depth=3), 3)}
+    path = str(tmp_path / coefficient_bundle.FILENAME)
+
+    written = coefficient_bundle.write_bundle(path, {ticker: pipeline[:3] for ticker, pipeline in pipelines.items()})
+    assert written == ['AAPL', 'META']
+
+    bundle = coefficient_bundle.CoefficientBundle.open(path)
+    assert bundle.tickers == ['AAPL', 'META'] and 'TREE' not in bundle and bundle.feature_count == 39
+    for ticker in written:
+        model, x_scaler, y_scaler, x_values = pipelines[ticker]
+        row = bundle.row(ticker)
+        parameters = fused_predictor.linear_pipeline_parameters(model, x_scaler, y_scaler)
+        for name in ['coef', 'x_center', 'x_scale', 'intercept', 'y_center', 'y_scale']:
+            np.testing.assert_array_equal(row[name], parameters[name])
+        # Row views point into the mapped file
+        assert np.shares_memory(row['coef'], bundle.arrays['coef']) and not row['coef'].flags.writeable
+        np.testing.assert_allclose(bundle.fused_predictor(ticker).predict(x_values),
+                                   sklearn_predictions(model, x_scaler, y_scaler, x_values), rtol=1e-9)
+
+    # An empty universe still makes a valid bundle
+    coefficient_bundle.write_bundle(path, {})
+    assert len(coefficient_bundle.CoefficientBundle.open(path)) == 0
+
+
+def test_registry_predicts_from_bundle_without_unpickling(tmp_path):
+    pipelines = {'AAPL': fit_pipeline(LinearRegression(), 1), 'TREE': fit_pipeline(DecisionTreeRegressor(), 2)}
+    generation = publish(str(tmp_path), {ticker: pipeline[:3] for ticker, pipeline in pipelines.items()})
+    directory = model_generations.generation_directory(str(tmp_path), generation)
+    assert coefficient_bundle.write_generation_bundle(directory) == ['AAPL']
+    registry = model_registry.ModelRegistry(str(tmp_path))
+    registry.refresh()
+
+    model_set = registry.active
+    assert 'AAPL' in model_set.fused_predictors and len(registry.cache) == 0
+    model, x_scaler, y_scaler, x_values = pipelines['AAPL']
+    np.testing.assert_allclose(model_set.fused_predictors['AAPL'].predict(x_values),
+                               sklearn_predictions(model, x_scaler, y_scaler, x_values), rtol=1e-9)
+    # Non-linear tickers are still loaded from their pickled bundle
+    assert 'TREE' not in model_set.fused_predictors and len(registry.cache) == 1
+    assert f'generations/{generation}/{coefficient_bundle.FILENAME}' in registry.load_metrics.artifact_seconds
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import ElasticNet, LinearRegression
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.preprocessing import RobustScaler
+
+from .machine_learning import fused_predictor
+from .machine_learning import lag_features
+from .service import stacked_predictor
+
+FEATURE_COUNT = 39
+
+
+def fit_pipeline(model, seed=0):
+    prices = 100 + np.cumsum(np.random.default_rng(seed).normal(0, 0.5, 400))
+    x_values = lag_features.lag_matrix(prices[:-1], FEATURE_COUNT)
+    y_values = prices[FEATURE_COUNT:].reshape(-1, 1)
+    x_scaler = RobustScaler().fit(x_values)
+    y_scaler = RobustScaler().fit(y_values)
+    model.fit(x_scaler.transform(x_values), y_scaler.transform(y_values).ravel())
+    return model, x_scaler, y_scaler, x_values
+
+
+def sklearn_predictions(model, x_scaler, y_scaler, x_values):
+    return y_scaler.inverse_transform(model.predict(x_scaler.transform(x_values)).reshape(-1, 1)).flatten()
+
+
+@pytest.mark.parametrize('model', [LinearRegression(), ElasticNet(alpha=0.2, l1_ratio=0.2)])
+def test_fused_predictor_matches_sklearn_pipeline(model):
+    model, x_scaler, y_scaler, x_values = fit_pipeline(model)
+    fused = fused_predictor.compile_verified_pipeline(model, x_scaler, y_scaler)
+    np.testing.assert_allclose(fused.predict(x_values), sklearn_predictions(model, x_scaler, y_scaler, x_values))
+
+
+def test_fused_predictor_prunes_zero_elastic_net_coefficients():
+    model, x_scaler, y_scaler, x_values = fit_pipeline(ElasticNet(alpha=0.2, l1_ratio=0.2))
+    fused = fused_predictor.compile_pipeline(model, x_scaler, y_scaler)
+    assert np.count_nonzero(model.coef_) < FEATURE_COUNT
+    assert len(fused.pruned_weights) == np.count_nonzero(model.coef_)
+    np.testing.assert_array_equal(fused.feature_index, np.flatnonzero(model.coef_))
+
+
+def test_non_linear_models_are_not_fused():
+    model, x_scaler, y_scaler, _ = fit_pipeline(KNeighborsRegressor())
+    assert fused_predictor.compile_verified_pipeline(model, x_scaler, y_scaler) is None
+
+
+def test_verify_rejects_mismatching_fused_predictor():
+    model, x_scaler, y_scaler, _ = fit_pipeline(LinearRegression())
+    fused = fused_predictor.compile_pipeline(model, x_scaler, y_scaler)
+    fused.bias += 1
+    with pytest.raises(ValueError):
+        fused_predictor.verify(fused, model, x_scaler, y_scaler)
+
+
+def test_predict_stacked_matches_each_ticker():
+    pipelines = [fit_pipeline(LinearRegression(), seed) for seed in range(3)]
+    fused = [fused_predictor.compile_pipeline(*pipeline[:3]) for pipeline in pipelines]
+    x_values = np.stack([pipeline[3][-FEATURE_COUNT:] for pipeline in pipelines])
+    y_pred = stacked_predictor.predict_stacked(x_values, fused)
+    for ticker, pipeline in enumerate(pipelines):
+        np.testing.assert_allclose(y_pred[ticker], sklearn_predictions(*pipeline[:3], x_values[ticker]))
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.linear_model import ElasticNet
+
+from .machine_learning import incremental_training
+from .machine_learning import lag_features
+from .machine_learning import ticker_tensor
+from .machine_learning import Price_Predictor_Notebook_Local as ml
+
+WINDOW = 400
+FUTURE_WINDOW = ml.FUTURE_DATAPOINTS_QUANTITY
+
+
+def random_walk(bars, seed=0):
+    rng = np.random.default_rng(seed)
+    vwap = 100 + np.cumsum(rng.normal(0, 1, bars))
+    return vwap, vwap + rng.normal(0, 0.2, bars)
+
+
+def train(state_path, vwap, close):
+    return incremental_training.train_ticker(state_path, vwap, close, ml.models, FUTURE_WINDOW, ml.FEATURES, ml.LABEL)
+
+
+# Lagged train rows of a window and their RobustScaler center and scale, like train_test_split_scale
+def train_split(vwap, close):
+    x = lag_features.lag_matrix(vwap, FUTURE_WINDOW)[:-2 * FUTURE_WINDOW]
+    y = close[FUTURE_WINDOW - 1:][:-2 * FUTURE_WINDOW]
+    (x_center, x_scale), (y_center, y_scale) = [
+        tuple(array[0] for array in ticker_tensor.robust_center_and_scale(rows[np.newaxis]))
+        for rows in (x, y[:, np.newaxis])]
+    return x, y, x_center, x_scale, y_center[0], y_scale[0]
+
+
+def test_sliding_window_updates_match_sklearn_fits(tmp_path):
+    vwap, close = random_walk(WINDOW + 30)
+    state_path = str(tmp_path / 'AAA.pkl')
+
+    results = [train(state_path, vwap[start:start + WINDOW], close[start:start + WINDOW]) for start in [0, 1, 5, 30]]
+    assert [result['rebuilt'] for result in results] == [True, False, False, False]
+
+    # The updated sums are the sums of the last window's train rows
+    x, y, x_center, x_scale, y_center, y_scale = train_split(vwap[30:], close[30:])
+    rebuilt = incremental_training.SufficientStatistics(FUTURE_WINDOW, shift=vwap[30])
+    rebuilt.update(x, y)
+    updated = incremental_training.SufficientStatistics.from_arrays(incremental_training.read_state(state_path))
+    assert updated.count == rebuilt.count == len(x)
+    for updated_array, rebuilt_array in zip(updated.centered_scaled(x_scale, y_scale),
+                                            rebuilt.centered_scaled(x_scale, y_scale)):
+        np.testing.assert_allclose(updated_array, rebuilt_array, rtol=1e-8, atol=1e-8)
+
+    # Models solved from the sums predict like sklearn's fits on the scaled rows
+    x_scaled, y_scaled = (x - x_center) / x_scale, (y - y_center) / y_scale
+    solved, _ = incremental_training.fit_models(updated, x_center, x_scale, y_center, y_scale, ml.models)
+    for model, incremental in zip(ml.models, solved):
+        fitted = clone(model).fit(x_scaled, y_scaled)
+        tolerance = 1e-3 if isinstance(model, ElasticNet) else 1e-8
+        np.testing.assert_allclose(incremental.predict(x_scaled), fitted.predict(x_scaled), atol=tolerance)
+
+
+def test_window_that_does_not_continue_is_rebuilt(tmp_path):
+    vwap, close = random_walk(WINDOW + 10)
+    state_path = str(tmp_path / 'AAA.pkl')
+    train(state_path, vwap[:WINDOW], close[:WINDOW])
+
+    rewritten = vwap[10:].copy()
+    rewritten[50] += 1.0
+    assert train(state_path, rewritten, close[10:])['rebuilt']
+    # Unchanged window
+    assert not train(state_path, rewritten, close[10:])['rebuilt']
+    # Longer window
+    assert train(state_path, vwap, close)['rebuilt']
+
+
+def test_incremental_mode_matches_full_training(tmp_path, monkeypatch):
+    monkeypatch.setattr(ml, 'TRAINED_FILES_DIRECTORY', str(tmp_path))
+    frames = []
+    for seed, ticker in enumerate(['AAA', 'BBB']):
+        vwap, close = random_walk(WINDOW, seed)
+        index = pd.MultiIndex.from_product([[ticker], pd.RangeIndex(WINDOW)], names=['ticker', None])
+        frames.append(pd.DataFrame({'close': close, 'vwap': vwap}, index=index))
+    df_raw = pd.concat(frames)
+
+    df = ml.add_lagged_features(df_raw, ml.LABEL, ml.FEATURES, FUTURE_WINDOW)
+    ml.all_models_train_and_evaluate(ml.models, *ml.train_test_split_scale(df, ml.FEATURES, ml.LABEL, FUTURE_WINDOW),
+                                     generation_directory=None, workers=1)
+    full = dict(ml.predictions_close_price_dictionary), dict(ml.trained_models)
+
+    ml.incremental_train_and_evaluate(ml.models, df_raw)
+    assert ml.training_errors == {}
+    for ticker in ['AAA', 'BBB']:
+        assert type(ml.trained_models[ticker]) is type(full[1][ticker])
+        np.testing.assert_allclose(ml.predictions_close_price_dictionary[ticker], full[0][ticker], atol=0.011)
+        assert (tmp_path / 'sufficient_statistics' / f'{ticker}.pkl').exists()
+        assert (tmp_path / 'model' / f'{ticker}.pkl').exists()
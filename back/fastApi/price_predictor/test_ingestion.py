@@ -0,0 +1,134 @@
+import io
+import time
+
+import pandas as pd
+import pytest
+
+from .service import get_data
+from .service import ingestion
+from .machine_learning import bar_segments
+
+CONCURRENCY = 8
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clients(polygon_stand_in, s3_stand_in, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'stand-in')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'stand-in')
+    monkeypatch.delenv('AWS_SESSION_TOKEN', raising=False)
+    client = get_data.make_polygon_client(api_key='stand-in', base=polygon_stand_in.url, concurrency=CONCURRENCY)
+    s3 = get_data.make_s3_client(endpoint_url=s3_stand_in.url, concurrency=CONCURRENCY, region_name='us-east-1')
+    return client, s3
+
+
+def ingest(tickers, clients, **kwargs):
+    client, s3 = clients
+    kwargs = dict(dict(concurrency=CONCURRENCY, requests_per_second=1000, backoff_seconds=0.01,
+                       ingestion_format='json', segments_directory=''), **kwargs)
+    return get_data.get_data(tickers, client=client, s3=s3, bucket_name='stocks', output_directory='', **kwargs)
+
+
+def test_token_bucket_limits_rate_after_burst():
+    clock = FakeClock()
+    bucket = ingestion.TokenBucket(rate=5, capacity=2, clock=clock, sleep=clock.sleep)
+
+    waits = [bucket.acquire() for _ in range(6)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2:] == pytest.approx([0.2] * 4)
+    assert clock.now == pytest.approx(0.8)
+
+
+def test_call_with_retries_backs_off_then_raises():
+    attempts, delays = [], []
+
+    def flaky():
+        attempts.append(1)
+        raise ConnectionError('reset')
+
+    with pytest.raises(ConnectionError):
+        ingestion.call_with_retries(flaky, retries=3, backoff_seconds=1, sleep=delays.append)
+    assert len(attempts) == 4
+    # Doubling delays, jittered down by up to half
+    assert all(base / 2 <= delay <= base for delay, base in zip(delays, [1, 2, 4])) and len(delays) == 3
+
+
+def test_ingests_concurrently_over_pooled_connections(polygon_stand_in, s3_stand_in, clients):
+    polygon_stand_in.latency_seconds = 0.05
+    tickers = [f'T{i:02d}' for i in range(48)]
+
+    started_at = time.perf_counter()
+    result = ingest(tickers, clients)
+    seconds = time.perf_counter() - started_at
+
+    assert result['succeeded'] == tickers and result['failed'] == {}
+    # 48 requests of 50ms each would take 2.4s one at a time
+    assert seconds < 48 * polygon_stand_in.latency_seconds / 2
+    assert 1 < polygon_stand_in.max_in_flight <= CONCURRENCY
+    # Connections are kept alive and reused by the workers
+    assert len(polygon_stand_in.connections) <= CONCURRENCY
+    assert len(s3_stand_in.connections) <= CONCURRENCY
+
+    assert sorted(s3_stand_in.objects) == [f'/stocks/{ticker}.json' for ticker in tickers]
+    df = pd.read_json(io.BytesIO(s3_stand_in.objects['/stocks/T07.json']), orient='split')
+    assert len(df) == polygon_stand_in.bars and list(df['vwap'])[:2] == [100.2, 101.2]
+
+
+def test_retries_failed_requests_and_reports_failed_tickers(polygon_stand_in, s3_stand_in, clients):
+    # The polygon client itself retries HTTP 500 three times, so 5 failures need a second ingestion attempt
+    polygon_stand_in.failures = {'FLAKY': 5, 'DOWN': 1000}
+
+    result = ingest(['OK', 'FLAKY', 'DOWN'], clients, retries=1)
+
+    assert result['succeeded'] == ['FLAKY', 'OK']
+    assert list(result['failed']) == ['DOWN']
+    assert polygon_stand_in.attempts['FLAKY'] == 6
+    assert '/stocks/DOWN.json' not in s3_stand_in.objects and '/stocks/FLAKY.json' in s3_stand_in.objects
+
+
+def test_requests_stay_within_rate_limit(polygon_stand_in, clients, monkeypatch):
+    monkeypatch.setattr(get_data, 'POLYGON_REQUEST_BURST', 1)
+
+    started_at = time.perf_counter()
+    result = ingest([f'T{i}' for i in range(6)], clients, requests_per_second=20)
+
+    assert len(result['succeeded']) == 6
+    # One request at once, then one every 50ms
+    assert time.perf_counter() - started_at >= 5 / 20 * 0.9
+
+
+def test_segments_only_receive_new_bars(polygon_stand_in, s3_stand_in, clients, tmp_path, monkeypatch):
+    monkeypatch.setattr(get_data, 'last_stored_timestamps', {})
+    segments_directory = str(tmp_path / 'segments')
+    polygon_stand_in.bars = 150  # 25 hours of bars, spanning two UTC days
+
+    ingest(['AAA'], clients, ingestion_format='segments', segments_directory=segments_directory)
+    first_objects = dict(s3_stand_in.objects)
+    assert sorted(first_objects) == ['/stocks/bars/AAA/2024-07-26.jsonl.gz', '/stocks/bars/AAA/2024-07-27.jsonl.gz']
+
+    # Next run: the provider returns an overlapping window with 3 new bars
+    polygon_stand_in.first_bar = 3
+    monkeypatch.setattr(get_data, 'last_stored_timestamps', {})  # a new process reads the last timestamp back
+    puts_before = sum(method == 'PUT' for method, _ in s3_stand_in.requests)
+    ingest(['AAA'], clients, ingestion_format='segments', segments_directory=segments_directory)
+    puts = [path for method, path in s3_stand_in.requests[len(s3_stand_in.requests) - 10:] if method == 'PUT']
+    assert sum(method == 'PUT' for method, _ in s3_stand_in.requests) - puts_before == 1
+    assert puts == ['/stocks/bars/AAA/2024-07-27.jsonl.gz']
+    assert s3_stand_in.objects[puts[0]].startswith(first_objects[puts[0]])
+
+    stores = [bar_segments.S3SegmentStore(clients[1], 'stocks'), bar_segments.LocalSegmentStore(segments_directory)]
+    for store in stores:
+        bars = bar_segments.read_bars(store, 'AAA')
+        assert len(bars) == 153 and bars['timestamp'].is_monotonic_increasing and bars['timestamp'].is_unique
+        assert list(bars['vwap'][-2:]) == [100.2 + 151, 100.2 + 152]
+        assert len(bar_segments.read_bars(store, 'AAA', rows=20)) == 20
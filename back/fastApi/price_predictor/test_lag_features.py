@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from .machine_learning import lag_features
+
+FUTURE_WINDOW = 39
+
+
+# DataFrame.shift based lag features that lag_features replaced
+def pandas_lagged_features(df, feature, future_window):
+    df = df.copy()
+    for lag_count in range(1, future_window):
+        df[f'lag_{feature}_{lag_count}'] = df[feature].shift(lag_count)
+    df.dropna(inplace=True)
+    return df
+
+
+def test_lag_matrix_matches_pandas_shift():
+    prices = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.5, 78))
+    df_expected = pandas_lagged_features(pd.DataFrame(prices, columns=['vwap']), 'vwap', FUTURE_WINDOW)
+
+    lags = lag_features.lag_matrix(prices, FUTURE_WINDOW)
+    assert lags.shape == (78 - FUTURE_WINDOW + 1, FUTURE_WINDOW)
+    assert np.shares_memory(lags, prices)
+    np.testing.assert_array_equal(lags, df_expected.values)
+    assert lag_features.lag_feature_names('vwap', FUTURE_WINDOW) == list(df_expected.columns)
+
+
+def test_lag_matrix_stacks_tickers_and_handles_short_series():
+    prices = np.random.default_rng(1).normal(100, 1, (3, 77))
+    stacked = lag_features.lag_matrix(prices, FUTURE_WINDOW)
+    assert stacked.shape == (3, FUTURE_WINDOW, FUTURE_WINDOW)
+    np.testing.assert_array_equal(stacked[2], lag_features.lag_matrix(prices[2], FUTURE_WINDOW))
+    assert lag_features.lag_matrix(prices[0, :10], FUTURE_WINDOW).shape == (0, FUTURE_WINDOW)
+
+
+def test_lagged_frame_matches_pandas_shift():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({'close': rng.normal(100, 1, 120), 'vwap': rng.normal(100, 1, 120)},
+                      index=pd.Index(range(500, 620), name='index'))
+    df.loc[560, 'vwap'] = np.nan
+
+    pd.testing.assert_frame_equal(lag_features.lagged_frame(df, 'vwap', FUTURE_WINDOW),
+                                  pandas_lagged_features(df, 'vwap', FUTURE_WINDOW))
@@ -0,0 +1,80 @@
+import subprocess
+import sys
+import threading
+import types
+
+from . import main
+from .service import leader_election
+
+HOLD_LOCK = '''
+import fcntl, sys, time
+file = open(sys.argv[1], "a+")
+fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+print("locked", flush=True)
+time.sleep(60)
+'''
+
+
+def test_one_leader_until_it_releases(tmp_path):
+    path = str(tmp_path / 'scheduler.lock')
+    first, second = leader_election.FileLeaderLock(path), leader_election.FileLeaderLock(path)
+
+    assert first.try_acquire() is True and first.try_acquire() is True
+    assert second.try_acquire() is False and not second.is_leader
+    first.release()
+    assert second.try_acquire() is True and second.is_leader and not first.is_leader
+    second.release()
+
+
+def test_leadership_is_taken_over_when_the_leader_process_dies(tmp_path):
+    path = str(tmp_path / 'scheduler.lock')
+    leader = subprocess.Popen([sys.executable, '-c', HOLD_LOCK, path], stdout=subprocess.PIPE, text=True)
+    try:
+        assert leader.stdout.readline().strip() == 'locked'
+        lock = leader_election.FileLeaderLock(path)
+        assert lock.try_acquire() is False
+    finally:
+        leader.kill()
+        leader.wait()
+    assert lock.try_acquire() is True
+    lock.release()
+
+
+def test_only_the_leader_triggers_training(tmp_path, monkeypatch):
+    path = str(tmp_path / 'scheduler.lock')
+    triggers = []
+    monkeypatch.setattr(main.TRAINING_WORKER, 'trigger', lambda: triggers.append(1))
+    other_worker = leader_election.FileLeaderLock(path)
+    other_worker.try_acquire()
+    monkeypatch.setattr(main, 'SCHEDULER_LEADER', leader_election.FileLeaderLock(path))
+
+    assert main.trigger_training() is False and triggers == []
+    other_worker.release()
+    assert main.trigger_training() is True and triggers == [1]
+    assert main.get().scheduler_leader is True
+    main.SCHEDULER_LEADER.release()
+
+
+def test_leader_serves_json_and_defers_training_while_converting(tmp_path, monkeypatch):
+    converting = threading.Event()
+    monkeypatch.setattr(main.price_store, 'convert_directory', lambda source, store: converting.wait(60) and [])
+    triggers = []
+    monkeypatch.setattr(main.TRAINING_WORKER, 'trigger', lambda: triggers.append(1))
+    monkeypatch.setattr(main, 'SCHEDULER_LEADER', leader_election.FileLeaderLock(str(tmp_path / 'scheduler.lock')))
+    monkeypatch.setattr(main, 'PRICE_STORE_CONVERSION', None)
+    monkeypatch.setattr(main, 'PRICE_STORE_DIRECTORY', str(tmp_path / 'store'))
+    monkeypatch.setattr(main, 'BackgroundScheduler', lambda logger: types.SimpleNamespace(
+        add_job=lambda *args, **kwargs: None, start=lambda: None))
+    try:
+        main.startup_event()
+        assert main.PRICE_STORE_CONVERSION.is_alive()
+        # Prices are read from the JSON files meanwhile
+        assert len(main.read_latest_ticker_prices('AAPL')) == 2 * main.FEATURE_COUNT - 1
+        assert main.trigger_training() is False and triggers == []
+
+        converting.set()
+        main.PRICE_STORE_CONVERSION.join(timeout=60)
+        assert main.trigger_training() is True and triggers == [1]
+    finally:
+        converting.set()
+        main.SCHEDULER_LEADER.release()
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from .machine_learning import loader_cache
+from .machine_learning import price_store
+from .machine_learning import Price_Predictor_Notebook_Local as ml
+
+ROWS = 900
+
+
+def write_ticker_json(directory, ticker, seed):
+    rng = np.random.default_rng(seed)
+    vwap = (100 + np.cumsum(rng.normal(0, 0.5, ROWS))).round(4)
+    df = pd.DataFrame({'open': vwap, 'high': vwap + 1, 'low': vwap - 1, 'close': vwap, 'volume': 1000.0,
+                       'vwap': vwap, 'timestamp': np.arange(ROWS) * 600000, 'transactions': 10, 'otc': None})
+    path = os.path.join(directory, f'{ticker}.json')
+    df.to_json(path, orient='split')
+    return path
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = loader_cache.LoaderCache()
+    monkeypatch.setattr(ml, 'LOADER_CACHE', cache)
+    return cache
+
+
+def test_only_changed_files_are_reparsed(tmp_path, fresh_cache):
+    paths = [write_ticker_json(tmp_path, ticker, seed) for seed, ticker in enumerate(['AAA', 'BBB', 'CCC'])]
+    first = ml.json_to_dataframes(str(tmp_path))
+    assert (fresh_cache.reused, fresh_cache.reloaded) == (0, 3)
+    assert sorted(first.index.get_level_values('ticker').unique()) == ['AAA', 'BBB', 'CCC']
+
+    pd.testing.assert_frame_equal(ml.json_to_dataframes(str(tmp_path)), first)
+    assert (fresh_cache.reused, fresh_cache.reloaded) == (3, 0)
+
+    # Rewritten with identical content: new mtime, same hash
+    os.utime(paths[0], ns=(1, 1))
+    write_ticker_json(tmp_path, 'BBB', 1)
+    pd.testing.assert_frame_equal(ml.json_to_dataframes(str(tmp_path)), first)
+    assert (fresh_cache.reused, fresh_cache.reloaded) == (3, 0)
+
+    write_ticker_json(tmp_path, 'CCC', 99)
+    os.remove(paths[0])
+    changed = ml.json_to_dataframes(str(tmp_path))
+    assert (fresh_cache.reused, fresh_cache.reloaded) == (1, 1) and len(fresh_cache) == 2
+    pd.testing.assert_frame_equal(changed.loc[['BBB']], first.loc[['BBB']])
+    assert not np.array_equal(changed.loc['CCC', 'vwap'].to_numpy(), first.loc['CCC', 'vwap'].to_numpy())
+
+
+def test_price_store_tickers_are_cached_by_directory(tmp_path, fresh_cache):
+    source_directory, store_directory = tmp_path / 'json', tmp_path / 'store'
+    source_directory.mkdir()
+    write_ticker_json(source_directory, 'AAA', 0)
+    price_store.convert_directory(str(source_directory), str(store_directory))
+    first = ml.json_to_dataframes(str(store_directory))
+    ml.json_to_dataframes(str(store_directory))
+    assert (fresh_cache.reused, fresh_cache.reloaded) == (1, 0)
+
+    path = write_ticker_json(source_directory, 'AAA', 5)
+    os.utime(path, ns=(2, 2))
+    price_store.convert_directory(str(source_directory), str(store_directory))
+    changed = ml.json_to_dataframes(str(store_directory))
+    assert (fresh_cache.reused, fresh_cache.reloaded) == (0, 1)
+    assert not changed.equals(first)
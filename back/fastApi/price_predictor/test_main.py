@@ -1,18 +1,127 @@
 import os
 
+import numpy as np
+import pytest
 from dotenv import load_dotenv
 from fastapi.testclient import TestClient
-from main import app
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import RobustScaler
+
+from . import main
+from .main import app
+from .machine_learning import lag_features
 
 load_dotenv()
-BACK_FASTAPI_URL = os.getenv('BACK_FASTAPI_URL')
+BACK_FASTAPI_URL = os.getenv('BACK_FASTAPI_URL', 'http://testserver')
 
 client = TestClient(app, base_url=BACK_FASTAPI_URL)
 
+TEST_TICKER = 'TEST'
+
+
+def random_walk_prices(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 + np.cumsum(rng.normal(0, 0.5, count))
+
+
+# Makes one ticker's trained files available for predictions, alongside the active generation's models
+def activate_pipeline(ticker_name, model, x_scaler, y_scaler):
+    main.MODEL_REGISTRY.activate(main.MODEL_REGISTRY.active.with_pipelines({ticker_name: (model, x_scaler, y_scaler)}))
+
+
+def load_test_model(ticker_name, seed=0):
+    # Fit a small model + scalers the same way the ML pipeline does, then load it for serving.
+    x_values = lag_features.lag_matrix(random_walk_prices(300, seed), main.FEATURE_COUNT)
+    y_values = x_values[:, 0] + 0.1
+    x_scaler = RobustScaler().fit(x_values)
+    y_scaler = RobustScaler().fit(y_values.reshape(-1, 1))
+    model = LinearRegression().fit(x_scaler.transform(x_values), y_scaler.transform(y_values.reshape(-1, 1)).ravel())
+    activate_pipeline(ticker_name, model, x_scaler, y_scaler)
+
+
+def unload_test_model(ticker_name):
+    main.MODEL_REGISTRY.activate(main.MODEL_REGISTRY.active.without([ticker_name]))
+
+
+@pytest.fixture
+def loaded_test_model():
+    load_test_model(TEST_TICKER)
+    yield
+    unload_test_model(TEST_TICKER)
+
+
+@pytest.fixture
+def loaded_sample_data_models():
+    # Tickers with prices in sample_local_data
+    for seed, ticker_name in enumerate(['AAPL', 'META', 'NVDA']):
+        load_test_model(ticker_name, seed)
+    yield
+    for ticker_name in ['AAPL', 'META', 'NVDA']:
+        unload_test_model(ticker_name)
+
+
+def ticker_dto_json(ticker_name=TEST_TICKER):
+    return {"tickerType": "STOCKS", "tickerName": ticker_name, "portfolioType": "AGGRESSIVE"}
+
 
 def test_redirect_to_documentation():
     response = client.get("/")
     assert response.status_code == 200
     assert response.url.path.endswith("/documentation")
 
-# todo: alvin: add test cases
+
+def test_rolling_backtest_matches_per_step_backtest(loaded_test_model):
+    prices = random_walk_prices(120, seed=1)
+    window_size = 2 * main.FEATURE_COUNT - 1
+    response = client.post("/api/v1/predict/ticker/backtest/rolling",
+                           json={"tickerDTO": ticker_dto_json(), "prices": [str(price) for price in prices]})
+    body = response.json()
+    assert response.status_code == 200
+    assert body["steps"] == list(range(len(prices) - window_size + 1))
+
+    for step in (0, 17, len(prices) - window_size):
+        window = prices[step:step + window_size]
+        per_step = client.post("/api/v1/predict/ticker/backtest",
+                               json={"tickerDTO": ticker_dto_json(), "predictions": [str(price) for price in window]})
+        np.testing.assert_allclose(np.array(body["predictions"][step], dtype=float),
+                                   np.array(per_step.json()["predictions"], dtype=float))
+
+
+def test_rolling_backtest_selected_steps(loaded_test_model):
+    prices = random_walk_prices(120, seed=2)
+    response = client.post("/api/v1/predict/ticker/backtest/rolling",
+                           json={"tickerDTO": ticker_dto_json(), "prices": [str(price) for price in prices],
+                                 "windowSize": 50, "steps": [0, 5, 70]})
+    body = response.json()
+    assert body["steps"] == [0, 5, 70]
+    assert [len(step_predictions) for step_predictions in body["predictions"]] == [50 - main.FEATURE_COUNT + 1] * 3
+
+    out_of_range = client.post("/api/v1/predict/ticker/backtest/rolling",
+                               json={"tickerDTO": ticker_dto_json(), "prices": [str(price) for price in prices],
+                                     "windowSize": 50, "steps": [71]})
+    assert out_of_range.json()["predictions"] == []
+
+
+def test_batch_live_matches_single_live(loaded_sample_data_models):
+    ticker_names = ['NVDA', 'AAPL', 'META']
+    response = client.post("/api/v1/predict/ticker/live/batch",
+                           json=[ticker_dto_json(name) for name in ticker_names])
+    body = response.json()
+    assert response.status_code == 200
+    assert [prediction["tickerDTO"]["tickerName"] for prediction in body] == ticker_names
+
+    for prediction in body:
+        single = client.post("/api/v1/predict/ticker/live", json=prediction["tickerDTO"]).json()
+        assert prediction["error"] is None
+        assert len(prediction["predictions"]) == main.FEATURE_COUNT
+        np.testing.assert_allclose(np.array(prediction["predictions"], dtype=float),
+                                   np.array(single["predictions"], dtype=float))
+
+
+def test_batch_live_reports_errors_per_ticker(loaded_sample_data_models):
+    response = client.post("/api/v1/predict/ticker/live/batch",
+                           json=[ticker_dto_json("AAPL"), ticker_dto_json("UNKNOWN"), ticker_dto_json(" ")])
+    body = response.json()
+    assert body[0]["error"] is None and len(body[0]["predictions"]) == main.FEATURE_COUNT
+    assert "UNKNOWN not in available models" in body[1]["error"] and body[1]["predictions"] == []
+    assert body[2]["error"] == "tickerName cannot be empty"
@@ -0,0 +1,81 @@
+import os
+import re
+import threading
+
+from . import main
+from .machine_learning import training_worker
+from .service import metrics
+from .test_main import client, loaded_sample_data_models, ticker_dto_json
+
+
+# Runs in the worker process
+def timed_job(progress):
+    progress('done')
+    return {'stage_seconds': {'load_dataframes': 0.25, 'model_training': 7.5}, 'ticker_seconds': {'AAPL': 1.5}}
+
+
+def sample_value(text, name, **labels):
+    label_pattern = ''.join(f'(?=[^}}]*{label}="{re.escape(value)}")' for label, value in labels.items())
+    match = re.search(rf'^{re.escape(name)}\{{{label_pattern}[^}}]*\}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_histogram_merges_the_series_of_every_thread():
+    registry = metrics.Registry()
+    histogram = registry.histogram('test_seconds', 'Test.', ['stage'], buckets=(0.1, 1.0))
+    counter = registry.counter('test_total', 'Test.')
+    observations = [0.05, 0.1, 0.5, 2.0]
+    threads = [threading.Thread(target=histogram.observe, args=(value, 'fit')) for value in observations]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc(amount=3)
+
+    text = registry.render()
+    pid = str(os.getpid())
+    assert '# TYPE test_seconds histogram' in text
+    assert [sample_value(text, 'test_seconds_bucket', stage='fit', le=le, pid=pid)
+            for le in ('0.1', '1.0', '+Inf')] == [2, 3, 4]
+    assert sample_value(text, 'test_seconds_sum', stage='fit') == sum(observations)
+    assert sample_value(text, 'test_seconds_count', stage='fit') == 4
+    assert re.search(rf'^test_total\{{pid="{pid}"\}} 3.0$', text, re.MULTILINE)
+
+
+def test_stages_of_live_and_backtest_requests(loaded_sample_data_models):
+    before = client.get("/api/v1/metrics").text
+    client.post("/api/v1/predict/ticker/live", json=ticker_dto_json('AAPL'))
+    client.post("/api/v1/predict/ticker/backtest",
+                json={"tickerDTO": ticker_dto_json('AAPL'), "predictions": ["100.5"] * main.FEATURE_COUNT})
+    client.post("/api/v1/predict/ticker/live", json=ticker_dto_json('UNKNOWN'))
+    response = client.get("/api/v1/metrics")
+    after = response.text
+
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    # A scrape's own endpoint and codec stages are observed after its rendering, so the first scrape counts too
+    for stage, count in [('read_prices', 1), ('lag_features', 2), ('load_model', 2), ('fused_predict', 2),
+                         ('endpoint', 4), ('codec', 4)]:
+        assert (sample_value(after, 'price_predictor_stage_seconds_count', stage=stage)
+                - sample_value(before, 'price_predictor_stage_seconds_count', stage=stage)) == count, stage
+    for route in ('/api/v1/predict/ticker/live', '/api/v1/predict/ticker/backtest'):
+        assert sample_value(after, 'price_predictor_request_seconds_count', route=route) > 0
+    assert (sample_value(after, 'price_predictor_prediction_errors_total', route='/api/v1/predict/ticker/live')
+            - sample_value(before, 'price_predictor_prediction_errors_total', route='/api/v1/predict/ticker/live')) == 1
+    assert sample_value(after, 'price_predictor_models') >= 3
+    assert 'price_predictor_model_cache_requests_total{result="hit"' in after
+
+
+def test_training_timings_are_recorded_in_the_api_process():
+    worker = training_worker.TrainingWorker(target=timed_job, on_complete=main.record_training_timings)
+    try:
+        before = metrics.REGISTRY.render()
+        worker.trigger()
+        assert worker.wait_until_idle(timeout=60)
+        after = metrics.REGISTRY.render()
+    finally:
+        worker.shutdown()
+
+    for stage, seconds in [('load_dataframes', 0.25), ('model_training', 7.5)]:
+        assert (sample_value(after, 'price_predictor_training_stage_seconds_sum', stage=stage)
+                - sample_value(before, 'price_predictor_training_stage_seconds_sum', stage=stage)) == seconds
+    assert sample_value(after, 'price_predictor_training_ticker_seconds', ticker='AAPL') == 1.5
@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import RobustScaler
+from sklearn.tree import DecisionTreeRegressor
+
+from . import main
+from .machine_learning import lag_features
+from .service import micro_batcher
+from .test_main import (TEST_TICKER, activate_pipeline, client, load_test_model, random_walk_prices, ticker_dto_json,
+                        unload_test_model)
+
+TREE_TICKER = 'TREE'
+
+
+def test_requests_within_the_window_share_one_batch():
+    batches = []
+    release = threading.Event()
+
+    def predict_batch(items):
+        release.wait(5)
+        batches.append(items)
+        return [ValueError(item) if item < 0 else item * 2 for item in items]
+
+    batcher = micro_batcher.MicroBatcher(predict_batch, window_seconds=0.05, max_batch_size=3)
+    futures = [batcher.submit(item) for item in (1, 2, -3, 4)]
+    release.set()
+
+    assert [future.result(5) for future in (futures[0], futures[1], futures[3])] == [2, 4, 8]
+    with pytest.raises(ValueError):
+        futures[2].result(5)
+    # The first 3 fill a batch without waiting for the window, the 4th waits for the next one
+    assert batches == [[1, 2, -3], [4]]
+    batcher.close()
+    assert batcher.stats()['largest_batch'] == 3 and batcher.stats()['mean_batch_size'] == 2.0
+
+
+def test_a_failing_batch_fails_each_request_and_close_flushes():
+    def predict_batch(items):
+        raise RuntimeError('model unavailable')
+
+    batcher = micro_batcher.MicroBatcher(predict_batch, window_seconds=10)
+    future = batcher.submit('AAPL')
+    batcher.close()
+    with pytest.raises(RuntimeError, match='model unavailable'):
+        future.result(0)
+    with pytest.raises(RuntimeError, match='closed'):
+        batcher.submit('AAPL')
+
+
+@pytest.fixture
+def linear_and_tree_models():
+    load_test_model(TEST_TICKER)
+    x_values = lag_features.lag_matrix(random_walk_prices(300, seed=3), main.FEATURE_COUNT)
+    y_values = x_values[:, 0].reshape(-1, 1)
+    x_scaler = RobustScaler().fit(x_values)
+    y_scaler = RobustScaler().fit(y_values)
+    model = DecisionTreeRegressor(max_depth=4).fit(x_scaler.transform(x_values), y_scaler.transform(y_values).ravel())
+    activate_pipeline(TREE_TICKER, model, x_scaler, y_scaler)
+    yield
+    unload_test_model(TEST_TICKER)
+    unload_test_model(TREE_TICKER)
+
+
+def test_grouped_predictions_match_one_by_one(linear_and_tree_models):
+    model_set = main.MODEL_REGISTRY.active
+    assert model_set.fused_predictor(TREE_TICKER) is None
+    requests = [(model_set, main.TickerDTO(**ticker_dto_json(ticker_name)),
+                 lag_features.lag_matrix(random_walk_prices(count, seed), main.FEATURE_COUNT))
+                for seed, (ticker_name, count) in enumerate([(TEST_TICKER, 77), (TREE_TICKER, 77), (TEST_TICKER, 77),
+                                                             (TREE_TICKER, 90), (TEST_TICKER, 90), ('UNKNOWN', 77)])]
+
+    results = main.predictions_from_requests(requests)
+    for (_, ticker_dto, x_values), result in zip(requests[:-1], results[:-1]):
+        np.testing.assert_allclose(result, main.predictions_from_x_values(ticker_dto, x_values, model_set))
+    assert isinstance(results[-1], KeyError)
+
+
+def test_endpoints_predict_the_same_through_the_batcher(linear_and_tree_models, monkeypatch):
+    windows = [random_walk_prices(2 * main.FEATURE_COUNT - 1, seed) for seed in range(8)]
+
+    def backtest(ticker_name, window):
+        return client.post("/api/v1/predict/ticker/backtest",
+                           json={"tickerDTO": ticker_dto_json(ticker_name),
+                                 "predictions": [str(price) for price in window]}).json()["predictions"]
+
+    cases = [(ticker_name, window) for ticker_name in (TEST_TICKER, TREE_TICKER) for window in windows]
+    expected = [backtest(*case) for case in cases]
+    batcher = micro_batcher.MicroBatcher(main.predictions_from_requests, window_seconds=0.01)
+    monkeypatch.setattr(main, 'PREDICTION_BATCHER', batcher)
+    with ThreadPoolExecutor(max_workers=len(cases)) as executor:
+        batched = list(executor.map(lambda case: backtest(*case), cases))
+    batcher.close()
+
+    # Only the tree model's requests are batched, the linear model's are predicted directly
+    assert batcher.stats()['items'] == len(windows)
+    assert batcher.stats()['batches'] < len(windows)
+    for expected_predictions, batched_predictions in zip(expected, batched):
+        np.testing.assert_allclose(np.array(batched_predictions, dtype=float),
+                                   np.array(expected_predictions, dtype=float))
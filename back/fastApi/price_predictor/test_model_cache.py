@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from .service import model_cache
+
+
+class CountingLoader:
+    def __init__(self, size=100):
+        self.size = size
+        self.loads = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, key):
+        self.loads.append(key)
+        self.release.wait(5)
+        return f'value of {key}', self.size
+
+
+def test_concurrent_requests_share_one_load():
+    loader = CountingLoader()
+    loader.release.clear()
+    cache = model_cache.ModelCache(loader)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(cache.get, 'AAPL') for _ in range(8)]
+        while not loader.loads:
+            threading.Event().wait(0.001)
+        loader.release.set()
+        values = [future.result() for future in futures]
+
+    assert values == ['value of AAPL'] * 8 and loader.loads == ['AAPL']
+    assert cache.get('AAPL') == 'value of AAPL' and loader.loads == ['AAPL']
+
+
+def test_evicts_least_recently_used_beyond_budget_except_pinned():
+    loader = CountingLoader(size=100)
+    cache = model_cache.ModelCache(loader, memory_budget_bytes=300, pinned=['PIN'])
+
+    for key in ['PIN', 'A', 'B']:
+        cache.get(key)
+    cache.get('A')  # B is now the least recently used unpinned entry
+    cache.get('C')
+    assert 'B' not in cache and all(key in cache for key in ['PIN', 'A', 'C'])
+    assert cache.resident_bytes == 300 and cache.evictions == 1
+
+    cache.get('D')
+    cache.get('E')
+    assert 'PIN' in cache and len(cache) == 3
+    cache.get('B')
+    assert loader.loads.count('B') == 2
+
+
+def test_failed_load_is_retried_by_the_next_request():
+    attempts = []
+
+    def load(key):
+        attempts.append(key)
+        if len(attempts) == 1:
+            raise FileNotFoundError(key)
+        return 'value', 1
+
+    cache = model_cache.ModelCache(load)
+    with pytest.raises(FileNotFoundError):
+        cache.get('AAPL')
+    assert cache.get('AAPL') == 'value' and len(attempts) == 2
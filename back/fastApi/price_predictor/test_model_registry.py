@@ -0,0 +1,120 @@
+import os
+import time
+
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+from . import main
+from .machine_learning import model_generations
+from .service import model_registry
+from .test_fused_predictor import fit_pipeline
+from .test_main import client
+
+
+def publish(trained_files_directory, pipelines, retention_seconds=None):
+    generation, staging_directory = model_generations.start_generation(trained_files_directory)
+    for ticker, (model, x_scaler, y_scaler) in pipelines.items():
+        model_generations.write_bundle(staging_directory, ticker, model, x_scaler, y_scaler)
+    model_generations.publish_generation(trained_files_directory, generation, staging_directory, retention_seconds)
+    return generation
+
+
+def test_refresh_swaps_in_new_generations(tmp_path):
+    registry = model_registry.ModelRegistry(str(tmp_path))
+    assert registry.refresh() is False and registry.active.generation is None
+
+    first = publish(str(tmp_path), {'AAPL': fit_pipeline(LinearRegression())[:3]})
+    assert registry.refresh() is True
+    first_model_set = registry.active
+    assert first_model_set.generation == first
+    assert list(first_model_set.models) == ['AAPL'] and 'AAPL' in first_model_set.fused_predictors
+    assert registry.refresh() is False
+
+    second = publish(str(tmp_path), {'AAPL': fit_pipeline(LinearRegression(), 1)[:3],
+                                     'META': fit_pipeline(LinearRegression(), 2)[:3]})
+    registry.poll()
+    assert registry.active.generation == second and sorted(registry.active.models) == ['AAPL', 'META']
+    # Snapshots taken before the swap are left untouched
+    assert first_model_set.generation == first and list(first_model_set.models) == ['AAPL']
+
+
+def test_publish_keeps_only_newest_complete_generations(tmp_path):
+    generations = [publish(str(tmp_path), {'AAPL': fit_pipeline(LinearRegression())[:3]}, retention_seconds=0)
+                   for _ in range(5)]
+    model_generations.start_generation(str(tmp_path))  # unpublished staging directory
+
+    assert model_generations.list_generations(str(tmp_path)) == generations[-model_generations.GENERATIONS_TO_KEEP:]
+    assert model_generations.read_current_generation(str(tmp_path)) == generations[-1]
+    assert not any(name.endswith('.tmp-' + str(os.getpid()))
+                   for name in os.listdir(model_generations.generations_directory(str(tmp_path))))
+
+
+def test_publish_keeps_recently_replaced_generations_for_held_snapshots(tmp_path):
+    registry = model_registry.ModelRegistry(str(tmp_path))
+    tree = fit_pipeline(DecisionTreeRegressor(max_depth=3))[:3]
+    generations = [publish(str(tmp_path), {'TREE': tree})]
+    registry.refresh()
+    held = registry.active
+    for _ in range(model_generations.GENERATIONS_TO_KEEP + 1):
+        generations.append(publish(str(tmp_path), {'TREE': tree}, retention_seconds=60))
+        registry.refresh()
+
+    # Replaced less than retention_seconds ago, the held snapshot's bundles can still be loaded
+    assert model_generations.list_generations(str(tmp_path)) == generations
+    assert held.pipeline('TREE').fused_predictor is None
+
+    # Generations replaced long ago are removed, beyond the newest GENERATIONS_TO_KEEP
+    replaced_long_ago = time.time() - 120
+    os.utime(model_generations.generation_directory(str(tmp_path), generations[1]),
+             (replaced_long_ago, replaced_long_ago))
+    generations.append(publish(str(tmp_path), {'TREE': tree}, retention_seconds=60))
+    assert model_generations.list_generations(str(tmp_path)) == generations[1:]
+
+
+def test_carry_forward_keeps_tickers_missing_from_new_generation(tmp_path):
+    publish(str(tmp_path), {'AAPL': fit_pipeline(LinearRegression())[:3], 'META': fit_pipeline(LinearRegression())[:3]})
+    generation, staging_directory = model_generations.start_generation(str(tmp_path))
+    model_generations.write_bundle(staging_directory, 'AAPL', *fit_pipeline(LinearRegression(), 1)[:3])
+
+    assert model_generations.carry_forward_bundles(str(tmp_path), staging_directory) == ['META']
+    model_generations.publish_generation(str(tmp_path), generation, staging_directory)
+    assert sorted(model_generations.load_generation(str(tmp_path), generation)) == ['AAPL', 'META']
+
+
+def test_refresh_falls_back_to_legacy_layout(tmp_path):
+    pipeline = fit_pipeline(LinearRegression())[:3]
+    registry = model_registry.ModelRegistry(str(tmp_path), legacy_loader=lambda store, metrics: {'NVDA': pipeline})
+    assert registry.refresh() is True
+    assert registry.active.generation == model_registry.LEGACY_GENERATION and list(registry.active.models) == ['NVDA']
+    assert registry.refresh() is False
+
+
+def test_health_reports_active_generation(monkeypatch, tmp_path):
+    registry = model_registry.ModelRegistry(str(tmp_path))
+    generation = publish(str(tmp_path), {'AAPL': fit_pipeline(LinearRegression())[:3]})
+    registry.refresh()
+    monkeypatch.setattr(main, 'MODEL_REGISTRY', registry)
+
+    body = client.get("/api/v1/health").json()
+    assert body["model_generation"] == generation
+    assert body["models_loaded_for_prediction_and_backtesting"] == ['AAPL']
+
+
+def test_bundles_load_on_demand_within_memory_budget(tmp_path):
+    tickers = ['AAPL', 'META', 'NVDA', 'X_BTCUSD']
+    generation = publish(str(tmp_path), {ticker: fit_pipeline(LinearRegression(), i)[:3]
+                                         for i, ticker in enumerate(tickers)})
+    bundle_size = os.path.getsize(os.path.join(model_generations.generation_directory(str(tmp_path), generation),
+                                               'AAPL.pkl'))
+    registry = model_registry.ModelRegistry(str(tmp_path), memory_budget_bytes=int(bundle_size * 2.5),
+                                            pinned_tickers=['NVDA'])
+
+    assert registry.refresh() is True
+    # Only the index and the pinned ticker are loaded
+    assert sorted(registry.active.models) == tickers and len(registry.cache) == 1
+    for ticker in ['AAPL', 'META', 'X_BTCUSD']:
+        assert ticker in registry.active.fused_predictors
+    keys = model_registry.generation_index(registry.store, generation)
+    assert len(registry.cache) == 2 and keys['NVDA'] in registry.cache and keys['X_BTCUSD'] in registry.cache
+    # Evicted bundles are loaded again on the next request
+    assert registry.active.x_scalers['AAPL'] is not None and registry.cache.misses == 5
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import ElasticNet, LinearRegression
+
+from .machine_learning import lag_features
+from .machine_learning import model_search
+from .machine_learning import Price_Predictor_Notebook_Local as ml
+
+FUTURE_WINDOW = ml.FUTURE_DATAPOINTS_QUANTITY
+
+
+# Scaled train rows and validation rows of a random walk, with y_validation in prices
+def search_rows(seed=0, bars=400):
+    rng = np.random.default_rng(seed)
+    vwap = 100 + np.cumsum(rng.normal(0, 1, bars))
+    close = vwap + rng.normal(0, 0.5, bars)
+    x = lag_features.lag_matrix(vwap, FUTURE_WINDOW)
+    y = close[FUTURE_WINDOW - 1:]
+    x_scaled = (x - np.median(x, axis=0)) / 10.0
+    y_center, y_scale = np.median(y), 10.0
+    y_scaled = (y - y_center) / y_scale
+    train_rows = len(x) - 2 * FUTURE_WINDOW
+    return (x_scaled[:train_rows], y_scaled[:train_rows], x_scaled[train_rows:train_rows + FUTURE_WINDOW],
+            y[train_rows:train_rows + FUTURE_WINDOW], y_center, y_scale)
+
+
+def test_search_finds_the_lowest_mae_of_the_grid():
+    x, y, x_validation, y_validation, y_center, y_scale = search_rows()
+    model, mae, evaluated = model_search.search(*model_search.centered_gram(x, y), x_validation, y_validation,
+                                                y_center, y_scale, patience=len(model_search.ALPHAS))
+
+    assert evaluated == 1 + len(model_search.ALPHAS) * len(model_search.L1_RATIOS)
+    candidates = [LinearRegression()] + [ElasticNet(alpha=alpha, l1_ratio=l1_ratio)
+                                         for l1_ratio in model_search.L1_RATIOS for alpha in model_search.ALPHAS]
+    sklearn_maes = [np.mean(np.abs(y_validation - (candidate.fit(x, y).predict(x_validation) * y_scale + y_center)))
+                    for candidate in candidates]
+    # Solutions within sklearn's tol of the optimum, found by another solver, predict slightly differently
+    assert mae == pytest.approx(min(sklearn_maes), rel=0.02)
+    if isinstance(model, ElasticNet):
+        assert model.dual_gap_ <= model.tol * model_search.centered_gram(x, y)[2]
+
+
+def test_paths_stop_early_and_warm_start_the_next_cycle(tmp_path):
+    x, y, x_validation, y_validation, y_center, y_scale = search_rows(seed=1)
+    arguments = (*model_search.centered_gram(x, y), x_validation, y_validation, y_center, y_scale)
+    warm_starts_path = str(tmp_path / 'AAA.pkl')
+
+    model, mae, evaluated = model_search.search(*arguments, warm_starts_path)
+    _, full_mae, full_evaluated = model_search.search(*arguments, patience=len(model_search.ALPHAS))
+    assert evaluated < full_evaluated
+    assert mae == pytest.approx(full_mae, rel=0.02)
+
+    warm_starts = model_search.read_warm_starts(warm_starts_path)
+    assert len(warm_starts) == evaluated - 1
+    # Candidates warm started from their own converged coefficients need no iterations
+    warm_model, warm_mae, _ = model_search.search(*arguments, warm_starts_path)
+    assert warm_mae == pytest.approx(mae, rel=1e-3)
+    if isinstance(warm_model, ElasticNet):
+        assert warm_model.n_iter_ == 0
+
+
+@pytest.mark.parametrize('training_mode', ['full', 'incremental'])
+def test_pipeline_searches_the_path_per_ticker(tmp_path, monkeypatch, training_mode):
+    monkeypatch.setattr(ml, 'TRAINED_FILES_DIRECTORY', str(tmp_path))
+    monkeypatch.setattr(ml, 'MODEL_SELECTION', 'path')
+    rng = np.random.default_rng(0)
+    frames = []
+    for ticker in ['AAA', 'BBB']:
+        vwap = 100 + np.cumsum(rng.normal(0, 1, 400))
+        index = pd.MultiIndex.from_product([[ticker], pd.RangeIndex(400)], names=['ticker', None])
+        frames.append(pd.DataFrame({'close': vwap + rng.normal(0, 0.5, 400), 'vwap': vwap}, index=index))
+    df_raw = pd.concat(frames)
+
+    ml.predictions_close_price_dictionary.clear()
+    if training_mode == 'full':
+        df = ml.add_lagged_features(df_raw, ml.LABEL, ml.FEATURES, FUTURE_WINDOW)
+        ml.all_models_train_and_evaluate(ml.models, *ml.train_test_split_scale(df, ml.FEATURES, ml.LABEL,
+                                                                               FUTURE_WINDOW), workers=1)
+    else:
+        ml.incremental_train_and_evaluate(ml.models, df_raw)
+
+    assert ml.training_errors == {}
+    for ticker in ['AAA', 'BBB']:
+        assert ml.predictions_close_price_dictionary[ticker].shape == (FUTURE_WINDOW,)
+        assert type(ml.trained_models[ticker]) in (LinearRegression, ElasticNet)
+        assert model_search.read_warm_starts(str(tmp_path / 'model_search' / f'{ticker}.pkl'))
@@ -0,0 +1,94 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from .machine_learning import parallel_training
+from .machine_learning import Price_Predictor_Notebook_Local as ml
+from .machine_learning import training_worker
+
+
+# Runs in the worker processes
+def row_sum_task(arrays, start, stop):
+    return float(arrays['values'][start:stop].sum()), os.getpid()
+
+
+def failing_task(arrays, index):
+    if index == 1:
+        raise ValueError('bad ticker')
+    return index
+
+
+def nested_training_job(progress):
+    results = parallel_training.map_tasks(row_sum_task, {'values': np.arange(10.0)}, [(0, 5), (5, 10)], workers=2)
+    progress(f'{[result for (result, _), _ in results]}')
+
+
+@pytest.fixture(scope='module', autouse=True)
+def shutdown_pool():
+    yield
+    parallel_training.shutdown()
+
+
+def test_tasks_read_shared_arrays_in_worker_processes():
+    values = np.arange(100.0)
+    results = parallel_training.map_tasks(row_sum_task, {'values': values}, [(0, 50), (50, 100), (10, 20)], workers=2)
+
+    assert [error for _, error in results] == [None, None, None]
+    assert [result[0] for result, _ in results] == [values[:50].sum(), values[50:].sum(), values[10:20].sum()]
+    assert os.getpid() not in {result[1] for result, _ in results}
+
+
+def test_task_errors_are_returned_per_task():
+    for workers in [1, 2]:
+        results = parallel_training.map_tasks(failing_task, {}, [(0,), (1,), (2,)], workers=workers)
+
+        assert [result for result, _ in results] == [0, None, 2]
+        assert results[1][1].startswith('ValueError: bad ticker')
+
+
+def test_pool_runs_inside_training_worker():
+    worker = training_worker.TrainingWorker(target=nested_training_job)
+    try:
+        worker.trigger()
+        assert worker.wait_until_idle(timeout=120)
+        assert worker.status()['runs_completed'] == 1 and worker.status()['last_error'] is None
+        # progress messages arrive asynchronously
+        deadline = time.time() + 10
+        while worker.status()['stage'] is None and time.time() < deadline:
+            time.sleep(0.05)
+        assert worker.status()['stage'] == '[10.0, 35.0]'
+    finally:
+        worker.shutdown()
+
+
+# Two tickers of random walk prices, lagged, split and scaled like the ML pipeline does
+def split_frames(seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for ticker in ['AAA', 'BBB']:
+        vwap = 100 + np.cumsum(rng.normal(0, 1, 400))
+        index = pd.MultiIndex.from_product([[ticker], pd.RangeIndex(400)], names=['ticker', None])
+        frames.append(pd.DataFrame({'close': vwap, 'vwap': vwap}, index=index))
+    df = ml.add_lagged_features(pd.concat(frames), ml.LABEL, ml.FEATURES, ml.FUTURE_DATAPOINTS_QUANTITY)
+    return ml.train_test_split_scale(df, ml.FEATURES, ml.LABEL, ml.FUTURE_DATAPOINTS_QUANTITY)
+
+
+def test_parallel_training_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(ml, 'TRAINED_FILES_DIRECTORY', str(tmp_path))
+    frames = split_frames()
+
+    predictions = {}
+    for workers in [1, 2]:
+        ml.predictions_close_price_dictionary.clear()
+        ml.all_models_train_and_evaluate(ml.models, *frames, generation_directory=None, workers=workers)
+        predictions[workers] = dict(ml.predictions_close_price_dictionary)
+
+    assert ml.training_errors == {}
+    assert sorted(predictions[2]) == ['AAA', 'BBB']
+    for ticker in predictions[1]:
+        assert predictions[1][ticker].shape == (ml.FUTURE_DATAPOINTS_QUANTITY,)
+        np.testing.assert_array_equal(predictions[1][ticker], predictions[2][ticker])
+    assert sorted(os.listdir(tmp_path / 'model')) == ['AAA.pkl', 'BBB.pkl']
@@ -0,0 +1,101 @@
+import json
+import shutil
+import threading
+import time
+
+import pytest
+
+from . import main
+from .machine_learning import bar_segments
+from .service import prediction_cache
+from .test_bar_segments import make_bars
+from .test_main import client, load_test_model, ticker_dto_json, unload_test_model
+
+
+def test_concurrent_requests_compute_once():
+    cache = prediction_cache.PredictionCache(max_entries=10)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return [1.0, 2.0]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('AAPL', compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [(1.0, 2.0)] * 8
+    assert cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_are_evicted_and_failures_not_cached():
+    cache = prediction_cache.PredictionCache(max_entries=2)
+    cache.get('a', lambda: [1.0])
+    cache.get('b', lambda: [2.0])
+    cache.get('a', lambda: [0.0])
+    cache.get('c', lambda: [3.0])
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+
+    def fail():
+        raise FileNotFoundError('d')
+
+    with pytest.raises(FileNotFoundError):
+        cache.get('d', fail)
+    assert 'd' not in cache
+    assert cache.stats() == {'entries': 2, 'max_entries': 2, 'hits': 1, 'misses': 4, 'evictions': 1}
+
+
+@pytest.fixture
+def json_prices_directory(tmp_path, monkeypatch):
+    # AAPL's sample prices as the only price source, so the test can add bars
+    shutil.copy(f'{main.DATA_DIRECTORY}/AAPL.json', tmp_path / 'AAPL.json')
+    monkeypatch.setattr(main, 'DATA_DIRECTORY', str(tmp_path))
+    monkeypatch.setattr(main, 'BAR_SEGMENTS_DIRECTORY', str(tmp_path / 'bar_segments'))
+    monkeypatch.setattr(main, 'PRICE_STORE_DIRECTORY', str(tmp_path / 'price_store'))
+    load_test_model('AAPL')
+    yield tmp_path
+    unload_test_model('AAPL')
+
+
+def test_live_predictions_are_cached_until_prices_or_models_change(json_prices_directory):
+    def live():
+        return client.post("/api/v1/predict/ticker/live", json=ticker_dto_json('AAPL')).json()["predictions"]
+
+    before = main.PREDICTION_CACHE.stats()
+    first = live()
+    assert live() == first
+    after = main.PREDICTION_CACHE.stats()
+    assert (after['misses'] - before['misses'], after['hits'] - before['hits']) == (1, 1)
+
+    # A new bar
+    with open(json_prices_directory / 'AAPL.json') as file:
+        data_dict = json.load(file)
+    data_dict['data'].append([value * 1.1 if isinstance(value, float) else value for value in data_dict['data'][-1]])
+    data_dict['index'].append(data_dict['index'][-1] + 1)
+    with open(json_prices_directory / 'AAPL.json', 'w') as file:
+        json.dump(data_dict, file)
+    new_bar = live()
+    assert new_bar != first
+
+    # New models of the same generation
+    load_test_model('AAPL', seed=1)
+    new_models = live()
+    assert new_models != new_bar
+    assert main.PREDICTION_CACHE.stats()['misses'] - before['misses'] == 3
+
+
+def test_prices_version_follows_the_newest_bar_segment(json_prices_directory):
+    json_version = main.latest_prices_version('AAPL')
+    store = bar_segments.LocalSegmentStore(main.BAR_SEGMENTS_DIRECTORY)
+    bar_segments.append_bars(store, 'AAPL', make_bars(0, 100), None)
+    segment_version = main.latest_prices_version('AAPL')
+    bar_segments.append_bars(store, 'AAPL', make_bars(100, 101), None)
+
+    assert json_version[0].endswith('AAPL.json')
+    assert segment_version[0].endswith(bar_segments.SEGMENT_SUFFIX)
+    assert main.latest_prices_version('AAPL') != segment_version
@@ -0,0 +1,69 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import main
+from .machine_learning import Price_Predictor_Notebook_Local as ml
+from .machine_learning import price_store
+
+
+def write_split_json(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'open': rng.normal(100, 1, rows), 'high': rng.normal(101, 1, rows),
+                       'low': rng.normal(99, 1, rows), 'close': rng.normal(100, 1, rows),
+                       'volume': rng.uniform(1e3, 1e6, rows), 'vwap': rng.normal(100, 1, rows),
+                       'timestamp': 1658736000000 + 600000 * np.arange(rows),
+                       'transactions': rng.integers(1, 1000, rows), 'otc': [None] * rows}).round(4)
+    df.to_json(path, orient='split')
+    return df
+
+
+def test_convert_json_round_trips_all_columns(tmp_path):
+    df = write_split_json(tmp_path / 'AAPL.json', 120)
+    price_store.convert_json(str(tmp_path / 'AAPL.json'), str(tmp_path / 'store'))
+
+    df_store = price_store.read_frame(str(tmp_path / 'store'), 'AAPL')
+    assert price_store.read_header(str(tmp_path / 'store'), 'AAPL')['rows'] == 120
+    pd.testing.assert_frame_equal(df_store.drop(columns='otc'), df.drop(columns='otc'), check_index_type=False)
+    assert df_store['otc'].isna().all()
+    np.testing.assert_array_equal(price_store.read_column_tail(str(tmp_path / 'store'), 'AAPL', 'vwap', 77),
+                                  df['vwap'].values[-77:])
+
+
+def test_convert_directory_only_converts_changed_files(tmp_path):
+    source_directory, store_directory = tmp_path / 'data', str(tmp_path / 'store')
+    source_directory.mkdir()
+    write_split_json(source_directory / 'AAPL.json', 50)
+    write_split_json(source_directory / 'META.json', 50, seed=1)
+    assert price_store.convert_directory(str(source_directory), store_directory) == ['AAPL', 'META']
+    assert price_store.convert_directory(str(source_directory), store_directory) == []
+
+    df = write_split_json(source_directory / 'META.json', 60, seed=2)
+    os.utime(source_directory / 'META.json', ns=(1, 1))
+    assert price_store.convert_directory(str(source_directory), store_directory) == ['META']
+    np.testing.assert_array_equal(price_store.read_column(store_directory, 'META', 'vwap'), df['vwap'].values)
+    assert price_store.tickers(store_directory) == ['AAPL', 'META']
+
+
+def test_json_to_dataframes_reads_price_store(tmp_path):
+    price_store.convert_directory(ml.DOWNLOAD_DIRECTORY, str(tmp_path))
+    pd.testing.assert_frame_equal(ml.json_to_dataframes(str(tmp_path)).sort_index(),
+                                  ml.json_to_dataframes(ml.DOWNLOAD_DIRECTORY).sort_index())
+
+
+def test_latest_ticker_prices_from_price_store_match_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'PRICE_STORE_DIRECTORY', str(tmp_path / 'missing'))
+    json_prices = main.get_latest_ticker_prices('NVDA')
+
+    price_store.convert_directory(main.DATA_DIRECTORY, str(tmp_path / 'store'))
+    monkeypatch.setattr(main, 'PRICE_STORE_DIRECTORY', str(tmp_path / 'store'))
+    store_prices = main.get_latest_ticker_prices('NVDA')
+
+    with open(f'{main.DATA_DIRECTORY}/NVDA.json', 'r') as file:
+        data_dict = json.load(file)
+    vwap_column = data_dict['columns'].index(main.FEATURE)
+    expected = [row[vwap_column] for row in data_dict['data'][-(2 * main.FEATURE_COUNT - 1):]]
+    np.testing.assert_array_equal(json_prices, expected)
+    np.testing.assert_array_equal(store_prices, expected)
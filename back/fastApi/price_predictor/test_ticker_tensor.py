@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import RobustScaler
+
+from .machine_learning import ticker_tensor
+
+COLUMNS = ['a', 'b', 'flat']
+
+
+# Tickers of different lengths, grouped by ticker like the ML pipeline's lagged frames
+def ragged_frame(lengths, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i, length in enumerate(lengths):
+        index = pd.MultiIndex.from_product([[f'T{i}'], pd.RangeIndex(length)], names=['ticker', None])
+        frames.append(pd.DataFrame({'a': rng.normal(100, 5, length), 'b': rng.integers(0, 4, length).astype(float),
+                                    'flat': np.full(length, 7.0)}, index=index))
+    return pd.concat(frames)
+
+
+def test_from_frame_pads_shorter_tickers_at_the_start():
+    df = ragged_frame([5, 3, 4])
+    tickers, tensor, lengths = ticker_tensor.from_frame(df, COLUMNS)
+
+    assert tickers == ['T0', 'T1', 'T2'] and tensor.shape == (3, 5, 3) and list(lengths) == [5, 3, 4]
+    assert np.isnan(tensor[1, :2]).all() and np.isnan(tensor[2, :1]).all()
+    np.testing.assert_array_equal(tensor[1, 2:], df.loc['T1', COLUMNS].to_numpy())
+
+
+def test_robust_scaling_matches_sklearn_per_ticker():
+    df = ragged_frame([40, 25, 33, 40])
+    tickers, tensor, _ = ticker_tensor.from_frame(df, COLUMNS)
+    center, scale = ticker_tensor.robust_center_and_scale(tensor)
+    scaled = ticker_tensor.robust_scale(tensor, center, scale)
+
+    for i, ticker in enumerate(tickers):
+        expected = RobustScaler().fit(df.loc[ticker, COLUMNS])
+        scaler = ticker_tensor.robust_scaler(center[i], scale[i], COLUMNS)
+        np.testing.assert_array_equal(scaler.center_, expected.center_)
+        np.testing.assert_array_equal(scaler.scale_, expected.scale_)
+        assert list(scaler.feature_names_in_) == COLUMNS and scaler.n_features_in_ == expected.n_features_in_
+
+        rows = ~np.isnan(tensor[i, :, 0])
+        np.testing.assert_array_equal(scaled[i, rows], expected.transform(df.loc[ticker, COLUMNS]))
+        np.testing.assert_array_equal(scaler.inverse_transform(scaled[i, rows]),
+                                      expected.inverse_transform(scaled[i, rows]))
+    assert (scale[:, COLUMNS.index('flat')] == 1.0).all()
@@ -0,0 +1,79 @@
+import os
+import queue
+import time
+
+from . import main
+from .machine_learning import training_worker
+from .test_main import client
+
+
+# Runs in the worker process
+def sleeping_job(progress):
+    progress(f'pid {os.getpid()} blas {os.environ["OMP_NUM_THREADS"]}')
+    time.sleep(0.5)
+    progress('done')
+
+
+def failing_job(progress):
+    raise RuntimeError('no data')
+
+
+def test_runs_in_worker_process_and_coalesces_triggers():
+    worker = training_worker.TrainingWorker(target=sleeping_job, blas_threads=2)
+    try:
+        assert worker.trigger() is True
+        assert worker.trigger() is False
+        assert worker.trigger() is False
+        assert worker.status()['state'] == 'running' and worker.status()['pending'] is True
+        assert worker.wait_until_idle(timeout=60)
+
+        status = worker.status()
+        assert status['runs_started'] == 2 and status['runs_completed'] == 2 and status['runs_coalesced'] == 1
+        assert status['state'] == 'idle' and status['pending'] is False
+        # Progress is applied by another thread, possibly after the run completed
+        deadline = time.time() + 60
+        while worker.status()['stage'] != 'done' and time.time() < deadline:
+            time.sleep(0.01)
+        assert worker.status()['stage'] == 'done'
+    finally:
+        worker.shutdown()
+
+
+def test_worker_reports_progress_from_another_process():
+    worker = training_worker.TrainingWorker(target=sleeping_job, blas_threads=3)
+    try:
+        worker.trigger()
+        deadline = time.time() + 60
+        while not (worker.status()['stage'] or '').startswith('pid') and time.time() < deadline:
+            time.sleep(0.01)
+        pid, blas_threads = worker.status()['stage'].split()[1::2]
+        assert int(pid) != os.getpid() and blas_threads == '3'
+        worker.wait_until_idle(timeout=60)
+    finally:
+        worker.shutdown()
+
+
+def test_late_progress_of_a_previous_run_is_dropped():
+    worker = training_worker.TrainingWorker(target=sleeping_job)
+    worker._status.update(runs_started=2, stage=None)  # Run 2 just started
+    progress_queue = queue.Queue()
+    for item in [(1, 'done'), (2, 'ML - 1/7'), (1, 'done'), None]:
+        progress_queue.put(item)
+    worker._receive_progress(progress_queue)
+    assert worker.status()['stage'] == 'ML - 1/7'
+
+
+def test_failed_run_is_reported_and_next_run_still_starts(monkeypatch):
+    worker = training_worker.TrainingWorker(target=failing_job)
+    try:
+        worker.trigger()
+        worker.wait_until_idle(timeout=60)
+        assert worker.status()['runs_failed'] == 1 and 'no data' in worker.status()['last_error']
+
+        monkeypatch.setattr(main, 'TRAINING_WORKER', worker)
+        assert client.get("/api/v1/training/status").json()['runs_failed'] == 1
+        assert worker.trigger() is True
+        worker.wait_until_idle(timeout=60)
+        assert worker.status()['runs_failed'] == 2
+    finally:
+        worker.shutdown()
@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import numpy as np
+import orjson
+
+from . import main
+from .service import wire_format
+from .test_main import client, loaded_sample_data_models, loaded_test_model, random_walk_prices, ticker_dto_json
+
+
+def test_float64_round_trip_keeps_every_field():
+    content = {'tickerDTO': {'tickerName': 'AAPL'}, 'steps': [0, 3], 'empty': [],
+               'predictions': np.arange(6.0).reshape(2, 3), 'prices': [1.5, 2.5]}
+    body = wire_format.encode(content, wire_format.FLOAT64)
+    decoded = wire_format.decode(body, wire_format.FLOAT64)
+
+    assert len(body) == 4 + len(orjson.dumps({**content, 'predictions': {'$float64': [2, 3]},
+                                              'prices': {'$float64': [2]}})) + 8 * 8
+    assert decoded['steps'] == [0, 3] and decoded['empty'] == [] and decoded['tickerDTO'] == {'tickerName': 'AAPL'}
+    np.testing.assert_array_equal(decoded['predictions'], content['predictions'])
+    np.testing.assert_array_equal(decoded['prices'], content['prices'])
+
+
+def post(path, content, media_type, **headers):
+    return client.post(path, content=wire_format.encode(content, media_type),
+                       headers={'Content-Type': media_type, **headers})
+
+
+def test_backtest_answers_in_every_format(loaded_test_model):
+    window = random_walk_prices(2 * main.FEATURE_COUNT - 1, seed=4)
+    expected = client.post("/api/v1/predict/ticker/backtest",
+                           json={"tickerDTO": ticker_dto_json(), "predictions": [str(price) for price in window]})
+    assert isinstance(expected.json()["predictions"][0], str)
+    expected_predictions = np.array(expected.json()["predictions"], dtype=float)
+
+    float_json = post("/api/v1/predict/ticker/backtest", {"tickerDTO": ticker_dto_json(), "predictions": window},
+                      wire_format.FLOAT_JSON)
+    assert float_json.headers['content-type'] == wire_format.FLOAT_JSON
+    assert float_json.json()["tickerDTO"] == expected.json()["tickerDTO"]
+    np.testing.assert_allclose(float_json.json()["predictions"], expected_predictions)
+
+    float64 = post("/api/v1/predict/ticker/backtest", {"tickerDTO": ticker_dto_json(), "predictions": window},
+                   wire_format.FLOAT64)
+    decoded = wire_format.decode(float64.content, wire_format.FLOAT64)
+    np.testing.assert_allclose(decoded["predictions"], expected_predictions)
+
+    # A default JSON request can still ask for a wire format response
+    accepted = client.post("/api/v1/predict/ticker/backtest", headers={'Accept': wire_format.FLOAT64},
+                           json={"tickerDTO": ticker_dto_json(), "predictions": [str(price) for price in window]})
+    np.testing.assert_allclose(wire_format.decode(accepted.content, wire_format.FLOAT64)["predictions"],
+                               expected_predictions)
+
+
+def test_rolling_backtest_and_batch_in_float64(loaded_test_model, loaded_sample_data_models):
+    prices = random_walk_prices(300, seed=5)
+    expected = client.post("/api/v1/predict/ticker/backtest/rolling",
+                           json={"tickerDTO": ticker_dto_json(), "prices": [str(price) for price in prices]}).json()
+    rolling = wire_format.decode(post("/api/v1/predict/ticker/backtest/rolling",
+                                      {"tickerDTO": ticker_dto_json(), "prices": prices}, wire_format.FLOAT64).content,
+                                 wire_format.FLOAT64)
+    assert rolling["steps"] == expected["steps"]
+    np.testing.assert_allclose(rolling["predictions"], np.array(expected["predictions"], dtype=float))
+
+    batch = post("/api/v1/predict/ticker/live/batch", [ticker_dto_json('AAPL'), ticker_dto_json('UNKNOWN')],
+                 wire_format.FLOAT_JSON).json()
+    assert len(batch[0]["predictions"]) == main.FEATURE_COUNT and batch[0]["error"] is None
+    assert "UNKNOWN not in available models" in batch[1]["error"]
+
+
+def test_gzip_request_and_response_bodies(loaded_test_model):
+    prices = random_walk_prices(300, seed=6)
+    body = json.dumps({"tickerDTO": ticker_dto_json(), "prices": [str(price) for price in prices]}).encode()
+    plain = client.post("/api/v1/predict/ticker/backtest/rolling", content=body,
+                        headers={'Content-Type': 'application/json'})
+    compressed = client.post("/api/v1/predict/ticker/backtest/rolling", content=gzip.compress(body),
+                             headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip',
+                                      'Accept-Encoding': 'gzip'})
+    assert compressed.headers['content-encoding'] == 'gzip'
+    assert compressed.json() == plain.json()
+
+
+def test_invalid_wire_bodies_are_rejected():
+    response = client.post("/api/v1/predict/ticker/backtest", content=b'\x10\x00',
+                           headers={'Content-Type': wire_format.FLOAT64})
+    assert response.status_code == 422
+    response = post("/api/v1/predict/ticker/backtest", {"predictions": [1.0]}, wire_format.FLOAT_JSON)
+    assert response.status_code == 422 and response.json()["detail"][0]["loc"] == ["tickerDTO"]